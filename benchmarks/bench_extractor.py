@@ -0,0 +1,66 @@
+''' Compares extractor.extract_page with and without building a
+BeautifulSoup tree: output, time and peak memory per page.
+
+Run from the repository root:
+    python -m benchmarks.bench_extractor [--pages N] [--size PARAGRAPHS]
+'''
+import time
+import random
+import tracemalloc
+
+from argparse import ArgumentParser
+
+from extractor import extract_page
+
+WORDS = ("information retrieval crawler index query ranking student faculty "
+         "research seminar department computer science statistics").split()
+
+
+def make_page(rand, paragraphs):
+    body = []
+    for i in range(paragraphs):
+        words = " ".join(rand.choice(WORDS) for _ in range(40))
+        body.append(
+            f"<div class='p'><p>{words} <b>{rand.choice(WORDS)}</b> tail</p>"
+            f"<!-- comment {i} --><a href='/page/{i}#top'>link {i}</a>"
+            f"<script>var x = {i};</script></div>")
+    return (
+        "<!DOCTYPE html><html><head><title>Page</title>"
+        "<style>p {color: red}</style></head><body>"
+        "<nav><a href='https://www.ics.uci.edu/'>home</a> menu</nav>"
+        + "".join(body) +
+        "<footer>footer text</footer></body></html>").encode("utf-8")
+
+
+def measure(pages, build_tree):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for page in pages:
+        extract_page(page, "https://www.ics.uci.edu/dir/", build_tree=build_tree)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed / len(pages), peak
+
+
+def main(page_count, paragraphs):
+    rand = random.Random(0)
+    pages = [make_page(rand, paragraphs) for _ in range(page_count)]
+    for page in pages[:5]:
+        fast = extract_page(page, "https://www.ics.uci.edu/dir/")
+        soup = extract_page(page, "https://www.ics.uci.edu/dir/", build_tree=True)
+        assert fast.text.split() == soup.text.split()
+        assert fast.links == soup.links
+        assert fast.features == soup.features
+    for build_tree in (True, False):
+        per_page, peak = measure(pages, build_tree)
+        name = "soup tree  " if build_tree else "event pass "
+        print(f"{name} {per_page * 1000:8.2f} ms/page, peak {peak / 1e6:8.2f} MB")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--size", type=int, default=500)
+    args = parser.parse_args()
+    main(args.pages, args.size)
@@ -0,0 +1,75 @@
+''' Crawls a synthetic site served by the stub cache server with the
+threaded workers and with the asyncio workers, checks that both fetch
+every page while keeping the per-host delay, and compares pages/sec.
+
+Each run happens in its own process so scraper's globals start empty.
+
+Run from the repository root:
+    python -m benchmarks.bench_fetch [--latency SECONDS] [--hosts N]
+'''
+import os
+import time
+import tempfile
+import multiprocessing
+
+from argparse import ArgumentParser
+
+from benchmarks.common import make_config
+from benchmarks.stub_cache_server import StubCacheServer, make_site
+
+
+def crawl(label, overrides, args, results):
+    from crawler import Crawler
+
+    pages, seeds = make_site(hosts=args.hosts, pages_per_host=args.pages)
+    server = StubCacheServer(pages, latency=args.latency)
+    cache_server = server.start()
+    with tempfile.TemporaryDirectory() as tmp:
+        config = make_config(
+            os.path.join(tmp, "frontier.shelve"), seeds, cache_server,
+            POLITENESS=args.delay, SAVE_BACKEND="log", **overrides)
+        crawler = Crawler(config, True)
+        start = time.perf_counter()
+        crawler.start()
+        elapsed = time.perf_counter() - start
+        crawler.frontier.close()
+    server.stop()
+    fetched = {url for _, url in server.requests}
+    assert fetched >= set(pages), f"{label} missed {len(set(pages) - fetched)} pages"
+    min_gap = min(server.host_gaps().values())
+    assert min_gap >= args.delay, f"{label} broke politeness: {min_gap:.3f}s"
+    results[label] = (len(server.requests), elapsed, min_gap)
+
+
+def main(args):
+    runs = [
+        ("threads x1, default frontier",
+         dict(THREADCOUNT=1, FRONTIER="default", FETCHER="threads")),
+        (f"threads x{args.hosts}, host frontier",
+         dict(THREADCOUNT=args.hosts, FRONTIER="host", FETCHER="threads")),
+        (f"async x{args.hosts * 2}, host frontier",
+         dict(THREADCOUNT=1, FRONTIER="host", FETCHER="async",
+              ASYNC_CONCURRENCY=args.hosts * 2)),
+    ]
+    results = multiprocessing.Manager().dict()
+    for label, overrides in runs:
+        process = multiprocessing.get_context("fork").Process(
+            target=crawl, args=(label, overrides, args, results))
+        process.start()
+        process.join()
+    for label, _ in runs:
+        if label not in results:
+            print(f"{label:34} FAILED")
+            continue
+        count, elapsed, min_gap = results[label]
+        print(f"{label:34} {count / elapsed:8.1f} pages/sec "
+              f"({count} requests, min same-host gap {min_gap:.3f}s)")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--delay", type=float, default=0.05)
+    parser.add_argument("--hosts", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=25)
+    main(parser.parse_args())
@@ -0,0 +1,65 @@
+''' Compares insert throughput of the shelve save file with FrontierLog.
+
+Run from the repository root:
+    python -m benchmarks.bench_frontier_log [--count N]
+'''
+import os
+import time
+import shelve
+import dbm.dumb
+import tempfile
+
+from argparse import ArgumentParser
+
+from utils import get_urlhash
+from crawler.frontier_log import FrontierLog
+
+
+def make_urls(count):
+    return [f"https://www.ics.uci.edu/~group{i % 97}/page/{i}" for i in range(count)]
+
+
+def bench_shelve(path, urls):
+    save = shelve.Shelf(dbm.dumb.open(path, "c"))
+    start = time.perf_counter()
+    for url in urls:
+        urlhash = get_urlhash(url)
+        if urlhash not in save:
+            save[urlhash] = (url, False)
+            save.sync()
+    elapsed = time.perf_counter() - start
+    save.close()
+    return elapsed
+
+
+def bench_log(path, urls):
+    save = FrontierLog(path)
+    start = time.perf_counter()
+    for url in urls:
+        urlhash = get_urlhash(url)
+        if urlhash not in save:
+            save[urlhash] = (url, False)
+            save.sync()
+    save.close()
+    elapsed = time.perf_counter() - start
+    reopened = FrontierLog(path)
+    assert len(reopened) == len(urls), "log lost records"
+    reopened.close()
+    return elapsed
+
+
+def main(count):
+    urls = make_urls(count)
+    with tempfile.TemporaryDirectory() as tmp:
+        shelve_time = bench_shelve(os.path.join(tmp, "frontier.shelve"), urls)
+        log_time = bench_log(os.path.join(tmp, "frontier.log"), urls)
+    print(f"shelve: {count / shelve_time:12.0f} inserts/sec ({shelve_time:.2f}s)")
+    print(f"log:    {count / log_time:12.0f} inserts/sec ({log_time:.2f}s)")
+    print(f"speedup: {shelve_time / log_time:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--count", type=int, default=5000)
+    args = parser.parse_args()
+    main(args.count)
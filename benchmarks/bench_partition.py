@@ -0,0 +1,114 @@
+''' Measures how crawl throughput scales with NODES (see
+crawler/partition.py): the single-process Crawler against partitioned
+crawls with more and more processes, all replaying the same site from a
+local ReplayServer. Also checks that the partitioned crawls fetch every
+url once and find the same unique pages as the single process.
+
+The site includes --mirrors byte for byte copies of pages on other hosts.
+Each node detects duplicates only among the pages it crawled, so a mirror
+whose original belongs to another node is counted again; the words
+counted beyond the single process's show how much deduplication is lost.
+
+Each crawl runs in its own forked process, so scraper's globals start
+empty; the server runs in this process.
+
+Run from the repository root:
+    python -m benchmarks.bench_partition [--nodes 1,2,4] [--hosts 16]
+        [--pages 100] [--threads 2] [--latency 0.005] [--delay 0]
+'''
+import os
+import time
+import tempfile
+import multiprocessing
+
+from argparse import ArgumentParser
+
+from benchmarks.common import make_config
+from benchmarks.corpus import ReplayServer
+from benchmarks.stub_cache_server import encode_response, make_site
+
+
+def add_mirrors(pages, seeds, hosts, count):
+    ''' Copies count pages, spread over every host, to mirror hosts and
+    adds them to the seeds. Spread out, no host's pages are mostly
+    duplicates, which would get its template cut off as a trap. '''
+    step = max(len(pages) // count, 1) if count else 1
+    for i, (url, page) in enumerate(list(pages.items())[::step][:count]):
+        mirror = url.replace("://host", f"://mirror{i % hosts}-", 1)
+        pages[mirror] = page
+        seeds.append(mirror)
+
+
+def crawl(nodes, seeds, cache_server, args, results):
+    import scraper
+    from crawler import Crawler
+    from crawler.partition import run_partitioned
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config = make_config(
+            os.path.join(tmp, "frontier.shelve"), seeds, cache_server,
+            POLITENESS=args.delay, THREADCOUNT=args.threads, FRONTIER=args.frontier,
+            ROBOTS=False, CHECKPOINT_INTERVAL=0, NODES=nodes)
+        start = time.perf_counter()
+        if nodes == 1:
+            crawler = Crawler(config, True)
+            crawler.start()
+            crawler.close()
+            stats = scraper.stats
+        else:
+            stats = run_partitioned(config, True, nodes)
+        elapsed = time.perf_counter() - start
+        words = stats.word_frequencies().total
+    results[nodes] = (elapsed, len(stats.urls), words)
+
+
+def main(args):
+    pages, seeds = make_site(hosts=args.hosts, pages_per_host=args.pages)
+    add_mirrors(pages, seeds, args.hosts, args.mirrors)
+    payloads = {url: encode_response(url, *page) for url, page in pages.items()}
+    counts = [int(nodes) for nodes in args.nodes.split(",")]
+    print(f"Replaying {len(payloads)} pages on {args.hosts} hosts, latency "
+          f"{args.latency}s, {args.threads} threads per process, "
+          f"{os.cpu_count()} cpus")
+
+    results = multiprocessing.Manager().dict()
+    fetched = dict()
+    for nodes in counts:
+        server = ReplayServer(payloads, latency=args.latency)
+        cache_server = server.start()
+        process = multiprocessing.get_context("fork").Process(
+            target=crawl, args=(nodes, seeds, cache_server, args, results))
+        process.start()
+        process.join()
+        server.stop()
+        urls = [url for _, url in server.requests]
+        fetched[nodes] = (len(urls), len(set(urls)))
+
+    baseline = baseline_words = None
+    for nodes in counts:
+        if nodes not in results:
+            print(f"{nodes:2} nodes  FAILED")
+            continue
+        elapsed, unique, words = results[nodes]
+        requests, distinct = fetched[nodes]
+        rate = requests / elapsed
+        baseline = baseline or rate
+        baseline_words = baseline_words or words
+        print(f"{nodes:2} nodes {rate:8.1f} pages/sec  x{rate / baseline:4.2f}  "
+              f"{requests} fetches of {distinct} urls, {unique} unique pages "
+              f"in {elapsed:.1f}s, {words} words "
+              f"({(words - baseline_words) / baseline_words:+.1%} from mirrors)")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--nodes", type=str, default="1,2,4")
+    parser.add_argument("--hosts", type=int, default=16)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--mirrors", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--frontier", type=str, default="host")
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args()
+    main(args)
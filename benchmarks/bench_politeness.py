@@ -0,0 +1,142 @@
+''' Crawls a synthesized site through a flaky stand-in for the cache
+server, with fixed and with adaptive politeness (crawler/politeness.py):
+
+    host0  healthy
+    host1  healthy but slow (--slow seconds per response)
+    host2  down: every response is a 503
+    host3  flaky: --flaky of its responses are 503s
+    host4  recovering: its first --failures responses are 503s
+
+and reports per host how many requests were made and how many pages came
+back, the smallest gap between two requests, and how long the crawl took.
+Fails if a host was fetched more often than POLITENESS allows, or if the
+adaptive crawl did not give up host2 after its circuit opened --trips
+times, slowed down healthy hosts, or did not close host4's circuit when
+its probe succeeded.
+
+Each crawl runs in its own forked process, so scraper's globals start
+empty; the server runs in this process.
+
+Run from the repository root:
+    python -m benchmarks.bench_politeness [--pages 40] [--delay 0.05]
+'''
+import os
+import time
+import random
+import tempfile
+import multiprocessing
+
+from argparse import ArgumentParser
+from collections import Counter
+from urllib.parse import urlparse
+
+from benchmarks.common import make_config
+from benchmarks.stub_cache_server import StubCacheServer, encode_response, make_site
+
+
+class FlakyServer(StubCacheServer):
+    def __init__(self, pages, slow, flaky, recover_after, seed=0, **kwargs):
+        self.slow = slow
+        self.flaky = flaky
+        self.recover_after = recover_after
+        self.rand = random.Random(seed)
+        self.served = Counter()
+        self.asked = Counter()
+        super().__init__(pages, **kwargs)
+
+    def respond(self, url):
+        host = urlparse(url).netloc.split(".")[0]
+        with self.lock:
+            self.asked[host] += 1
+            asked = self.asked[host]
+        if host == "host1":
+            time.sleep(self.slow)
+        if (host == "host2" or (host == "host3" and self.rand.random() < self.flaky)
+                or (host == "host4" and asked <= self.recover_after)):
+            return encode_response(url, 503, "text/html", b"Service Unavailable")
+        self.served[host] += 1
+        return super().respond(url)
+
+
+def crawl(adaptive, seeds, cache_server, args, results):
+    from crawler import Crawler
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config = make_config(
+            os.path.join(tmp, "frontier.shelve"), seeds, cache_server,
+            POLITENESS=args.delay, THREADCOUNT=args.threads, FRONTIER="host",
+            ROBOTS=False, CHECKPOINT_INTERVAL=0, ADAPTIVE_POLITENESS=adaptive,
+            CIRCUIT_FAILURES=args.failures, CIRCUIT_OPEN=args.open, CIRCUIT_TRIPS=args.trips)
+        crawler = Crawler(config, True)
+        start = time.perf_counter()
+        crawler.start()
+        elapsed = time.perf_counter() - start
+        states = getattr(crawler.frontier, "politeness", None)
+        results[adaptive] = (elapsed, states.snapshot() if states else {})
+        crawler.close()
+
+
+def check(adaptive, server, states, args):
+    requests = Counter(urlparse(url).netloc.split(".")[0] for _, url in server.requests)
+    gaps = server.host_gaps()
+    for netloc, gap in gaps.items():
+        assert gap >= args.delay, f"{netloc} fetched {gap:.3f}s apart"
+    if not adaptive:
+        return
+    state = lambda host: states[f"{host}.ics.uci.edu"]
+    # host2's circuit opens after --failures failures in a row, and again
+    # after every failed probe, until it has opened --trips times.
+    assert state("host2")["state"] == "given up", state("host2")
+    assert requests["host2"] <= args.failures * args.trips, requests["host2"]
+    assert gaps["host1.ics.uci.edu"] >= args.delay
+    assert state("host1")["delay"] > args.delay, state("host1")
+    assert state("host0")["delay"] == args.delay, state("host0")
+    assert server.served["host0"] == args.pages, server.served["host0"]
+    # host4 recovers while parked, so its probe succeeds.
+    times = sorted(at for at, url in server.requests if urlparse(url).netloc.startswith("host4."))
+    parked = max(later - earlier for earlier, later in zip(times, times[1:]))
+    assert parked >= args.open, f"host4 was not parked: {parked:.2f}s"
+    assert state("host4")["state"] == "closed", state("host4")
+    assert state("host4")["trips"] == 0, state("host4")
+    assert server.served["host4"] == requests["host4"] - args.failures, server.served["host4"]
+
+
+def main(args):
+    pages, seeds = make_site(hosts=5, pages_per_host=args.pages)
+    results = multiprocessing.Manager().dict()
+    for adaptive in (False, True):
+        server = FlakyServer(pages, args.slow, args.flaky, args.failures)
+        cache_server = server.start()
+        process = multiprocessing.get_context("fork").Process(
+            target=crawl, args=(adaptive, seeds, cache_server, args, results))
+        process.start()
+        process.join()
+        server.stop()
+
+        elapsed, states = results[adaptive]
+        requests = Counter(urlparse(url).netloc.split(".")[0] for _, url in server.requests)
+        gaps = server.host_gaps()
+        print(f"{'adaptive' if adaptive else 'fixed'} politeness: {elapsed:.1f}s, "
+              f"{sum(requests.values())} requests")
+        for host in sorted(requests):
+            netloc = f"{host}.ics.uci.edu"
+            state = states.get(netloc)
+            detail = (f"  {state['state']}, delay {state['delay']:.2f}s, "
+                      f"errors {state['error_rate']:.0%}") if state else ""
+            print(f"  {host}: {requests[host]:4} requests, {server.served[host]:4} pages, "
+                  f"min gap {gaps.get(netloc, float('nan')):.2f}s{detail}")
+        check(adaptive, server, states, args)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--delay", type=float, default=0.05)
+    parser.add_argument("--slow", type=float, default=0.1)
+    parser.add_argument("--flaky", type=float, default=0.2)
+    parser.add_argument("--failures", type=int, default=3)
+    parser.add_argument("--open", type=float, default=0.5)
+    parser.add_argument("--trips", type=int, default=3)
+    args = parser.parse_args()
+    main(args)
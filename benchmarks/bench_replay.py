@@ -0,0 +1,112 @@
+''' Replays a corpus of cache server responses through a full Crawler run,
+served by a local ReplayServer with a fixed latency, and reports for
+each variant: pages/sec, CPU milliseconds per page, peak RSS and the
+mean time of every instrumented stage (see utils/metrics.py).
+
+A variant is a set of config.ini overrides. Each runs in its own forked
+process, so scraper's globals start empty and CPU and RSS are the
+crawl's alone; the server runs in this process.
+
+Run from the repository root:
+    python -m benchmarks.bench_replay [--corpus corpus.bin --seeds URL,...]
+        [--latency SECONDS] [--variant label:KEY=VALUE,KEY=VALUE ...]
+Without --corpus a site is synthesized (see benchmarks.corpus). Without
+--variant the default, host and priority frontiers are compared.
+'''
+import os
+import time
+import resource
+import tempfile
+import multiprocessing
+
+from argparse import ArgumentParser
+
+from benchmarks.common import make_config
+from benchmarks.corpus import ReplayServer, read_corpus, synthesize
+
+DEFAULT_VARIANTS = [
+    "default:FRONTIER=default,THREADCOUNT=1",
+    "host:FRONTIER=host",
+    "priority:FRONTIER=priority",
+]
+
+
+def parse_variant(text):
+    label, _, overrides = text.partition(":")
+    return label, dict(
+        item.split("=", 1) for item in overrides.split(",") if item)
+
+
+def crawl(overrides, seeds, cache_server, args, results, label):
+    import scraper
+    from crawler import Crawler
+    from utils.metrics import metrics
+
+    metrics.enable()
+    options = dict(
+        POLITENESS=args.delay, THREADCOUNT=args.threads, ROBOTS=False,
+        CHECKPOINT_INTERVAL=0)
+    options.update(overrides)
+    with tempfile.TemporaryDirectory() as tmp:
+        config = make_config(
+            os.path.join(tmp, "frontier.shelve"), seeds, cache_server, **options)
+        crawler = Crawler(config, True)
+        start = time.perf_counter()
+        crawler.start()
+        elapsed = time.perf_counter() - start
+        crawler.close()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    stages = {
+        stage: histogram.sum / histogram.count
+        for stage, histogram in metrics.histograms.items() if histogram.count}
+    results[label] = (
+        metrics.pages, elapsed, usage.ru_utime + usage.ru_stime,
+        usage.ru_maxrss, stages, scraper.duplicates.summary())
+
+
+def main(args):
+    if args.corpus:
+        payloads = read_corpus(args.corpus)
+        seeds = args.seeds.split(",")
+    else:
+        payloads, seeds = synthesize(args.hosts, args.pages)
+    variants = [parse_variant(text) for text in args.variant or DEFAULT_VARIANTS]
+    print(f"Replaying {len(payloads)} responses, latency {args.latency}s, "
+          f"{args.threads} threads")
+
+    results = multiprocessing.Manager().dict()
+    for label, overrides in variants:
+        server = ReplayServer(payloads, latency=args.latency)
+        cache_server = server.start()
+        process = multiprocessing.get_context("fork").Process(
+            target=crawl, args=(overrides, seeds, cache_server, args, results, label))
+        process.start()
+        process.join()
+        server.stop()
+
+    for label, _ in variants:
+        if label not in results:
+            print(f"{label:12} FAILED")
+            continue
+        pages, elapsed, cpu, max_rss, stages, duplicates = results[label]
+        print(f"{label:12} {pages / elapsed:8.1f} pages/sec "
+              f"{cpu * 1000 / max(pages, 1):7.2f} ms CPU/page "
+              f"{max_rss / 1024:7.1f} MB peak RSS ({pages} pages in {elapsed:.1f}s)")
+        print("             " + ", ".join(
+            f"{stage} {seconds * 1000:.2f}ms" for stage, seconds in sorted(stages.items())))
+        print(f"             {duplicates}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--corpus", type=str, default=None)
+    parser.add_argument("--seeds", type=str, default=None)
+    parser.add_argument("--hosts", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--variant", action="append")
+    args = parser.parse_args()
+    assert not args.corpus or args.seeds, "--corpus needs --seeds"
+    main(args)
@@ -0,0 +1,80 @@
+''' Compares the old eagerly unpickled Response with the lazy one on the
+checks extract_next_links makes first (status, then size), for error
+pages, an ordinary page and an oversized one, and the peak memory of
+handling the oversized one.
+
+Run from the repository root:
+    python -m benchmarks.bench_response
+'''
+import pickle
+import timeit
+import tracemalloc
+
+import cbor
+
+from benchmarks.stub_cache_server import encode_response
+from utils.response import Response
+
+MAX_PAGE_SIZE = 5000000
+
+
+class EagerResponse(object):
+    ''' utils.response.Response as it was: unpickled in __init__. '''
+
+    def __init__(self, resp_dict):
+        self.url = resp_dict["url"]
+        self.status = resp_dict["status"]
+        self.error = resp_dict["error"] if "error" in resp_dict else None
+        try:
+            self.raw_response = (
+                pickle.loads(resp_dict["response"])
+                if "response" in resp_dict else
+                None)
+        except TypeError:
+            self.raw_response = None
+
+
+def handle_eager(payload):
+    resp = EagerResponse(cbor.loads(payload))
+    if resp.status != 200 or resp.raw_response is None:
+        return None
+    content = resp.raw_response.content
+    if len(content) > MAX_PAGE_SIZE:
+        return None
+    return content
+
+
+def handle_lazy(payload):
+    resp = Response(cbor.loads(payload))
+    if resp.status == 200 and resp.raw_size > MAX_PAGE_SIZE:
+        return None
+    if resp.status != 200 or resp.raw_response is None:
+        return None
+    return resp.raw_response.content
+
+
+def main():
+    page = b"<html><body>" + b"<p>word </p>" * 4000 + b"</body></html>"
+    cases = {
+        "404": encode_response("https://www.ics.uci.edu/x", 404, "text/html", b"Not Found"),
+        "50KB page": encode_response("https://www.ics.uci.edu/p", 200, "text/html", page),
+        "8MB page": encode_response(
+            "https://www.ics.uci.edu/big", 200, "text/html", b"a" * 8000000),
+    }
+    for label, payload in cases.items():
+        assert (handle_eager(payload) is None) == (handle_lazy(payload) is None)
+        number = 20 if "MB" in label else 2000
+        eager = timeit.timeit(lambda: handle_eager(payload), number=number) / number
+        lazy = timeit.timeit(lambda: handle_lazy(payload), number=number) / number
+        print(f"{label:10} eager {eager * 1e6:9.1f} us  lazy {lazy * 1e6:9.1f} us")
+
+    for name, handle in (("eager", handle_eager), ("lazy", handle_lazy)):
+        tracemalloc.start()
+        handle(cases["8MB page"])
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"8MB page peak memory, {name}: {peak / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
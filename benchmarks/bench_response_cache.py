@@ -0,0 +1,91 @@
+''' Measures the response cache (utils/response_cache.py):
+
+    store   put and get times for synthesized payloads, and the disk
+            used once more than RESPONSE_CACHE_MB was put through it
+    crawl   a crawl that records every response, then the same crawl
+            replayed from the cache, against a ReplayServer with latency
+            and a POLITENESS delay: time taken and requests that still
+            reached the server
+
+Each crawl runs in its own forked process, so scraper's globals start
+empty; the server runs in this process.
+
+Run from the repository root:
+    python -m benchmarks.bench_response_cache [--hosts 4] [--pages 50]
+        [--latency 0.02] [--delay 0.05]
+'''
+import os
+import time
+import tempfile
+import multiprocessing
+
+from argparse import ArgumentParser
+
+from benchmarks.common import make_config
+from benchmarks.corpus import ReplayServer, synthesize
+from utils.response_cache import ResponseCache
+
+
+def bench_store(payloads, directory, max_mb, segment_mb):
+    cache = ResponseCache(segment_bytes=int(segment_mb * 1e6))
+    cache.attach(directory, max_mb * 1e6, replay=True)
+    urls = list(payloads)
+    start = time.perf_counter()
+    for url in urls:
+        cache.put(url, payloads[url], 200)
+    put = (time.perf_counter() - start) / len(urls)
+    start = time.perf_counter()
+    hits = sum(cache.get(url) is not None for url in urls)
+    get = (time.perf_counter() - start) / len(urls)
+    disk = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    print(f"store   put {put * 1e6:7.1f} us  get {get * 1e6:7.1f} us  "
+          f"{hits}/{len(urls)} kept, {cache.size / 1e6:.1f} MB live, "
+          f"{disk / 1e6:.1f} MB on disk (limit {max_mb:.1f} MB)")
+    cache.close()
+
+
+def crawl(mode, seeds, cache_server, cache_dir, args, results):
+    from crawler import Crawler
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config = make_config(
+            os.path.join(tmp, "frontier.shelve"), seeds, cache_server,
+            POLITENESS=args.delay, THREADCOUNT=args.threads, FRONTIER="host",
+            ROBOTS=False, CHECKPOINT_INTERVAL=0, RESPONSE_CACHE=mode,
+            RESPONSE_CACHE_DIR=cache_dir)
+        crawler = Crawler(config, True)
+        start = time.perf_counter()
+        crawler.start()
+        results[mode] = time.perf_counter() - start
+        crawler.close()
+
+
+def main(args):
+    payloads, seeds = synthesize(args.hosts, args.pages)
+    with tempfile.TemporaryDirectory() as tmp:
+        total_mb = sum(len(payload) for payload in payloads.values()) / 1e6
+        bench_store(payloads, os.path.join(tmp, "store"), total_mb / 2, total_mb / 8)
+
+        results = multiprocessing.Manager().dict()
+        for mode in ("record", "replay"):
+            server = ReplayServer(payloads, latency=args.latency)
+            cache_server = server.start()
+            process = multiprocessing.get_context("fork").Process(
+                target=crawl,
+                args=(mode, seeds, cache_server, os.path.join(tmp, "crawl"), args, results))
+            process.start()
+            process.join()
+            server.stop()
+            print(f"{mode:7} {results.get(mode, float('nan')):6.2f}s  "
+                  f"{len(server.requests)} requests to the server")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--hosts", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--delay", type=float, default=0.05)
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,67 @@
+''' Memory and throughput of SeenSet against the structures it replaces:
+a set of the 64 character get_urlhash keys (the frontier's probe) and a
+set of full url strings (the old scraper.unique_urls).
+
+Run from the repository root:
+    python -m benchmarks.bench_seen_set [--sizes 1000000,10000000]
+'''
+import time
+import tracemalloc
+
+from argparse import ArgumentParser
+
+from utils import get_urlhash
+from utils.seen_set import SeenSet
+
+
+def urls(count, offset=0):
+    for i in range(offset, offset + count):
+        yield f"https://www.ics.uci.edu/~group{i % 997}/people/page-{i}.html"
+
+
+def measure(label, count, build, probe):
+    tracemalloc.start()
+    start = time.perf_counter()
+    structure = build(count)
+    build_time = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    hits = probe(structure, count)
+    probe_time = time.perf_counter() - start
+    assert hits == count // 2, (label, hits)
+    print(f"  {label:22} {memory / count:7.1f} bytes/url  "
+          f"{count / build_time:10.0f} adds/sec  {count / probe_time:10.0f} probes/sec")
+
+
+def probe_set(structure, count, key=lambda url: url):
+    # Half of the probes are urls already added, half are new.
+    return sum(key(url) in structure for url in urls(count, offset=count // 2))
+
+
+def main(sizes, bloom_bits_per_url):
+    for count in sizes:
+        print(f"{count} urls")
+        measure("set of url strings", count,
+                lambda n: set(urls(n)), probe_set)
+        measure("set of urlhash keys", count,
+                lambda n: {get_urlhash(url) for url in urls(n)},
+                lambda s, n: probe_set(s, n, get_urlhash))
+
+        def build_seen(n, bloom_bits=0):
+            seen = SeenSet(bloom_bits=bloom_bits)
+            for url in urls(n):
+                seen.add(url)
+            return seen
+
+        measure("SeenSet", count, build_seen, probe_set)
+        measure("SeenSet + Bloom", count,
+                lambda n: build_seen(n, bloom_bits_per_url * n), probe_set)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--sizes", default="1000000")
+    parser.add_argument("--bloom-bits-per-url", type=int, default=10)
+    args = parser.parse_args()
+    main([int(size) for size in args.sizes.split(",")], args.bloom_bits_per_url)
@@ -0,0 +1,90 @@
+''' Measures how long a resumed crawl takes to start, for save files of
+several sizes (half of the urls completed) and both SAVE_BACKENDs:
+
+    cold      no snapshot: every record of the save file is read
+    snapshot  from the <SAVE>.pending snapshot the cold run's close() wrote
+
+and for each, in a freshly started interpreter, the time to import the
+crawler, to build the frontier (workers start after this), to get the
+first url, to have every pending url queued, and to close the frontier
+(which writes the snapshot).
+
+Run from the repository root:
+    python -m benchmarks.bench_startup [--sizes 10000,100000,1000000]
+        [--frontier default]
+'''
+import os
+import time
+import shelve
+import dbm.dumb
+import tempfile
+import multiprocessing
+
+from argparse import ArgumentParser
+
+from benchmarks.common import make_config
+from utils import get_urlhash
+
+
+def make_save(path, backend, count):
+    # Imported here: importing the crawler package is part of what the
+    # spawned processes time.
+    from crawler.frontier_log import FrontierLog
+
+    if backend == "log":
+        save = FrontierLog(path)
+    else:
+        save = shelve.Shelf(dbm.dumb.open(path, "c"))
+    for i in range(count):
+        url = f"https://host{i % 50}.ics.uci.edu/group{i % 97}/page{i}"
+        save[get_urlhash(url)] = (url, i % 2 == 0)
+    save.close()
+
+
+def start(path, backend, frontier, results):
+    # Runs in a spawned process, so the imports are timed too.
+    begin = time.perf_counter()
+    from crawler import FRONTIERS
+    imported = time.perf_counter()
+    config = make_config(path, ["https://host0.ics.uci.edu/"], ("127.0.0.1", 1),
+                         SAVE_BACKEND=backend, FRONTIER=frontier, ROBOTS=False)
+    crawler_frontier = FRONTIERS[frontier](config, False)
+    built = time.perf_counter()
+    url = crawler_frontier.get_tbd_url()
+    first = time.perf_counter()
+    crawler_frontier.loaded.wait()
+    loaded = time.perf_counter()
+    queued = crawler_frontier.queued() + (url is not None)
+    crawler_frontier.close()
+    closed = time.perf_counter()
+    results.put((imported - begin, built - begin, first - begin, loaded - begin,
+                 closed - loaded, queued))
+
+
+def main(args):
+    context = multiprocessing.get_context("spawn")
+    print(f"{'backend':8} {'urls':>8} {'run':9} {'import':>7} {'frontier':>9} "
+          f"{'first url':>10} {'loaded':>8} {'close':>7} {'queued':>8}")
+    for backend in args.backends.split(","):
+        for count in map(int, args.sizes.split(",")):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "frontier.save")
+                make_save(path, backend, count)
+                for run in ("cold", "snapshot"):
+                    results = context.Queue()
+                    process = context.Process(
+                        target=start, args=(path, backend, args.frontier, results))
+                    process.start()
+                    imported, built, first, loaded, closed, queued = results.get()
+                    process.join()
+                    print(f"{backend:8} {count:8} {run:9} {imported:7.2f} {built:9.2f} "
+                          f"{first:10.2f} {loaded:8.2f} {closed:7.2f} {queued:8}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--backends", default="shelve,log")
+    parser.add_argument("--frontier", default="default", help="FRONTIER to load into")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,51 @@
+''' Compares the throughput of tokenizer.tokenize, tokenizer.tokenizeFast
+and tokenizer.iterTokens. tests/test_tokenizer.py checks that they return
+the same tokens.
+
+Run from the repository root:
+    python -m benchmarks.bench_tokenizer [--pages N]
+'''
+import time
+import random
+
+from argparse import ArgumentParser
+
+import tokenizer
+
+WORDS = [
+    "crawler", "Information", "retrieval", "UCI", "ics", "2024", "42",
+    "e-mail", "don't", "C++", "x86_64", "naïve", "café", "Ångström",
+    "K-means", "(see", "below)", "foo.bar.baz", "ＡＢＣ", "K", "İstanbul",
+    "tab\tseparated", "http://www.ics.uci.edu/~user/", "3.14159", "---",
+    "über", "résumé", "mixed123abc456", "CamelCaseWord", "snake_case_word",
+]
+
+
+def make_page(rand, words=2000):
+    lines = []
+    for _ in range(words // 10):
+        lines.append(" ".join(rand.choice(WORDS) for _ in range(10)))
+    return "\n".join(lines)
+
+
+def timed(function, pages):
+    start = time.perf_counter()
+    tokens = 0
+    for page in pages:
+        tokens += len(function(page))
+    return tokens / (time.perf_counter() - start)
+
+
+def main(page_count):
+    rand = random.Random(0)
+    pages = [make_page(rand) for _ in range(page_count)]
+    print(f"tokenize:     {timed(tokenizer.tokenize, pages):12.0f} tokens/sec")
+    print(f"tokenizeFast: {timed(tokenizer.tokenizeFast, pages):12.0f} tokens/sec")
+    print(f"iterTokens:   {timed(lambda page: list(tokenizer.iterTokens(page)), pages):12.0f} tokens/sec")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=200)
+    args = parser.parse_args()
+    main(args.pages)
@@ -0,0 +1,85 @@
+''' Compares the word frequency stores (utils/frequency_store.py) on a
+synthetic crawl: words drawn from a Zipf distribution over a vocabulary,
+plus one-off junk tokens (like hashes in code listings) on every page.
+Reports time, peak memory while counting and writing the top words, and
+how far the top words are from the exact counts.
+
+Run from the repository root:
+    python -m benchmarks.bench_word_store [--pages 2000] [--max-words 20000]
+'''
+import time
+import random
+import tempfile
+import tracemalloc
+
+from argparse import ArgumentParser
+from collections import Counter
+
+from utils.frequency_store import FrequencyStore
+
+
+def make_pages(pages, words_per_page, vocabulary, junk_per_page, seed=0):
+    rand = random.Random(seed)
+    words = [f"word{i}" for i in range(vocabulary)]
+    weights = [1 / (rank + 1) for rank in range(vocabulary)]
+    return [
+        Counter(rand.choices(words, weights, k=words_per_page)
+                + [f"{rand.getrandbits(64):016x}" for _ in range(junk_per_page)])
+        for _ in range(pages)]
+
+
+def run(pages, top, **options):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = FrequencyStore(directory=tmp, **options)
+        start = time.perf_counter()
+        for page in pages:
+            store.update(page)
+        ranked = list(store.most_common(top))
+        elapsed = time.perf_counter() - start
+        summary = store.summary()
+
+        tracemalloc.start()
+        store = FrequencyStore(directory=tmp, **options)
+        for page in pages:
+            store.update(page)
+        list(store.most_common(top))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return ranked, elapsed, peak, summary
+
+
+def main(args):
+    pages = make_pages(args.pages, args.words, args.vocabulary, args.junk)
+    exact = Counter()
+    for page in pages:
+        exact.update(page)
+    print(f"{args.pages} pages, {sum(exact.values())} words, {len(exact)} distinct, "
+          f"MAX_WORDS {args.max_words}")
+
+    variants = {
+        "exact": dict(),
+        "spill": dict(max_words=args.max_words, mode="spill"),
+        "sketch": dict(max_words=args.max_words, mode="sketch"),
+    }
+    truth = exact.most_common(args.top)
+    for label, options in variants.items():
+        ranked, elapsed, peak, summary = run(pages, args.top, **options)
+        found = set(word for word, _ in ranked)
+        errors = [count - exact[word] for word, count in ranked]
+        recall = sum(word in found for word, _ in truth) / len(truth)
+        print(f"{label:7} {elapsed:6.2f}s  peak {peak / 1e6:7.1f} MB  top {args.top}: "
+              f"recall {recall:.0%}, overestimate max {max(errors)}, "
+              f"mean {sum(errors) / len(errors):.1f}")
+        print(f"        {summary}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=500)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--junk", type=int, default=100)
+    parser.add_argument("--max-words", type=int, default=20000)
+    parser.add_argument("--top", type=int, default=100)
+    args = parser.parse_args()
+    main(args)
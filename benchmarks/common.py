@@ -0,0 +1,18 @@
+from configparser import ConfigParser
+
+from utils.config import Config
+
+
+def make_config(save_file, seed_urls, cache_server, **overrides):
+    ''' Config built from config.ini with the given LOCAL PROPERTIES /
+    CRAWLER overrides (keys as in config.ini), pointed at cache_server. '''
+    cparser = ConfigParser()
+    cparser.read("config.ini")
+    cparser["LOCAL PROPERTIES"]["SAVE"] = save_file
+    cparser["CRAWLER"]["SEEDURL"] = ",".join(seed_urls)
+    for key, value in overrides.items():
+        section = "CRAWLER" if cparser.has_option("CRAWLER", key) else "LOCAL PROPERTIES"
+        cparser[section][key] = str(value)
+    config = Config(cparser)
+    config.cache_server = cache_server
+    return config
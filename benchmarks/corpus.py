@@ -0,0 +1,141 @@
+''' Corpora of cache server responses for replaying crawls offline.
+
+A corpus file is a sequence of records, each a 4 byte little endian
+length followed by the cbor payload exactly as the cache server sent it
+(see stub_cache_server.encode_response), so replayed responses go
+through the same utils.download / utils.response decoding as live ones.
+
+Synthesize a corpus:
+    python -m benchmarks.corpus synth corpus.bin [--hosts N] [--pages N]
+Record one by crawling through the real cache server (needs the spacetime
+registration used by launch.py); urls past --limit get a 404:
+    python -m benchmarks.corpus record corpus.bin [--limit N]
+'''
+import os
+import struct
+import tempfile
+import threading
+
+from argparse import ArgumentParser
+
+import cbor
+import requests
+
+from benchmarks.stub_cache_server import StubCacheServer, encode_response, make_site
+
+LENGTH = struct.Struct("<I")
+
+
+def write_corpus(path, payloads):
+    ''' Writes the payloads of an iterable of (url, payload). '''
+    count = 0
+    with open(path, "wb") as f:
+        for _, payload in payloads:
+            f.write(LENGTH.pack(len(payload)))
+            f.write(payload)
+            count += 1
+    return count
+
+
+def read_corpus(path):
+    ''' Returns {url: payload} of a corpus file. '''
+    payloads = dict()
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset + LENGTH.size <= len(data):
+        length, = LENGTH.unpack_from(data, offset)
+        payload = data[offset + LENGTH.size:offset + LENGTH.size + length]
+        offset += LENGTH.size + length
+        payloads[cbor.loads(payload)["url"]] = payload
+    return payloads
+
+
+def synthesize(hosts=4, pages_per_host=50, **site_options):
+    ''' Returns ({url: payload}, seed_urls) for a make_site site. '''
+    pages, seeds = make_site(hosts=hosts, pages_per_host=pages_per_host, **site_options)
+    payloads = {
+        url: encode_response(url, status, content_type, body)
+        for url, (status, content_type, body) in pages.items()}
+    return payloads, seeds
+
+
+class ReplayServer(StubCacheServer):
+    ''' StubCacheServer answering with recorded payloads. '''
+
+    def __init__(self, payloads, latency=0.0, **kwargs):
+        self.payloads = payloads
+        super().__init__(dict(), latency=latency, **kwargs)
+
+    def respond(self, url):
+        payload = self.payloads.get(url)
+        if payload is None:
+            return encode_response(url, 404, "text/html", b"Not Found")
+        return payload
+
+
+class RecordingProxy(StubCacheServer):
+    ''' Forwards requests to the real cache server and keeps every payload
+    it returns, for the first limit urls. '''
+
+    def __init__(self, upstream, user_agent, limit=1000, **kwargs):
+        self.upstream = upstream
+        self.user_agent = user_agent
+        self.limit = limit
+        self.recorded = dict()
+        self.record_lock = threading.Lock()
+        super().__init__(dict(), **kwargs)
+
+    def respond(self, url):
+        with self.record_lock:
+            if url in self.recorded:
+                return self.recorded[url]
+            if len(self.recorded) >= self.limit:
+                return encode_response(url, 404, "text/html", b"Not Found")
+        host, port = self.upstream
+        payload = requests.get(
+            f"http://{host}:{port}/",
+            params=[("q", url), ("u", self.user_agent)]).content
+        with self.record_lock:
+            self.recorded[url] = payload
+        return payload
+
+
+def record(path, config_file, limit):
+    from configparser import ConfigParser
+
+    from crawler import Crawler
+    from utils.config import Config
+    from utils.server_registration import get_cache_server
+
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    config = Config(cparser)
+    proxy = RecordingProxy(get_cache_server(config, True), config.user_agent, limit)
+    config.cache_server = proxy.start()
+    with tempfile.TemporaryDirectory() as tmp:
+        # Leave the real save file alone.
+        config.save_file = os.path.join(tmp, "record.shelve")
+        crawler = Crawler(config, True)
+        crawler.start()
+        crawler.close()
+    proxy.stop()
+    count = write_corpus(path, proxy.recorded.items())
+    print(f"Recorded {count} responses to {path}; seeds: {','.join(config.seed_urls)}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("mode", choices=["synth", "record"])
+    parser.add_argument("path", type=str)
+    parser.add_argument("--hosts", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--config_file", type=str, default="config.ini")
+    args = parser.parse_args()
+    if args.mode == "synth":
+        payloads, seeds = synthesize(args.hosts, args.pages)
+        count = write_corpus(args.path, payloads.items())
+        print(f"Wrote {count} responses to {args.path}; seeds: {','.join(seeds)}")
+    else:
+        record(args.path, args.config_file, args.limit)
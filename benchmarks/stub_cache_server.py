@@ -0,0 +1,117 @@
+''' Local stand-in for the spacetime cache server.
+
+Answers GET /?q=<url>&u=<useragent> with the cbor payload utils.download
+expects: {"url", "status", "response": pickled requests.Response}, over
+HTTP/1.1 keep-alive. Pages come from a dict of url -> (status,
+content_type, body); anything else is a 404. Every request is logged with
+its arrival time so politeness can be checked afterwards.
+'''
+import time
+import pickle
+import random
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import cbor
+import requests
+
+
+def encode_response(url, status, content_type, body):
+    raw = requests.models.Response()
+    raw.status_code = status
+    raw._content = body
+    raw.headers["Content-Type"] = content_type
+    raw.url = url
+    raw.encoding = "utf-8"
+    return cbor.dumps({"url": url, "status": status, "response": pickle.dumps(raw)})
+
+
+class StubCacheServer(object):
+    def __init__(self, pages, latency=0.0, host="127.0.0.1", port=0):
+        self.pages = pages
+        self.latency = latency
+        self.requests = list()
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; without this every
+            # response waits for a delayed ACK.
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                url = query.get("q", [""])[0]
+                with server.lock:
+                    server.requests.append((time.monotonic(), url))
+                if server.latency:
+                    time.sleep(server.latency)
+                body = server.respond(url)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/cbor")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    def respond(self, url):
+        ''' Returns the cbor payload for url. Override to inject failures. '''
+        status, content_type, body = self.pages.get(url, (404, "text/html", b"Not Found"))
+        return encode_response(url, status, content_type, body)
+
+    @property
+    def address(self):
+        return self.httpd.server_address[:2]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self.address
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def host_gaps(self):
+        ''' Smallest time between two requests for the same host. '''
+        last, gaps = dict(), dict()
+        for at, url in sorted(self.requests):
+            host = urlparse(url).netloc
+            if host in last:
+                gaps[host] = min(gaps.get(host, float("inf")), at - last[host])
+            last[host] = at
+        return gaps
+
+
+WORDS = ("information retrieval crawler index query ranking student faculty "
+         "research seminar department computer science statistics graduate "
+         "course project lab paper conference award news event talk").split()
+
+
+def make_site(hosts=4, pages_per_host=50, links_per_page=8, words_per_page=300, seed=0):
+    ''' Synthetic set of linked html pages spread over subdomains of
+    ics.uci.edu. Returns (pages, seed_urls). Page text is random so pages
+    are not near-duplicates of each other. '''
+    rand = random.Random(seed)
+    urls = [f"https://host{h}.ics.uci.edu/page/{p}"
+            for h in range(hosts) for p in range(pages_per_host)]
+    pages = dict()
+    for url in urls:
+        links = "".join(
+            f'<a href="{rand.choice(urls)}">link</a> ' for _ in range(links_per_page))
+        text = " ".join(
+            rand.choice(WORDS) + str(rand.randrange(1000)) for _ in range(words_per_page))
+        body = (f"<html><head><title>{url}</title></head>"
+                f"<body><p>{text}</p>{links}</body></html>").encode("utf-8")
+        pages[url] = (200, "text/html; charset=utf-8", body)
+    seeds = [f"https://host{h}.ics.uci.edu/page/0" for h in range(hosts)]
+    return pages, seeds
@@ -1,21 +1,75 @@
+import scraper
 from utils import get_logger
+from utils.stats_checkpoint import StatsCheckpointer
+from utils.metrics import metrics, MetricsReporter
+from utils.duplicates import TIERS
+from utils.response_cache import response_cache
 from crawler.frontier import Frontier
+from crawler.host_frontier import HostFrontier
+from crawler.priority_frontier import PriorityFrontier
 from crawler.worker import Worker
+from crawler.async_worker import AsyncWorker
+
+# Frontier implementations selectable with FRONTIER in config.ini.
+FRONTIERS = {
+    "default": Frontier,
+    "host": HostFrontier,
+    "priority": PriorityFrontier,
+}
+
+# Worker implementations selectable with FETCHER in config.ini.
+WORKERS = {
+    "threads": Worker,
+    "async": AsyncWorker,
+}
 
 class Crawler(object):
-    def __init__(self, config, restart, frontier_factory=Frontier, worker_factory=Worker):
+    def __init__(self, config, restart, frontier_factory=None, worker_factory=None):
         self.config = config
         self.logger = get_logger("CRAWLER")
+        if frontier_factory is None:
+            frontier_factory = FRONTIERS[config.frontier]
+        if worker_factory is None:
+            worker_factory = WORKERS[config.fetcher]
         self.frontier = frontier_factory(config, restart)
+        scraper.stats.configure_words(
+            config.max_words, config.word_store, f"{config.save_file}.words")
+        if config.response_cache != "off":
+            response_cache.attach(
+                config.response_cache_dir, config.response_cache_mb * 1e6,
+                config.response_cache_max_age, replay=config.response_cache == "replay")
+        self.checkpointer = StatsCheckpointer(
+            scraper.stats, f"{config.save_file}.stats", restart,
+            interval=config.checkpoint_interval)
+        self.reporter = None
+        if config.metrics_port or config.metrics_interval:
+            self.reporter = MetricsReporter(config.metrics_port, config.metrics_interval)
+            metrics.gauge("frontier_queued", self.frontier.queued)
+            for tier in TIERS:
+                metrics.gauge(
+                    f"duplicates_{tier}",
+                    lambda tier=tier: scraper.duplicates.hits[tier])
+            politeness = getattr(self.frontier, "politeness", None)
+            if politeness is not None:
+                metrics.view("hosts", politeness.snapshot)
+                metrics.gauge("hosts_backed_off", lambda: sum(
+                    state["state"] != "closed" or state["failures"] > 0
+                    for state in politeness.snapshot().values()))
         self.workers = list()
         self.worker_factory = worker_factory
 
     def start_async(self):
+        if self.config.parse_processes > 0:
+            scraper.start_parse_pool(self.config.parse_processes)
         self.workers = [
             self.worker_factory(worker_id, self.config, self.frontier)
             for worker_id in range(self.config.threads_count)]
         for worker in self.workers:
             worker.start()
+        if self.config.checkpoint_interval > 0:
+            self.checkpointer.start()
+        if self.reporter is not None:
+            self.reporter.start()
 
     def start(self):
         self.start_async()
@@ -24,3 +78,14 @@ class Crawler(object):
     def join(self):
         for worker in self.workers:
             worker.join()
+        scraper.stop_parse_pool()
+
+    def close(self):
+        ''' Saves the frontier and a last statistics checkpoint. '''
+        self.frontier.close()
+        self.checkpointer.close()
+        if self.config.response_cache != "off":
+            self.logger.info(response_cache.summary())
+            response_cache.close()
+        if self.reporter is not None:
+            self.reporter.close()
@@ -0,0 +1,90 @@
+import time
+import asyncio
+
+from threading import Thread
+from urllib.parse import urlparse
+
+from utils import get_logger
+from utils.metrics import metrics
+from utils.response_cache import response_cache
+import scraper
+
+
+class AsyncWorker(Thread):
+    ''' Worker that keeps config.async_concurrency downloads in flight on
+    one asyncio event loop, over a keep-alive connection pool to the cache
+    server.
+
+    Politeness comes from the frontier: urls are taken with
+    poll_tbd_url(), so the frontier must be a HostFrontier. Parsing and
+    frontier updates run in the loop's thread pool so they do not stall
+    the downloads. A url that raises is logged and completed, so it
+    neither cancels the other downloads nor leaves its host busy. '''
+
+    def __init__(self, worker_id, config, frontier):
+        self.logger = get_logger(f"Worker-{worker_id}", "Worker")
+        self.config = config
+        self.frontier = frontier
+        assert hasattr(frontier, "poll_tbd_url"), "FETCHER = async needs FRONTIER = host"
+        super().__init__(daemon=True)
+
+    def run(self):
+        asyncio.run(self._crawl())
+
+    async def _crawl(self):
+        # Imported here so aiohttp is only needed when FETCHER = async.
+        from utils.async_download import make_session
+
+        async with make_session(self.config) as session:
+            await asyncio.gather(*[
+                self._fetch_loop(session)
+                for _ in range(self.config.async_concurrency)])
+        self.logger.info("Frontier is empty. Stopping Crawler.")
+
+    async def _fetch_loop(self, session):
+        from utils.async_download import download
+
+        loop = asyncio.get_running_loop()
+        while True:
+            tbd_url, wait = self.frontier.poll_tbd_url()
+            if tbd_url is None:
+                if wait == 0:
+                    return
+                # No completion callback reaches the loop, so re-check
+                # busy hosts on a short interval.
+                await asyncio.sleep(min(wait, 0.05) if wait else 0.05)
+                continue
+            fetched = False
+            try:
+                reason = await loop.run_in_executor(
+                    None, self.frontier.skip_reason, tbd_url)
+                if reason is not None:
+                    self.logger.info(f"Skipped {tbd_url}, {reason}.")
+                    continue
+                resp = response_cache.get(tbd_url)
+                fetched = resp is None
+                if fetched:
+                    start = time.monotonic()
+                    with metrics.span("download"):
+                        resp = await download(tbd_url, self.config, session, self.logger)
+                    self.frontier.record_fetch(tbd_url, resp.status, time.monotonic() - start)
+                metrics.count_page(urlparse(tbd_url).netloc, resp.status)
+                self.logger.info(
+                    f"Downloaded {tbd_url}, status <{resp.status}>, "
+                    f"using cache {self.config.cache_server if fetched else 'replay'}.")
+                await loop.run_in_executor(None, self._process, tbd_url, resp)
+            except Exception:
+                self.logger.exception(f"Failed to crawl {tbd_url}.")
+            finally:
+                await loop.run_in_executor(None, self._complete, tbd_url, fetched)
+
+    def _process(self, tbd_url, resp):
+        with metrics.span("scraper"):
+            scraped_urls = scraper.scraper(tbd_url, resp)
+        with metrics.span("add_url"):
+            for scraped_url in scraped_urls:
+                self.frontier.add_url(scraped_url, tbd_url)
+
+    def _complete(self, tbd_url, fetched):
+        with metrics.span("mark_url_complete"):
+            self.frontier.mark_url_complete(tbd_url, fetched)
@@ -1,16 +1,38 @@
 import os
+import time
 import shelve
+import struct
 
-from threading import Thread, RLock
+from threading import Thread, RLock, Lock, Event
+from urllib.parse import urlparse
 from queue import Queue, Empty
 
-from utils import get_logger, get_urlhash, normalize
-from scraper import is_valid
+from utils import get_logger, get_urlhash
+from utils.canonical import canonicalizer, canonicalize
+import scraper
+from scraper import is_valid, unique_pages, traps, get_sitemap_urls
+from crawler.frontier_log import FrontierLog
+from crawler.robots import RobotsCache
+from utils.seen_set import SeenSet
+
+# Header of the <SAVE>.pending snapshot: magic, records in the save file,
+# pending urls, then slots and count of the SeenSet table that follows.
+# The pending urls come last, one per line.
+SNAPSHOT = struct.Struct("<8sQQQQ")
+SNAPSHOT_MAGIC = b"PENDING1"
 
 class Frontier(object):
+    # Set by frontiers that enforce the per-host delay themselves, so the
+    # Worker does not have to sleep after every download.
+    handles_politeness = False
+    # In a partitioned crawl (crawler.partition), forwards urls of hosts
+    # other nodes own.
+    router = None
+
     def __init__(self, config, restart):
         self.logger = get_logger("FRONTIER")
         self.config = config
+        canonicalizer.configure(config.strip_params)
         self.to_be_downloaded = list()
         
         if not os.path.exists(self.config.save_file) and not restart:
@@ -23,10 +45,43 @@ class Frontier(object):
             self.logger.info(
                 f"Found save file {self.config.save_file}, deleting it.")
             os.remove(self.config.save_file)
+        self.snapshot_path = f"{self.config.save_file}.pending"
+        if restart and os.path.exists(self.snapshot_path):
+            os.remove(self.snapshot_path)
         # Load existing save file, or create one if it does not exist.
-        import dbm.dumb
-        self.save = shelve.Shelf(dbm.dumb.open(self.config.save_file, "c"))
+        if self.config.save_backend == "log":
+            self.save = FrontierLog(self.config.save_file)
+        else:
+            import dbm.dumb
+            self.save = shelve.Shelf(dbm.dumb.open(self.config.save_file, "c"))
+        self.robots = RobotsCache(config, restart) if config.obey_robots else None
+        # Urls that may still be pending, for the snapshot close() writes,
+        # and the hashes of those completed since the list was last pruned.
+        self.unfinished = list()
+        self.finished = SeenSet()
+        self.unfinished_lock = Lock()
+        self.unfinished_known = restart
+        # Set once every pending url of the save file is queued.
+        self.loaded = Event()
+        self.stop_loading = Event()
+        self.loader = None
+        self.snapshot_urls = self.save_keys = None
+        snapshot = None if restart else self._read_snapshot()
+        if snapshot is None:
+            # Every url hash in the save file, so add_url never probes it.
+            # Listed first: workers add keys while the urls are loaded.
+            self.save_keys = list(self.save.keys())
+            self.seen = SeenSet(capacity=2 * len(self.save_keys))
+            for urlhash in self.save_keys:
+                self.seen.add_key(urlhash)
+        else:
+            self.seen, self.snapshot_urls = snapshot
+        # Simhash fingerprints are kept next to the save file so a resumed
+        # crawl still recognizes pages it has already seen.
+        unique_pages.attach(f"{self.config.save_file}.simhash", restart)
+        traps.attach(f"{self.config.save_file}.traps.json", restart)
         if restart:
+            self.loaded.set()
             for url in self.config.seed_urls:
                 self.add_url(url)
         else:
@@ -37,37 +92,246 @@ class Frontier(object):
                     self.add_url(url)
 
     def _parse_save_file(self):
-        ''' This function can be overridden for alternate saving techniques. '''
+        ''' Queues the pending urls of the save file from a background
+        thread, so workers start on the first urls while the rest load.
+        This function can be overridden for alternate saving techniques. '''
+        self.loader = Thread(
+            target=self._load, args=(self._pending_urls(),),
+            name="FrontierLoader", daemon=True)
+        self.loader.start()
+
+    def _load(self, urls):
         total_count = len(self.save)
         tbd_count = 0
-        for url, completed in self.save.values():
-            if not completed and is_valid(url):
-                self.to_be_downloaded.append(url)
-                tbd_count += 1
-        self.logger.info(
-            f"Found {tbd_count} urls to be downloaded from {total_count} "
-            f"total urls discovered.")
-
-    def get_tbd_url(self):
         try:
-            return self.to_be_downloaded.pop()
-        except IndexError:
+            for url in urls:
+                if self.stop_loading.is_set():
+                    return
+                if is_valid(url):
+                    self._enqueue(url)
+                    tbd_count += 1
+            self.logger.info(
+                f"Found {tbd_count} urls to be downloaded from {total_count} "
+                f"total urls discovered.")
+        finally:
+            self._done_loading()
+
+    def _done_loading(self):
+        ''' Called once the loader has queued every pending url. '''
+        self.loaded.set()
+
+    def _stop_loading(self):
+        self.stop_loading.set()
+        if self.loader is not None:
+            self.loader.join()
+
+    def _pending_urls(self):
+        ''' Iterator over the urls of the save file not downloaded yet:
+        the lines of the snapshot if there was one, else every record of
+        the save file, unpickled one by one. '''
+        if self.snapshot_urls is not None:
+            urls, self.snapshot_urls = self.snapshot_urls, None
+            self.unfinished.extend(urls)
+            self.unfinished_known = True
+            return iter(urls)
+        return self._read_pending()
+
+    def _read_pending(self):
+        keys, self.save_keys = self.save_keys, None
+        for urlhash in keys:
+            url, completed = self.save[urlhash]
+            if not completed:
+                with self.unfinished_lock:
+                    self.unfinished.append(url)
+                yield url
+        self.unfinished_known = True
+
+    def _read_snapshot(self):
+        ''' (SeenSet, pending urls) from the snapshot the last close()
+        wrote, in one read, or None if there is none or it does not match
+        the save file. The snapshot is removed once read, so a run that
+        does not close cleanly leaves none behind. '''
+        if not os.path.exists(self.snapshot_path):
             return None
+        with open(self.snapshot_path, "rb") as f:
+            data = f.read()
+        os.remove(self.snapshot_path)
+        if len(data) >= SNAPSHOT.size:
+            magic, records, pending, slots, count = SNAPSHOT.unpack_from(data)
+            start = SNAPSHOT.size + 8 * slots
+            if magic == SNAPSHOT_MAGIC and records == len(self.save) and start <= len(data):
+                text = str(data[start:], "utf-8")
+                urls = text.split("\n") if text else list()
+                if len(urls) == pending:
+                    seen = SeenSet.from_bytes(memoryview(data)[SNAPSHOT.size:start], count)
+                    self.logger.info(
+                        f"Read {pending} pending urls from {self.snapshot_path}.")
+                    return seen, urls
+        self.logger.warning(
+            f"Snapshot {self.snapshot_path} does not match the save file, "
+            f"reading the save file instead.")
+        return None
+
+    def _prune_unfinished(self):
+        with self.unfinished_lock:
+            finished = self.finished
+            if not finished:
+                return
+            self.unfinished = [
+                url for url in self.unfinished
+                if not finished.contains_key(get_urlhash(url))]
+            self.finished = SeenSet()
 
-    def add_url(self, url):
-        url = normalize(url)
+    def _write_snapshot(self, records):
+        self._prune_unfinished()
+        tmp_path = f"{self.snapshot_path}.tmp"
+        table = self.seen.to_bytes()
+        with open(tmp_path, "wb") as f:
+            f.write(SNAPSHOT.pack(
+                SNAPSHOT_MAGIC, records, len(self.unfinished),
+                len(table) // 8, len(self.seen)))
+            f.write(table)
+            f.write("\n".join(self.unfinished).encode("utf-8"))
+        os.replace(tmp_path, self.snapshot_path)
+
+    def _enqueue(self, url, parent=None):
+        ''' Queues a url for download. Overridden by alternate frontiers. '''
+        self.to_be_downloaded.append(url)
+
+    def _found_again(self, urlhash):
+        ''' Called when add_url is given a url that was already added, for
+        frontiers that rank urls by how often they are linked. '''
+        pass
+
+    def skip_reason(self, url):
+        ''' Why a queued url should not be downloaded, or None. '''
+        reason = traps.blocked_reason(url)
+        if reason is not None:
+            return f"trap ({reason})"
+        if not self.allowed_by_robots(url):
+            return "disallowed by robots.txt"
+        return None
+
+    def allowed_by_robots(self, url):
+        ''' Checks url against its host's robots.txt. The first time a host
+        is checked, its Crawl-delay is applied and the urls of its
+        sitemaps are added to the frontier. '''
+        if self.robots is None:
+            return True
+        rules, first = self.robots.rules_for(url)
+        if first:
+            if rules.crawl_delay is not None:
+                self.set_host_delay(urlparse(url).netloc.lower(), rules.crawl_delay)
+            self._add_sitemaps(rules)
+        return self.robots.allowed(url)
+
+    def _add_sitemaps(self, rules, max_sitemaps=10):
+        ''' Fetches the sitemaps robots.txt lists, and the sitemaps those
+        list in turn (sitemap indexes), up to max_sitemaps per host, and
+        adds every url they list. Each fetch waits the host's delay. '''
+        delay = max(self.config.time_delay, rules.crawl_delay or 0)
+        queue = list(rules.sitemaps)
+        fetched = set()
+        while queue and len(fetched) < max_sitemaps:
+            sitemap = queue.pop(0)
+            if sitemap in fetched or not is_valid(sitemap):
+                continue
+            fetched.add(sitemap)
+            content = self.robots.fetch(sitemap, max_size=scraper.MAX_PAGE_SIZE)
+            time.sleep(delay)
+            if content is None:
+                continue
+            try:
+                urls = get_sitemap_urls(content)
+            except Exception as e:
+                self.logger.info(f"Could not parse sitemap {sitemap}: {e}")
+                continue
+            added = 0
+            for url in urls:
+                if urlparse(url).path.lower().endswith(".xml"):
+                    queue.append(url)
+                elif is_valid(url):
+                    self.add_url(url, sitemap)
+                    added += 1
+            self.logger.info(f"Added {added} urls from sitemap {sitemap}.")
+
+    def set_host_delay(self, host, delay):
+        ''' Frontiers that schedule per host use this as the host's minimum
+        delay; the default frontier sleeps POLITENESS for every host. '''
+        pass
+
+    def record_fetch(self, url, status, seconds):
+        ''' Called with the status and duration of every download, for
+        frontiers that adapt each host's delay to them. '''
+        pass
+
+    def queued(self):
+        ''' Number of urls waiting to be downloaded. '''
+        return len(self.to_be_downloaded)
+
+    def get_tbd_url(self):
+        ''' Returns None once the frontier is empty; while the save file
+        is still being loaded, waits for urls instead. '''
+        while True:
+            loaded = self.loaded.is_set()
+            try:
+                return self.to_be_downloaded.pop()
+            except IndexError:
+                if loaded:
+                    return None
+                self.loaded.wait(0.05)
+
+    def add_url(self, url, parent=None):
+        ''' Adds url if it is new. parent is the url whose page linked to
+        it, if any. '''
+        url = canonicalize(url)
+        if self.router is not None and not self.router.owns(url):
+            self.router.forward(url)
+            return
         urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            self.save[urlhash] = (url, False)
-            self.save.sync()
-            self.to_be_downloaded.append(url)
+        if self.seen.contains_key(urlhash):
+            self._found_again(urlhash)
+            return
+        # Refused urls are not marked seen: a throttled url may be admitted
+        # when it is offered again.
+        reason = traps.admit(url)
+        if reason is not None:
+            self.logger.debug(f"Not adding {url}, trap ({reason}).")
+            return
+        if not self.seen.add_key(urlhash):
+            # Another thread added it in the meantime.
+            self._found_again(urlhash)
+            return
+        self.save[urlhash] = (url, False)
+        self.save.sync()
+        with self.unfinished_lock:
+            self.unfinished.append(url)
+        self._enqueue(url, parent)
     
-    def mark_url_complete(self, url):
+    def mark_url_complete(self, url, fetched=True):
+        ''' fetched is False when the page came from the response cache
+        rather than the cache server, so the host was not contacted. '''
         urlhash = get_urlhash(url)
-        if urlhash not in self.save:
+        if not self.seen.contains_key(urlhash):
             # This should not happen.
             self.logger.error(
                 f"Completed url {url}, but have not seen it before.")
 
         self.save[urlhash] = (url, True)
         self.save.sync()
+        with self.unfinished_lock:
+            self.finished.add_key(urlhash)
+            prune = 2 * len(self.finished) > len(self.unfinished)
+        if prune:
+            self._prune_unfinished()
+
+    def close(self):
+        ''' Writes out anything the save file still buffers, and the
+        snapshot of pending urls the next run resumes from. '''
+        self._stop_loading()
+        records = len(self.save)
+        self.save.close()
+        if self.unfinished_known:
+            self._write_snapshot(records)
+        unique_pages.close()
+        traps.close()
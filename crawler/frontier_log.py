@@ -0,0 +1,140 @@
+import os
+import time
+import zlib
+
+from threading import RLock
+
+
+class FrontierLog(object):
+    ''' Append-only, batched replacement for the frontier shelve.
+
+    Behaves like the parts of a shelve the Frontier uses: it maps a url
+    hash to a (url, completed) tuple. The whole mapping is kept in memory
+    and every assignment is also appended to a log file, one line per
+    record:
+
+        <crc32 of the rest of the line>\\t<urlhash>\\t<0|1>\\t<url>\\n
+
+    Records are buffered and written with a single fsync once batch_size
+    records are pending or flush_interval seconds have passed since the
+    last flush (checked on sync()). A crash therefore loses at most the
+    last unflushed batch, and what is left on disk is always a prefix of
+    the operations, so reopening rebuilds a consistent frontier. A torn or
+    corrupt line at the end of the file is dropped on open.
+
+    Every url is normally written twice (discovered, then completed). When
+    the log holds more than compact_ratio records per live url, it is
+    compacted: the live mapping is written to a temporary file which then
+    atomically replaces the log. '''
+
+    def __init__(self, path, batch_size=512, flush_interval=1.0,
+                 compact_ratio=1.5, compact_min=100000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min
+        self.lock = RLock()
+        self.data = dict()
+        self.records = 0
+        self.pending = list()
+        self.last_flush = time.monotonic()
+        self._load()
+        self.file = open(self.path, "a", encoding="utf-8", newline="\n")
+
+    @staticmethod
+    def _encode(urlhash, url, completed):
+        # Tabs and newlines would break the line format; urljoin already
+        # strips them from links, this only guards hand-added urls.
+        url = (url.replace("\t", "%09")
+                  .replace("\n", "%0A")
+                  .replace("\r", "%0D"))
+        body = f"{urlhash}\t{1 if completed else 0}\t{url}"
+        crc = zlib.crc32(body.encode("utf-8"))
+        return f"{crc:08x}\t{body}\n"
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        good_bytes = 0
+        with open(self.path, "rb") as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                try:
+                    crc, body = raw[:-1].split(b"\t", 1)
+                    if int(crc, 16) != zlib.crc32(body):
+                        break
+                    urlhash, completed, url = body.decode("utf-8").split("\t", 2)
+                except ValueError:
+                    break
+                self.data[urlhash] = (url, completed == "1")
+                self.records += 1
+                good_bytes += len(raw)
+        if good_bytes != os.path.getsize(self.path):
+            # Drop the torn tail so new records are not appended to it.
+            with open(self.path, "r+b") as f:
+                f.truncate(good_bytes)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, urlhash):
+        return urlhash in self.data
+
+    def __getitem__(self, urlhash):
+        return self.data[urlhash]
+
+    def __setitem__(self, urlhash, value):
+        url, completed = value
+        with self.lock:
+            self.data[urlhash] = (url, completed)
+            self.pending.append(self._encode(urlhash, url, completed))
+            self.records += 1
+
+    def keys(self):
+        return self.data.keys()
+
+    def values(self):
+        return self.data.values()
+
+    def items(self):
+        return self.data.items()
+
+    def sync(self):
+        ''' Flushes pending records if the batch is full or old enough. '''
+        with self.lock:
+            if (len(self.pending) >= self.batch_size
+                    or (self.pending and time.monotonic() - self.last_flush
+                        >= self.flush_interval)):
+                self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.pending:
+                self.file.write("".join(self.pending))
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.pending = list()
+            self.last_flush = time.monotonic()
+            if (self.records > self.compact_min
+                    and self.records > self.compact_ratio * len(self.data)):
+                self.compact()
+
+    def compact(self):
+        with self.lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8", newline="\n") as f:
+                for urlhash, (url, completed) in self.data.items():
+                    f.write(self._encode(urlhash, url, completed))
+                f.flush()
+                os.fsync(f.fileno())
+            self.file.close()
+            os.replace(tmp_path, self.path)
+            self.file = open(self.path, "a", encoding="utf-8", newline="\n")
+            self.records = len(self.data)
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.file.close()
@@ -0,0 +1,163 @@
+import time
+import heapq
+
+from collections import deque
+from threading import RLock, Condition
+from urllib.parse import urlparse
+
+from crawler.frontier import Frontier
+from crawler.politeness import PolitenessController
+
+
+def get_host(url):
+    return urlparse(url).netloc.lower()
+
+
+class HostFrontier(Frontier):
+    ''' Frontier that keeps one queue per host and hands out urls in order
+    of the time each host may next be fetched.
+
+    A host is never handed to two workers at once: it leaves the schedule
+    when one of its urls is handed out and is put back, config.time_delay
+    seconds (or the host's robots.txt Crawl-delay, if longer) later, when
+    that url is marked complete. With N workers this
+    keeps N different hosts busy while every host still gets its delay.
+    With ADAPTIVE_POLITENESS the delay comes from a PolitenessController
+    instead, which backs off from failing hosts and parks them. Safe to
+    share between Worker threads. '''
+
+    handles_politeness = True
+
+    def __init__(self, config, restart):
+        self.lock = RLock()
+        self.changed = Condition(self.lock)
+        # host -> deque of urls waiting to be downloaded.
+        self.host_queues = dict()
+        # host -> earliest time (time.monotonic) the host may be fetched.
+        self.next_fetch = dict()
+        # Heap of (next_fetch, host) for idle hosts with queued urls.
+        self.schedule = list()
+        self.scheduled = set()
+        # Hosts with a url currently handed out to a worker.
+        self.busy = set()
+        # host -> Crawl-delay from robots.txt, when longer than time_delay.
+        self.host_delays = dict()
+        self.politeness = None
+        if config.adaptive_politeness:
+            self.politeness = PolitenessController(
+                config.time_delay, max_delay=config.max_delay,
+                circuit_failures=config.circuit_failures,
+                open_seconds=config.circuit_open, max_trips=config.circuit_trips)
+            self.politeness.attach(f"{config.save_file}.politeness.json", restart)
+        super().__init__(config, restart)
+
+    def _enqueue(self, url, parent=None):
+        host = get_host(url)
+        if self.politeness is not None and self.politeness.given_up(host):
+            # Stays pending in the save file for a later run.
+            return
+        with self.lock:
+            queue = self.host_queues.get(host)
+            if queue is None:
+                queue = self.host_queues[host] = deque()
+            queue.append(url)
+            self._schedule(host)
+
+    def _schedule(self, host):
+        if host in self.busy or host in self.scheduled:
+            return
+        if not self.host_queues.get(host):
+            return
+        heapq.heappush(
+            self.schedule, (self.next_fetch.get(host, 0.0), host))
+        self.scheduled.add(host)
+        self.changed.notify_all()
+
+    def queued(self):
+        with self.lock:
+            return sum(len(queue) for queue in self.host_queues.values())
+
+    def poll_tbd_url(self):
+        ''' Non-blocking get_tbd_url. Returns (url, 0) if some host may be
+        fetched now, (None, seconds) if the caller should check again
+        after at most that long (None seconds when only busy hosts are
+        left, whose completion time is unknown, or the save file is still
+        being loaded), and (None, 0) once the crawl is finished. '''
+        with self.lock:
+            if self.schedule:
+                ready_at, host = self.schedule[0]
+                wait = ready_at - time.monotonic()
+                if wait > 0:
+                    return None, wait
+                heapq.heappop(self.schedule)
+                self.scheduled.discard(host)
+                self.busy.add(host)
+                queue = self.host_queues[host]
+                url = queue.popleft()
+                if not queue:
+                    del self.host_queues[host]
+                return url, 0
+            if self.busy or not self.loaded.is_set():
+                return None, None
+            return None, 0
+
+    def get_tbd_url(self):
+        ''' Blocks until some host is allowed to be fetched and returns its
+        next url. Returns None once every queue is empty and no url is
+        being downloaded, since nothing can be added after that. '''
+        with self.lock:
+            while True:
+                url, wait = self.poll_tbd_url()
+                if url is not None:
+                    return url
+                if wait == 0:
+                    return None
+                self.changed.wait(wait)
+
+    def _done_loading(self):
+        with self.lock:
+            super()._done_loading()
+            self.changed.notify_all()
+
+    def add_url(self, url, parent=None):
+        with self.lock:
+            super().add_url(url, parent)
+
+    def set_host_delay(self, host, delay):
+        with self.lock:
+            if delay > self.config.time_delay:
+                self.host_delays[host] = delay
+        if self.politeness is not None:
+            self.politeness.set_floor(host, delay)
+
+    def record_fetch(self, url, status, seconds):
+        if self.politeness is not None:
+            self.politeness.record(get_host(url), status, seconds)
+
+    def mark_url_complete(self, url, fetched=True):
+        host = get_host(url)
+        with self.lock:
+            super().mark_url_complete(url, fetched)
+            if fetched:
+                if self.politeness is None:
+                    delay = self.host_delays.get(host, self.config.time_delay)
+                else:
+                    delay = self.politeness.delay(host)
+                    if self.politeness.given_up(host) and host in self.host_queues:
+                        dropped = len(self.host_queues.pop(host))
+                        self.logger.warning(
+                            f"Giving up on {host} after repeated failures, "
+                            f"leaving {dropped} urls for a later run.")
+                self.next_fetch[host] = time.monotonic() + delay
+            self.busy.discard(host)
+            self._schedule(host)
+            # Workers waiting for the last busy host have to re-check.
+            self.changed.notify_all()
+
+    def close(self):
+        # The loader needs the lock to finish.
+        self._stop_loading()
+        with self.lock:
+            super().close()
+            if self.politeness is not None:
+                self.politeness.close()
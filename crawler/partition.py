@@ -0,0 +1,276 @@
+''' Partitioned crawl: several crawler processes, each owning the hosts
+whose hash falls in its partition.
+
+Every node runs an ordinary Crawler with its own save file
+(<SAVE>.node<i>) and its own statistics checkpoint. Urls found for a host
+another node owns are forwarded to it in batches over a multiprocessing
+queue. Because a host is only ever crawled by one node, per-host
+politeness, robots.txt and trap statistics stay local to that node.
+
+Duplicate detection is local too: every node keeps its own simhash index,
+so a page mirrored on hosts owned by different nodes is crawled and
+counted (words, longest page) once per node. bench_partition reports the
+words this adds.
+
+The crawl is over when every node is idle (nothing queued, nothing being
+downloaded, nothing left to forward) and every forwarded batch has been
+received. The parent checks this on two successive reads of the nodes'
+counters and then tells the nodes to stop; the statistics of all nodes
+are then merged for the report. If a node dies, the others are told to
+stop as well (saving their progress) and run_partitioned raises.
+'''
+import os
+import time
+import queue
+import threading
+import multiprocessing
+
+from copy import copy
+from hashlib import blake2b
+from urllib.parse import urlparse
+
+from utils import get_logger
+from utils.analytics import CrawlStats
+from utils.seen_set import SeenSet
+from utils.stats_checkpoint import load_checkpoint
+
+# Counters each node keeps in the shared array, per node.
+IDLE, SENT, RECEIVED = range(3)
+
+
+def owner(url, nodes):
+    ''' Node that crawls url's host. '''
+    host = urlparse(url).netloc.lower().encode("utf-8")
+    return int.from_bytes(blake2b(host, digest_size=8).digest(), "little") % nodes
+
+
+class Router(object):
+    ''' Buffers urls for other nodes and sends them in batches of
+    batch_size, or every flush_interval seconds. Each url is forwarded at
+    most once. '''
+
+    def __init__(self, node_id, nodes, inboxes, counters, batch_size=256, flush_interval=0.1):
+        self.node_id = node_id
+        self.nodes = nodes
+        self.inboxes = inboxes
+        self.counters = counters
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.outboxes = [list() for _ in range(nodes)]
+        self.forwarded = SeenSet()
+        self.stopped = threading.Event()
+        self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self.flusher.start()
+
+    def owns(self, url):
+        return owner(url, self.nodes) == self.node_id
+
+    def forward(self, url):
+        if not self.forwarded.add(url):
+            return
+        target = owner(url, self.nodes)
+        with self.lock:
+            outbox = self.outboxes[target]
+            outbox.append(url)
+            if len(outbox) >= self.batch_size:
+                self._send(target)
+
+    def _send(self, target):
+        batch, self.outboxes[target] = self.outboxes[target], list()
+        # Counted before it is sent, so it is never received uncounted.
+        self.counters[3 * self.node_id + SENT] += 1
+        self.inboxes[target].put(batch)
+
+    def flush(self):
+        with self.lock:
+            for target, outbox in enumerate(self.outboxes):
+                if outbox:
+                    self._send(target)
+
+    def _flush_loop(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+
+    def set_idle(self, idle):
+        self.counters[3 * self.node_id + IDLE] = int(idle)
+
+    def count_received(self):
+        self.counters[3 * self.node_id + RECEIVED] += 1
+
+    def close(self):
+        self.stopped.set()
+        self.flusher.join()
+        self.flush()
+
+
+class PartitionedFrontier(object):
+    ''' Wraps the frontier of one node. Urls for other nodes' hosts are
+    routed away by Frontier.add_url itself (through frontier.router), and
+    urls from other nodes are added by a receiver thread. Running out of
+    urls only ends the node's crawl once the parent says the whole crawl
+    is done. Everything else is passed through to the frontier. '''
+
+    def __init__(self, frontier, router, inbox, done):
+        self.frontier = frontier
+        self.router = router
+        self.inbox = inbox
+        self.done = done
+        self.lock = threading.RLock()
+        # Urls handed to workers and not completed yet.
+        self.active = 0
+        frontier.router = router
+        self.receiver = threading.Thread(target=self._receive, daemon=True)
+        self.receiver.start()
+
+    def __getattr__(self, name):
+        return getattr(self.frontier, name)
+
+    def _receive(self):
+        while not self.done.is_set():
+            try:
+                batch = self.inbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            with self.lock:
+                self.router.set_idle(False)
+                for url in batch:
+                    self.frontier.add_url(url)
+                self.router.count_received()
+
+    def poll_tbd_url(self):
+        ''' Same contract as HostFrontier.poll_tbd_url. '''
+        with self.lock:
+            if hasattr(self.frontier, "poll_tbd_url"):
+                url, wait = self.frontier.poll_tbd_url()
+            else:
+                url, wait = self.frontier.get_tbd_url(), 0
+            if url is not None:
+                self.active += 1
+                return url, 0
+            if wait == 0 and self.active == 0:
+                self.router.flush()
+                self.router.set_idle(True)
+                if self.done.is_set():
+                    return None, 0
+                return None, 0.05
+            return None, wait or 0.05
+
+    def get_tbd_url(self):
+        while True:
+            url, wait = self.poll_tbd_url()
+            if url is not None:
+                return url
+            if wait == 0:
+                return None
+            self.done.wait(min(wait, 0.05))
+
+    def add_url(self, url, parent=None):
+        with self.lock:
+            self.frontier.add_url(url, parent)
+
+    def mark_url_complete(self, url, fetched=True):
+        with self.lock:
+            self.frontier.mark_url_complete(url, fetched)
+            self.active -= 1
+
+    def close(self):
+        self.receiver.join()
+        self.router.close()
+        self.frontier.close()
+
+
+def node_config(config, node_id, nodes):
+    ''' Copy of config for one node: its own save file, metrics port,
+    response cache and only the seeds it owns. '''
+    config = copy(config)
+    config.seed_urls = [url for url in config.seed_urls if owner(url, nodes) == node_id]
+    config.save_file = f"{config.save_file}.node{node_id}"
+    if config.metrics_port:
+        config.metrics_port += node_id
+    # Hosts stay with the same node for a given NODES, so each node can
+    # keep its own response cache.
+    config.response_cache_dir = os.path.join(config.response_cache_dir, f"node{node_id}")
+    return config
+
+
+def _run_node(node_id, nodes, config, restart, inboxes, counters, done):
+    from crawler import Crawler, FRONTIERS
+
+    config = node_config(config, node_id, nodes)
+    router = Router(node_id, nodes, inboxes, counters)
+
+    def frontier_factory(config, restart):
+        frontier = FRONTIERS[config.frontier](config, restart)
+        return PartitionedFrontier(frontier, router, inboxes[node_id], done)
+
+    crawler = Crawler(config, restart, frontier_factory=frontier_factory)
+    try:
+        crawler.start()
+    finally:
+        crawler.close()
+
+
+def _all_done(counters, nodes):
+    values = counters[:]
+    idle = all(values[3 * node + IDLE] for node in range(nodes))
+    sent = sum(values[3 * node + SENT] for node in range(nodes))
+    received = sum(values[3 * node + RECEIVED] for node in range(nodes))
+    return idle and sent == received, values
+
+
+def merged_stats(config, nodes):
+    ''' CrawlStats holding the final statistics of every node. '''
+    stats = CrawlStats()
+    stats.configure_words(config.max_words, config.word_store, f"{config.save_file}.words")
+    for node_id in range(nodes):
+        word_counts, urls, longest, _ = load_checkpoint(
+            f"{config.save_file}.node{node_id}.stats", stats.new_word_store())
+        stats.restore(word_counts, urls, longest)
+        word_counts.close()
+    return stats
+
+
+def run_partitioned(config, restart, nodes, check_interval=0.2):
+    ''' Crawls with nodes processes and returns the merged CrawlStats. '''
+    logger = get_logger("PARTITION")
+    context = multiprocessing.get_context("fork")
+    inboxes = [context.Queue() for _ in range(nodes)]
+    counters = context.Array("q", 3 * nodes)
+    done = context.Event()
+    processes = [
+        context.Process(
+            target=_run_node,
+            args=(node_id, nodes, config, restart, inboxes, counters, done))
+        for node_id in range(nodes)]
+    for process in processes:
+        process.start()
+    logger.info(f"Started {nodes} crawler nodes.")
+
+    # Four-counter termination check: all idle and balanced on two
+    # successive reads that saw the same counters.
+    previous = None
+    failed = list()
+    while any(process.is_alive() for process in processes):
+        time.sleep(check_interval)
+        # Nodes only exit once done is set; one that exits before has
+        # died, and its counters will never settle.
+        failed = [node_id for node_id, process in enumerate(processes)
+                  if not process.is_alive() and not done.is_set()]
+        if failed:
+            done.set()
+            break
+        finished, values = _all_done(counters, nodes)
+        if finished and values == previous:
+            done.set()
+            break
+        previous = values if finished else None
+    for process in processes:
+        process.join()
+    if failed:
+        codes = ", ".join(f"node {node_id} (exit code {processes[node_id].exitcode})"
+                          for node_id in failed)
+        logger.error(f"Stopped the crawl, crawler nodes died: {codes}.")
+        raise RuntimeError(f"Crawler nodes died: {codes}")
+    logger.info("All crawler nodes finished.")
+    return merged_stats(config, nodes)
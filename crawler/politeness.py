@@ -0,0 +1,178 @@
+''' Per-host delays that follow how each host is doing.
+
+Every download's status and time are recorded per host. A healthy host
+is fetched every `floor` seconds (POLITENESS, or its robots.txt
+Crawl-delay if longer), or every latency_factor times its smoothed
+response time if it is slow. The floor is stretched by the host's
+smoothed error rate, to floor * (1 + error_factor * error_rate), so a
+host that fails now and then is fetched less often even between
+failures. A host that fails (status 500 and up, which includes the cache
+server's 6xx errors) backs off exponentially: floor doubles with every
+consecutive failure, up to max_delay.
+
+After circuit_failures failures in a row the host's circuit opens: it
+is parked for open_seconds, doubled each time it opens again. The first
+fetch after that is a probe. If it succeeds the host goes back to normal;
+if it fails the circuit opens again. A host whose circuit opened
+max_trips times in a row is given up: the frontier drops its queued urls
+(they stay pending in the save file, so a resumed crawl tries again).
+
+Inspect a saved state with:
+    python -m crawler.politeness frontier.shelve.politeness.json
+'''
+import os
+import sys
+import json
+import time
+
+from threading import Lock
+
+CLOSED, OPEN, HALF_OPEN, GIVEN_UP = "closed", "open", "half-open", "given up"
+
+
+class HostState(object):
+    __slots__ = ("floor", "latency", "error_rate", "failures", "trips",
+                 "delay", "state", "open_until", "fetches")
+
+    def __init__(self, floor):
+        self.floor = floor
+        self.latency = None
+        self.error_rate = 0.0
+        self.failures = 0
+        self.trips = 0
+        self.delay = floor
+        self.state = CLOSED
+        # Wall clock time, so a saved state can be resumed.
+        self.open_until = 0.0
+        self.fetches = 0
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class PolitenessController(object):
+    ''' Tracks every host's latency and errors and decides how long to
+    wait before fetching it again; see the module docstring. Safe to share
+    between Worker threads. '''
+
+    def __init__(self, floor, max_delay=60, latency_factor=2, alpha=0.3,
+                 error_factor=4, circuit_failures=5, open_seconds=120, max_trips=3):
+        self.floor = floor
+        self.max_delay = max_delay
+        self.latency_factor = latency_factor
+        self.alpha = alpha
+        self.error_factor = error_factor
+        self.circuit_failures = circuit_failures
+        self.open_seconds = open_seconds
+        self.max_trips = max_trips
+        self.lock = Lock()
+        self.hosts = dict()
+        self.path = None
+
+    def _host(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostState(self.floor)
+        return state
+
+    def _floor(self, state):
+        return state.floor * (1 + self.error_factor * state.error_rate)
+
+    def set_floor(self, host, floor):
+        ''' Raises a host's minimum delay, e.g. to its Crawl-delay. '''
+        with self.lock:
+            state = self._host(host)
+            state.floor = max(self.floor, floor)
+            state.delay = max(state.delay, state.floor)
+
+    def record(self, host, status, seconds):
+        ''' Records one download from host and returns its new state. '''
+        with self.lock:
+            state = self._host(host)
+            state.fetches += 1
+            failed = status >= 500
+            state.error_rate += self.alpha * (failed - state.error_rate)
+            if failed:
+                state.failures += 1
+                if state.state == HALF_OPEN or state.failures >= self.circuit_failures:
+                    self._open(state)
+                else:
+                    state.delay = min(self.max_delay, self._floor(state) * 2 ** state.failures)
+                return state.state
+            if state.latency is None:
+                state.latency = seconds
+            else:
+                state.latency += self.alpha * (seconds - state.latency)
+            state.failures = 0
+            state.trips = 0
+            state.state = CLOSED
+            state.delay = min(self.max_delay,
+                              max(self._floor(state), self.latency_factor * state.latency))
+            return state.state
+
+    def _open(self, state):
+        state.trips += 1
+        if self.max_trips and state.trips >= self.max_trips:
+            state.state = GIVEN_UP
+            return
+        state.state = OPEN
+        state.open_until = time.time() + self.open_seconds * 2 ** (state.trips - 1)
+
+    def delay(self, host):
+        ''' Seconds to wait before the next fetch from host. The wait of an
+        open circuit ends in a probe. '''
+        with self.lock:
+            state = self.hosts.get(host)
+            if state is None:
+                return self.floor
+            if state.state == OPEN:
+                state.state = HALF_OPEN
+                return max(state.open_until - time.time(), state.delay)
+            return state.delay
+
+    def given_up(self, host):
+        with self.lock:
+            state = self.hosts.get(host)
+            return state is not None and state.state == GIVEN_UP
+
+    def snapshot(self):
+        ''' {host: state fields}, for inspection. '''
+        with self.lock:
+            return {host: state.to_dict() for host, state in self.hosts.items()}
+
+    def attach(self, path, restart):
+        ''' Loads the state saved at path (unless restarting); close()
+        saves to it. Given up hosts are tried again. '''
+        with self.lock:
+            if restart and os.path.exists(path):
+                os.remove(path)
+            if os.path.exists(path):
+                with open(path) as f:
+                    for host, fields in json.load(f).items():
+                        state = self.hosts[host] = HostState(fields["floor"])
+                        for name, value in fields.items():
+                            setattr(state, name, value)
+                        if state.state == GIVEN_UP:
+                            state.state, state.trips = CLOSED, 0
+            self.path = path
+
+    def close(self):
+        with self.lock:
+            if self.path is None:
+                return
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({host: state.to_dict() for host, state in self.hosts.items()}, f)
+            os.replace(tmp_path, self.path)
+            self.path = None
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1]) as f:
+        hosts = json.load(f)
+    print(f"{'host':40} {'state':10} {'delay':>7} {'latency':>8} {'errors':>7} {'fetches':>8}")
+    for host, state in sorted(hosts.items(), key=lambda item: -item[1]["delay"]):
+        latency = state["latency"]
+        print(f"{host:40} {state['state']:10} {state['delay']:7.2f} "
+              f"{latency if latency is not None else float('nan'):8.3f} "
+              f"{state['error_rate']:7.1%} {state['fetches']:8}")
@@ -0,0 +1,197 @@
+import heapq
+
+from array import array
+from collections import namedtuple
+from threading import RLock
+from urllib.parse import urlparse
+
+from crawler.frontier import Frontier
+from utils.seen_set import key_digest
+from utils import get_urlhash
+
+# What a scorer knows about a url when it is queued.
+#   depth: links followed from a seed (path depth for urls loaded from the
+#          save file, whose parents are not recorded)
+#   host_queued: urls of the same host queued before this one
+#   inlinks: times the url has been found so far
+#   from_sitemap: the url is a sitemap or was listed in one
+Candidate = namedtuple("Candidate", ["url", "host", "depth", "host_queued", "inlinks", "from_sitemap"])
+
+
+# ---------------- SCORERS ---------------- #
+# Each returns a cost; urls with the lowest total are downloaded first.
+def by_depth(candidate):
+    return 10 * candidate.depth
+
+
+def by_host(candidate):
+    return candidate.host_queued // 10
+
+
+def by_inlinks(candidate):
+    # Only changes when the inlink count doubles, so a popular url is
+    # pushed again a handful of times rather than once per link.
+    return -5 * (candidate.inlinks.bit_length() - 1)
+
+
+def by_sitemap(candidate):
+    return -20 if candidate.from_sitemap else 0
+
+
+# Scorers selectable with PRIORITY_SCORERS in config.ini.
+SCORERS = {
+    "depth": by_depth,
+    "host": by_host,
+    "inlinks": by_inlinks,
+    "sitemap": by_sitemap,
+}
+
+# Heap entries are ints: (priority + PRIORITY_BIAS) << ID_BITS | url id, so
+# the heap never holds url strings and ties pop in the order urls came.
+ID_BITS = 40
+PRIORITY_BIAS = 1 << 20
+ID_MASK = (1 << ID_BITS) - 1
+
+
+def is_sitemap(url):
+    return urlparse(url).path.lower().endswith(".xml")
+
+
+class PriorityFrontier(Frontier):
+    ''' Frontier that downloads the url with the lowest score first,
+    instead of the last one found.
+
+    The score of a url is the sum of its scorers (by default all of
+    SCORERS). Urls get ids; the heap holds one packed int per entry and the
+    urls themselves live in a dict by id, so push and pop are O(log n) on
+    small ints. When a queued url is found again and its score improves, a
+    new entry is pushed and the old one is skipped when it surfaces.
+
+    Resuming loads the unfinished urls of the save file (or its snapshot)
+    into one heapify without calling is_valid on them again: they passed
+    it when they were added. They are loaded before the first url is
+    handed out, since the best url may be the last one read. Safe to share
+    between Worker threads. '''
+
+    def __init__(self, config, restart, scorers=None):
+        self.lock = RLock()
+        if scorers is None:
+            scorers = [SCORERS[name] for name in config.priority_scorers]
+        self.scorers = scorers
+        self.heap = list()
+        # url id -> url, for queued urls.
+        self.pending = dict()
+        # url key digest -> url id, and url id -> times found, for queued urls.
+        self.ids = dict()
+        self.inlinks = dict()
+        self.priorities = dict()
+        # Per url id: link depth (capped at 255), whether it came from a
+        # sitemap, and its Candidate.host_queued.
+        self.depths = array("B")
+        self.from_sitemaps = bytearray()
+        self.host_ranks = array("I")
+        self.host_queued = dict()
+        # url -> (depth, is sitemap) of urls handed out and not completed.
+        self.active = dict()
+        self.loading = None
+        super().__init__(config, restart)
+
+    def _priority(self, url_id, inlinks):
+        url = self.pending[url_id]
+        candidate = Candidate(
+            url, urlparse(url).netloc.lower(), self.depths[url_id],
+            self.host_ranks[url_id], inlinks, bool(self.from_sitemaps[url_id]))
+        priority = sum(scorer(candidate) for scorer in self.scorers) + PRIORITY_BIAS
+        return min(max(priority, 0), (1 << 23) - 1)
+
+    def _enqueue(self, url, parent=None):
+        with self.lock:
+            parsed = urlparse(url)
+            if parent in self.active:
+                parent_depth, parent_is_sitemap = self.active[parent]
+                depth = parent_depth + 1
+            else:
+                # Urls robots.txt sitemaps list come with the sitemap as
+                # their parent, without it being downloaded.
+                parent_is_sitemap = parent is not None and is_sitemap(parent)
+                if parent is None and self.loading is None:
+                    # A seed.
+                    depth = 0
+                else:
+                    depth = len([segment for segment in parsed.path.split("/") if segment])
+            host = parsed.netloc.lower()
+            host_queued = self.host_queued.get(host, 0)
+            self.host_queued[host] = host_queued + 1
+
+            url_id = len(self.depths)
+            self.depths.append(min(depth, 255))
+            self.from_sitemaps.append(parent_is_sitemap or is_sitemap(url))
+            self.host_ranks.append(host_queued)
+            self.pending[url_id] = url
+            self.ids[key_digest(get_urlhash(url))] = url_id
+            priority = self._priority(url_id, 1)
+            self.priorities[url_id] = priority
+            entry = priority << ID_BITS | url_id
+            if self.loading is not None:
+                self.loading.append(entry)
+            else:
+                heapq.heappush(self.heap, entry)
+
+    def _parse_save_file(self):
+        total_count = len(self.save)
+        # Collected and heapified at once: O(n) instead of n pushes.
+        self.loading = list()
+        for url in self._pending_urls():
+            self._enqueue(url)
+        self.heap, self.loading = self.loading, None
+        heapq.heapify(self.heap)
+        self._done_loading()
+        self.logger.info(
+            f"Found {len(self.heap)} urls to be downloaded from {total_count} "
+            f"total urls discovered.")
+
+    def _found_again(self, urlhash):
+        with self.lock:
+            url_id = self.ids.get(key_digest(urlhash))
+            if url_id is None:
+                return
+            inlinks = self.inlinks.get(url_id, 1) + 1
+            self.inlinks[url_id] = inlinks
+            if inlinks & (inlinks - 1):
+                # Only re-score when the count reaches a power of two.
+                return
+            priority = self._priority(url_id, inlinks)
+            if priority < self.priorities[url_id]:
+                self.priorities[url_id] = priority
+                heapq.heappush(self.heap, priority << ID_BITS | url_id)
+
+    def queued(self):
+        return len(self.pending)
+
+    def get_tbd_url(self):
+        with self.lock:
+            while self.heap:
+                url_id = heapq.heappop(self.heap) & ID_MASK
+                url = self.pending.pop(url_id, None)
+                if url is None:
+                    # Superseded by an entry with a better priority.
+                    continue
+                self.ids.pop(key_digest(get_urlhash(url)), None)
+                self.inlinks.pop(url_id, None)
+                self.priorities.pop(url_id, None)
+                self.active[url] = (self.depths[url_id], is_sitemap(url))
+                return url
+            return None
+
+    def add_url(self, url, parent=None):
+        with self.lock:
+            super().add_url(url, parent)
+
+    def mark_url_complete(self, url, fetched=True):
+        with self.lock:
+            super().mark_url_complete(url, fetched)
+            self.active.pop(url, None)
+
+    def close(self):
+        with self.lock:
+            super().close()
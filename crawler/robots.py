@@ -0,0 +1,206 @@
+import os
+import re
+import sys
+import json
+import time
+import threading
+
+from urllib.parse import urlparse
+
+from utils import get_logger
+from utils.download import download
+
+
+def product_token(user_agent):
+    ''' "MyBot/2.1 (+https://example.com)" -> "mybot". '''
+    words = user_agent.split()
+    return words[0].split("/", 1)[0].lower() if words else "*"
+
+
+class RobotsRules(object):
+    ''' Compiled robots.txt rules for one user agent.
+
+    The group used is the one naming the user agent's product token (its
+    first word, without a /version), compared case-insensitively, else
+    the * group. Plain Allow/Disallow paths go into a character trie, so a
+    path is checked in one walk over its characters; the longest matching
+    rule wins and Allow wins ties (RFC 9309). Rules using the * or $
+    wildcards are rare and are kept as regexes next to the trie. '''
+
+    def __init__(self, text="", user_agent="*"):
+        self.trie = dict()
+        self.patterns = list()
+        self.crawl_delay = None
+        self.sitemaps = list()
+        self._parse(text, product_token(user_agent))
+
+    def _parse(self, text, user_agent):
+        # Groups are (agents, [(field, value)]); consecutive User-agent
+        # lines share one group.
+        groups = list()
+        agents, lines = None, None
+        for line in text.splitlines():
+            line = line.split("#", 1)[0].strip()
+            if ":" not in line:
+                continue
+            field, value = line.split(":", 1)
+            field, value = field.strip().lower(), value.strip()
+            if field == "sitemap":
+                if value:
+                    self.sitemaps.append(value)
+            elif field == "user-agent":
+                if lines:
+                    agents, lines = None, None
+                if agents is None:
+                    agents, lines = list(), list()
+                    groups.append((agents, lines))
+                agents.append(value.lower())
+            elif lines is not None:
+                lines.append((field, value))
+
+        # The group naming this agent, else the * group.
+        chosen = [lines for agents, lines in groups if user_agent in agents]
+        if not chosen:
+            chosen = [lines for agents, lines in groups if "*" in agents]
+        for lines in chosen:
+            for field, value in lines:
+                if field in {"allow", "disallow"} and value:
+                    self._add_rule(value, field == "allow")
+                elif field == "crawl-delay":
+                    try:
+                        self.crawl_delay = float(value)
+                    except ValueError:
+                        pass
+
+    def _add_rule(self, path, allow):
+        if "*" in path or path.endswith("$"):
+            regex = re.escape(path.rstrip("$")).replace(r"\*", ".*")
+            if path.endswith("$"):
+                regex += "$"
+            self.patterns.append((re.compile(regex), len(path), allow))
+            return
+        node = self.trie
+        for char in path:
+            node = node.setdefault(char, dict())
+        # Allow wins if the same path is both allowed and disallowed.
+        node[None] = node.get(None, False) or allow
+
+    def allowed(self, path):
+        ''' True if path (with its query string) may be fetched. '''
+        best_length, best_allow = -1, True
+        node = self.trie
+        for length, char in enumerate(path):
+            node = node.get(char)
+            if node is None:
+                break
+            if None in node:
+                best_length, best_allow = length + 1, node[None]
+        for regex, length, allow in self.patterns:
+            if regex.match(path) and (
+                    length > best_length or (length == best_length and allow)):
+                best_length, best_allow = length, allow
+        return best_allow
+
+
+def _robots_path(url):
+    parsed = urlparse(url)
+    path = parsed.path or "/"
+    if parsed.query:
+        path += "?" + parsed.query
+    return path
+
+
+class RobotsCache(object):
+    ''' robots.txt rules per host, fetched once through the cache server.
+
+    Rules are kept in memory and their source text in a json file next to
+    the save file, so a resumed crawl does not refetch them until they are
+    older than ttl seconds. A robots.txt that cannot be fetched allows
+    everything. '''
+
+    def __init__(self, config, restart, ttl=24 * 3600):
+        self.logger = get_logger("ROBOTS")
+        self.config = config
+        self.ttl = ttl
+        self.path = f"{config.save_file}.robots.json"
+        self.lock = threading.Lock()
+        self.host_locks = dict()
+        # host -> (fetched_at, robots.txt text)
+        self.texts = dict()
+        # host -> RobotsRules, for hosts looked up by this run
+        self.rules = dict()
+        if restart and os.path.exists(self.path):
+            os.remove(self.path)
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.texts = {
+                    host: tuple(entry) for host, entry in json.load(f).items()}
+
+    def _host_lock(self, host):
+        with self.lock:
+            return self.host_locks.setdefault(host, threading.Lock())
+
+    def rules_for(self, url):
+        ''' Returns (rules, first) for the host of url; first is True the
+        first time this run asks about the host, so callers can apply the
+        crawl delay and sitemaps once. '''
+        parsed = urlparse(url)
+        host = f"{parsed.scheme}://{parsed.netloc.lower()}"
+        rules = self.rules.get(host)
+        if rules is not None:
+            return rules, False
+        with self._host_lock(host):
+            rules = self.rules.get(host)
+            if rules is not None:
+                return rules, False
+            entry = self.texts.get(host)
+            fetched = entry is None or time.time() - entry[0] > self.ttl
+            if fetched:
+                entry = (time.time(), self._fetch(host))
+                with self.lock:
+                    self.texts[host] = entry
+                    self._save()
+            rules = RobotsRules(entry[1], self.config.user_agent)
+            if fetched:
+                # The robots.txt request is a request to the host too.
+                time.sleep(max(self.config.time_delay, rules.crawl_delay or 0))
+            self.rules[host] = rules
+            return rules, True
+
+    def _fetch(self, host):
+        content = self.fetch(f"{host}/robots.txt")
+        return content.decode("utf-8", "replace") if content is not None else ""
+
+    def fetch(self, url, max_size=None):
+        ''' Body of url fetched through the cache server, or None if it
+        is not there (or larger than max_size bytes). '''
+        resp = download(url, self.config, self.logger)
+        if resp.status == 200 and resp.raw_response is not None:
+            if max_size is not None and resp.raw_size > max_size:
+                self.logger.info(f"Skipped {url}, larger than {max_size} bytes.")
+                return None
+            self.logger.info(f"Fetched {url}.")
+            return resp.raw_response.content
+        self.logger.info(f"Could not fetch {url}, status <{resp.status}>.")
+        return None
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.texts, f)
+        os.replace(tmp_path, self.path)
+
+    def allowed(self, url):
+        rules, _ = self.rules_for(url)
+        return rules.allowed(_robots_path(url))
+
+
+if __name__ == "__main__":
+    # python -m crawler.robots <robots.txt file> <user agent> <path>...
+    with open(sys.argv[1]) as f:
+        rules = RobotsRules(f.read(), sys.argv[2])
+    print(f"Crawl-delay: {rules.crawl_delay}")
+    for sitemap in rules.sitemaps:
+        print(f"Sitemap: {sitemap}")
+    for path in sys.argv[3:]:
+        print(f"{'allow' if rules.allowed(path) else 'disallow'} {path}")
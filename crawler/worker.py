@@ -1,8 +1,11 @@
 from threading import Thread
 
 from inspect import getsource
+from urllib.parse import urlparse
 from utils.download import download
 from utils import get_logger
+from utils.metrics import metrics
+from utils.response_cache import response_cache
 import scraper
 import time
 
@@ -23,12 +26,36 @@ class Worker(Thread):
             if not tbd_url:
                 self.logger.info("Frontier is empty. Stopping Crawler.")
                 break
-            resp = download(tbd_url, self.config, self.logger)
-            self.logger.info(
-                f"Downloaded {tbd_url}, status <{resp.status}>, "
-                f"using cache {self.config.cache_server}.")
-            scraped_urls = scraper.scraper(tbd_url, resp)
-            for scraped_url in scraped_urls:
-                self.frontier.add_url(scraped_url)
-            self.frontier.mark_url_complete(tbd_url)
-            time.sleep(self.config.time_delay)
+            fetched = False
+            # Completed even if this raises, or a HostFrontier would keep
+            # the host busy and the other workers would wait for it forever.
+            try:
+                reason = self.frontier.skip_reason(tbd_url)
+                if reason is not None:
+                    self.logger.info(f"Skipped {tbd_url}, {reason}.")
+                    continue
+                # In replay mode, pages already in the response cache are not
+                # downloaded again, so their hosts need no delay either.
+                resp = response_cache.get(tbd_url)
+                fetched = resp is None
+                if fetched:
+                    start = time.monotonic()
+                    with metrics.span("download"):
+                        resp = download(tbd_url, self.config, self.logger)
+                    self.frontier.record_fetch(tbd_url, resp.status, time.monotonic() - start)
+                metrics.count_page(urlparse(tbd_url).netloc, resp.status)
+                self.logger.info(
+                    f"Downloaded {tbd_url}, status <{resp.status}>, "
+                    f"using cache {self.config.cache_server if fetched else 'replay'}.")
+                with metrics.span("scraper"):
+                    scraped_urls = scraper.scraper(tbd_url, resp)
+                with metrics.span("add_url"):
+                    for scraped_url in scraped_urls:
+                        self.frontier.add_url(scraped_url, tbd_url)
+            except Exception:
+                self.logger.exception(f"Failed to crawl {tbd_url}.")
+            finally:
+                with metrics.span("mark_url_complete"):
+                    self.frontier.mark_url_complete(tbd_url, fetched)
+            if fetched and not getattr(self.frontier, "handles_politeness", False):
+                time.sleep(self.config.time_delay)
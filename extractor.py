@@ -0,0 +1,122 @@
+import re
+from collections import namedtuple
+from urllib.parse import urljoin, urldefrag
+
+from lxml import etree
+
+# Text directly inside these tags is not part of the visible page.
+HIDDEN_PARENTS = frozenset({
+    "style", "script", "head", "title", "meta", "[document]",
+    "header", "footer", "nav", "aside"})
+
+# text: visible text joined with spaces (feed it to tokenizer.iterTokens)
+# links: absolute, defragmented href of every <a>
+# features: word trigrams for Simhash
+PageContent = namedtuple("PageContent", ["text", "links", "features"])
+
+
+# ---------------- SIMHASH FEATURE EXTRACTOR ---------------- #
+def get_features(text, width=3):
+    text = text.lower()
+    text = re.sub(r'[^\w\s]+', '', text)
+    words = text.split()
+
+    if len(words) == 0:
+        return []
+
+    return [' '.join(words[i:i + width]) for i in range(max(len(words) - width + 1, 1))]
+
+
+# ---------------- SINGLE PASS EXTRACTION ---------------- #
+class _PageEvents(object):
+    ''' lxml parser target that collects visible text and links from the
+    parse events, so no element tree is built. Text is attributed to the
+    innermost open tag, the same parent BeautifulSoup would report. '''
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.open_tags = []
+        self.pending = []
+        self.texts = []
+        self.links = []
+
+    def _flush_text(self):
+        if not self.pending:
+            return
+        parent = self.open_tags[-1] if self.open_tags else "[document]"
+        if parent not in HIDDEN_PARENTS:
+            text = "".join(self.pending).strip()
+            if text:
+                self.texts.append(text)
+        self.pending = []
+
+    def start(self, tag, attrib):
+        self._flush_text()
+        self.open_tags.append(tag)
+        if tag == "a":
+            href = attrib.get("href")
+            if href is not None:
+                href = href.strip()
+                if href:
+                    try:
+                        abs_url, _ = urldefrag(urljoin(self.base_url, href))
+                    except ValueError:
+                        return
+                    self.links.append(abs_url)
+
+    def end(self, tag):
+        self._flush_text()
+        if self.open_tags:
+            self.open_tags.pop()
+
+    def data(self, data):
+        # lxml may split one text node over several calls.
+        self.pending.append(data)
+
+    def comment(self, text):
+        self._flush_text()
+
+    def close(self):
+        self._flush_text()
+        return self
+
+
+def _extract_with_soup(html, base_url):
+    from bs4 import BeautifulSoup, Comment
+
+    soup = BeautifulSoup(html, "lxml")
+    texts = []
+    for t in soup.find_all(text=True):
+        if t.parent.name in HIDDEN_PARENTS or isinstance(t, Comment):
+            continue
+        t = t.strip()
+        if t:
+            texts.append(t)
+    links = []
+    for tag in soup.find_all("a", href=True):
+        href = tag["href"].strip()
+        if not href:
+            continue
+        try:
+            abs_url, _ = urldefrag(urljoin(base_url, href))
+        except ValueError:
+            continue
+        links.append(abs_url)
+    return texts, links
+
+
+def extract_page(html, base_url, build_tree=False):
+    ''' Returns the PageContent of an html document (bytes or str).
+
+    By default the document is walked once through lxml parser events and
+    no tree is kept in memory. build_tree=True goes through BeautifulSoup
+    instead, for pages the event parser handles badly. '''
+    if build_tree:
+        texts, links = _extract_with_soup(html, base_url)
+    else:
+        parser = etree.HTMLParser(target=_PageEvents(base_url))
+        parser.feed(html)
+        events = parser.close()
+        texts, links = events.texts, events.links
+    text = " ".join(texts)
+    return PageContent(text, links, get_features(text))
@@ -1,13 +1,10 @@
 from configparser import ConfigParser
 from argparse import ArgumentParser
-from collections import defaultdict
-from urllib.parse import urlparse, urljoin, urldefrag
-
 from utils.server_registration import get_cache_server
 from utils.config import Config
 from crawler import Crawler
-
-from scraper import unique_urls
+from crawler.partition import run_partitioned
+from utils.report import write_report
 
 # THESE LINES ARE NEEDED IF RUNNING ON MAC
 import multiprocessing
@@ -22,41 +19,19 @@ def main(config_file, restart):
     cparser.read(config_file)
     config = Config(cparser)
     config.cache_server = get_cache_server(config, restart)
+    if config.nodes > 1:
+        stats = run_partitioned(config, restart, config.nodes)
+        write_report(stats, top_words=config.report_top_words or None)
+        return
     crawler = Crawler(config, restart)
 
     try:
         crawler.start()
     finally:
-        from scraper import word_frequencies
-        import json
-        with open("word_frequencies_final.json", "w") as f:
-            # Sort by frequency (highest first)
-            sorted_freq = dict(sorted(word_frequencies.items(), key=lambda x: x[1], reverse=True))
-            json.dump(sorted_freq, f, indent=2)
-        print("[SAVED] Final word frequencies saved.")
-        # Save all unique URLs (ignoring fragments)
-        with open("unique_urls.txt", "w") as f:
-            f.write("\n".join(sorted(unique_urls)))
-        print(f"[SUMMARY] Total unique pages found (by URL): {len(unique_urls)}")
-
-        subdomain_counts = defaultdict(int)
-        for url in unique_urls:
-            parsed = urlparse(url)
-            netloc = parsed.netloc.lower()
-            if netloc.endswith(".uci.edu") or netloc == "uci.edu":
-                subdomain_counts[netloc] += 1
-
-        # Save to file sorted alphabetically
-        with open("subdomains.txt", "w") as f:
-            for subdomain in sorted(subdomain_counts):
-                f.write(f"{subdomain}, {subdomain_counts[subdomain]}\n")
-        
-        from scraper import longest_page
-        with open("longest_page.txt", "w") as f:
-            f.write(f"Longest page: {longest_page['url']}\n")
-            f.write(f"Word count: {longest_page['words']}\n")
-
-        print(f"[SUMMARY] Longest page: {longest_page['url']} with {longest_page['words']} words")
+        crawler.close()
+        from scraper import stats, duplicates
+        write_report(stats, top_words=config.report_top_words or None)
+        print(f"[SUMMARY] {duplicates.summary()}")
 
 if __name__ == "__main__":
     parser = ArgumentParser()
@@ -1,11 +1,16 @@
-import re
 import tokenizer
 import logging
-from simhash import Simhash
-from urllib.parse import urlparse, urljoin, urldefrag
-from collections import defaultdict
-from bs4 import BeautifulSoup
-from bs4 import Comment
+import multiprocessing
+from collections import namedtuple, Counter
+from concurrent.futures import ProcessPoolExecutor
+from extractor import extract_page, get_features
+from utils.analytics import CrawlStats
+from utils.simhash_index import SimhashIndex
+from utils.trap_detector import TrapDetector
+from utils.duplicates import DuplicateDetector, content_digest, text_digest
+from utils.metrics import metrics
+from utils.canonical import canonicalize
+from utils.url_filter import UrlFilter
 
 # ---------------- LOGGING SETUP ---------------- #
 logging.basicConfig(
@@ -24,31 +29,42 @@ console.setFormatter(formatter)
 logger.addHandler(console)
 
 # ---------------- GLOBALS ---------------- #
+# Parse pages with BeautifulSoup instead of the single pass event parser.
+EXTRACT_WITH_SOUP = False
+# Responses larger than this are skipped without being decoded (politeness).
+MAX_PAGE_SIZE = 5000000
 STOPWORDS = set(open("stopwords.txt").read().split())
-word_frequencies = defaultdict(int)
-unique_urls = set()
-unique_pages = set()
-longest_page = {"url": None, "words": 0}
+# Word frequencies, unique urls and longest page, updated from every worker.
+stats = CrawlStats()
+# Simhash fingerprints of every page kept; pages within 2 bits are duplicates.
+unique_pages = SimhashIndex(max_distance=2)
+# Byte-identical and same-text pages are caught before Simhash is needed.
+duplicates = DuplicateDetector(unique_pages)
+# Per-host url pattern budgets; the frontier consults it before adding urls.
+traps = TrapDetector(pattern_budget=500, max_depth=12, max_repeats=2)
 
 # ---------------- MAIN SCRAPER ---------------- #
 def scraper(url, resp):
-    global unique_urls
-
     links = extract_next_links(url, resp)
     valid_links = [link for link in links if is_valid(link)]
 
-    for link in valid_links:
-        unique_urls.add(link)
+    stats.record_urls(valid_links)
 
-    if len(unique_urls) % 100 == 0:
-        logger.info(f"CRAWLED {len(unique_urls)} unique pages so far.")
+    crawled = stats.progress()
+    if crawled:
+        logger.info(f"CRAWLED {crawled} unique pages so far.")
+        logger.info(duplicates.summary())
 
     return valid_links
 
 
 # ---------------- XML SITEMAP PARSER ---------------- #
-def get_sitemap_urls(resp) -> list:
-    soup = BeautifulSoup(resp.text, 'xml')
+def get_sitemap_urls(content) -> list:
+    # Imported on first use, like simhash below: both are slow to import
+    # and the frontier is loaded before either is needed.
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'xml')
     sitemap_urls = []
 
     for item in soup.find_all("loc"):
@@ -58,231 +74,220 @@ def get_sitemap_urls(resp) -> list:
     return sitemap_urls
 
 
-# ---------------- SIMHASH FEATURE EXTRACTOR ---------------- #
-def get_features(text, width=3):
-    text = text.lower()
-    text = re.sub(r'[^\w\s]+', '', text)
-    words = text.split()
-
-    if len(words) == 0:
-        return []
-
-    return [' '.join(words[i:i + width]) for i in range(max(len(words) - width + 1, 1))]
-
-
-# ---------------- LINK EXTRACTION ---------------- #
-def extract_next_links(url, resp):
-    links = []
-    global word_frequencies
-
-    # Handle bad responses
-    if resp.status != 200 or resp.raw_response is None:
-        if resp.status in {403, 404, 500, 502, 503, 504, 601}:
-            logger.debug(f"[SKIP STATUS] {resp.status} at {url}")
-            return links
+# ---------------- PAGE ANALYSIS ---------------- #
+# What one page contributes to the crawl. text_digest is None for pages
+# that are not counted (sitemaps, non-html, parse errors); word_counts and
+# fingerprint are also None for pages whose text was already seen.
+PageAnalysis = namedtuple("PageAnalysis", ["links", "word_counts", "fingerprint", "text_digest"])
 
-        logger.error(f"BAD RESPONSE {resp.status}: {url} | Error: {getattr(resp, 'error', None)}")
-        return links
 
-    # Check content type
-    content_type = resp.raw_response.headers.get("Content-Type", "")
+def analyze_page(url, content_type, content, known_text=None):
+    ''' CPU heavy part of extract_next_links. Only reads its arguments and
+    module constants, so it can run in a parse process. known_text, if
+    given, is called with the page's text digest and returning True skips
+    tokenizing and shingling a page that is a copy. '''
     if "xml" in content_type.lower():
         try:
-            sitemap_links = get_sitemap_urls(resp)
-            return sitemap_links
+            return PageAnalysis(get_sitemap_urls(content), None, None, None)
         except Exception as e:
             print(f"[EXTRACTION ERROR] Problem while extracting links from sitemap url {url}: {e}")
-            return []
+            return PageAnalysis([], None, None, None)
 
     if "text/html" not in content_type:
         logger.debug(f"SKIPPED NON-HTML: {url} | Content-Type: {content_type}")
-        return links
-    
-    # Detect and skip large HTML pages (politeness)
-    content_length = len(resp.raw_response.content)
-    if content_length > 5000000:  # the threshold
-        logger.warning(f"[SKIP LARGE FILE] {url}")
-        return []
+        return PageAnalysis([], None, None, None)
 
-    # Parse HTML content
+    # Parse HTML content: visible text, links and shingles in one walk
     try:
-        html = resp.raw_response.content
-        soup = BeautifulSoup(html, "lxml")
-
-        def extract_visible_text(soup):
-            texts = soup.find_all(text=True)
-            visible_texts = []
-            for t in texts:
-                if t.parent.name in ["style", "script", "head", "title", "meta", "[document]", "header", "footer", "nav", "aside"]:
-                    continue
-                if isinstance(t, Comment):
-                    continue
-                visible_texts.append(t.strip())
-            return " ".join(visible_texts)
-
-        text = extract_visible_text(soup)
+        with metrics.span("extract"):
+            page = extract_page(content, url, build_tree=EXTRACT_WITH_SOUP)
+
+        digest = text_digest(page.text)
+        if known_text is not None and known_text(digest):
+            return PageAnalysis([], None, None, digest)
 
         # Tokenize text and remove stopwords
-        tokens = tokenizer.tokenize(text)
-        useful_tokens = [t for t in tokens if t not in STOPWORDS]
+        with metrics.span("tokenize"):
+            word_counts = Counter(t for t in tokenizer.iterTokens(page.text) if t not in STOPWORDS)
 
-        # Update global word frequency
-        for t in useful_tokens:
-            word_frequencies[t.lower()] += 1
+        with metrics.span("fingerprint"):
+            from simhash import Simhash
+            fingerprint = Simhash(page.features).value
+    except Exception as e:
+        print(f"Error parsing HTML at {url}: {e}")
+        return PageAnalysis([], None, None, None)
 
-        # Track longest page
-        global longest_page
-        page_word_count = len(useful_tokens)
-        if page_word_count > longest_page["words"]:
-            longest_page = {"url": url, "words": page_word_count}
+    return PageAnalysis(page.links, word_counts, fingerprint, digest)
 
-        # Simhash duplicate detection
-        global unique_pages
-        curr_hash = Simhash(get_features(text))
-        curr_value = curr_hash.value
 
-        for prev_value, prev_url in unique_pages:
-            prev_hash = Simhash(prev_value)
-            if curr_hash.distance(prev_hash) < 3:
-                logger.info(f"[DUPLICATE] Skipping near-duplicate page: {url} similar to {prev_url}")
-                return []
+def canonical_links(links):
+    ''' Links in canonical form, without repeats, in page order. '''
+    return list(dict.fromkeys(canonicalize(link) for link in links))
 
-        unique_pages.add((curr_value, url))
 
-    except Exception as e:
-        print(f"Error parsing HTML at {url}: {e}")
+def record_page(url, analysis, raw_digest=None):
+    ''' Merges a PageAnalysis into the crawl statistics, unless the page is
+    a duplicate, and returns the links worth following, canonicalized. '''
+    if analysis.text_digest is None:
+        return canonical_links(analysis.links)
+
+    # Exact and near-duplicate detection
+    with metrics.span("dedup"):
+        tier, prev_url = duplicates.classify(
+            url, raw_digest, analysis.text_digest, analysis.fingerprint)
+    traps.record_fetch(url, tier is not None)
+    if tier is not None:
+        logger.info(f"[DUPLICATE] Skipping {tier} duplicate page: {url}"
+                    + (f" similar to {prev_url}" if prev_url else ""))
+        return []
+
+    # Update word frequencies and longest page
+    with metrics.span("record_stats"):
+        stats.record_page(url, analysis.word_counts)
+
+    return canonical_links(analysis.links)
+
+
+# ---------------- PARSE PROCESSES ---------------- #
+parse_pool = None
+
+
+def start_parse_pool(processes):
+    ''' Runs analyze_page in a pool of processes so parsing is not limited
+    to one core by the GIL. Call before the worker threads start. '''
+    global parse_pool
+    # Not forked from this process: the frontier's loader thread (and with
+    # NODES, the router's) is already running and may hold a lock the
+    # children would inherit. The fork server imports this module once and
+    # forks the processes from there.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+    else:
+        context = multiprocessing.get_context("spawn")
+    parse_pool = ProcessPoolExecutor(processes, mp_context=context)
+    # The pool starts all of its processes on the first submit; do it now
+    # rather than on the first page.
+    parse_pool.submit(int).result()
+
+
+def stop_parse_pool():
+    global parse_pool
+    if parse_pool is not None:
+        parse_pool.shutdown()
+        parse_pool = None
+
+
+# ---------------- LINK EXTRACTION ---------------- #
+def extract_next_links(url, resp):
+    links = []
+
+    # Detect and skip large pages before their response is unpickled
+    if resp.status == 200 and resp.raw_size > MAX_PAGE_SIZE:
+        logger.warning(f"[SKIP LARGE FILE] {url}")
         return links
 
-    # Extract links
-    try:
-        for tag in soup.find_all("a", href=True):
-            href = tag["href"].strip()
-            if not href:
-                continue
-
-            abs_url = urljoin(url, href)
-            abs_url, _ = urldefrag(abs_url)
-            links.append(abs_url)
-
-        # Trap detection
-        domain_url_counts = defaultdict(int)
-        for link in links:
-            domain = urlparse(link).netloc
-            domain_url_counts[domain] += 1
-
-        for domain, count in domain_url_counts.items():
-            if count > 100:
-                logger.warning(f"[POSSIBLE TRAP] {domain} produced {count} links on one page ({url})")
-                return []
+    # Handle bad responses
+    if resp.status != 200 or resp.raw_response is None:
+        if resp.status in {403, 404, 500, 502, 503, 504, 601}:
+            logger.debug(f"[SKIP STATUS] {resp.status} at {url}")
+            return links
 
-    except Exception as e:
-        print(f"[EXTRACTION ERROR] Problem while extracting links from {url}: {e}")
+        logger.error(f"BAD RESPONSE {resp.status}: {url} | Error: {getattr(resp, 'error', None)}")
+        return links
 
-    return links
+    content_type = resp.raw_response.headers.get("Content-Type", "")
+    content = resp.raw_response.content
+
+    # Byte-identical copies of an earlier page are not even parsed
+    raw_digest = None
+    if "text/html" in content_type:
+        raw_digest = content_digest(content)
+        if duplicates.is_raw_duplicate(raw_digest):
+            traps.record_fetch(url, True)
+            logger.info(f"[DUPLICATE] Skipping raw duplicate page: {url}")
+            return links
+
+    # With parse processes, the extract/tokenize/fingerprint spans are
+    # recorded in the processes; analyze covers the round trip. The
+    # processes cannot see the text digests, so text duplicates are only
+    # caught after they were tokenized there.
+    with metrics.span("analyze"):
+        if parse_pool is not None:
+            analysis = parse_pool.submit(analyze_page, url, content_type, content).result()
+        else:
+            analysis = analyze_page(url, content_type, content, duplicates.is_text_duplicate)
+    return record_page(url, analysis, raw_digest)
 
 
 # ---------------- VALIDATION FUNCTION ---------------- #
+ALLOWED_DOMAINS = {
+    "ics.uci.edu",
+    "cs.uci.edu",
+    "informatics.uci.edu",
+    "stat.uci.edu"
+}
+
+# Dead or restricted hosts
+DEAD_HOSTS = {
+    "jujube.ics.uci.edu",
+    "flamingo.ics.uci.edu",
+    "asterixdb.ics.uci.edu",
+    "dblp.ics.uci.edu",
+}
+
+# (name, part of the url matched, pattern, substring the url must contain)
+TRAP_RULES = [
+    # Event calendars
+    ("event_tag", "path", r"/events/tag/talks/", None),
+    ("event_page", "url", r"/event/[-\w]+-\d+$", None),
+    ("ical", "url", r"ical=", None),
+    ("calendar_query", "query", r"tribe-bar-date=", None),
+    ("calendar_query", "query", r"eventdisplay=past", None),
+    ("date", "url", r"\d{4}-\d{2}", None),
+
+    # Gitlab repositories
+    ("gitlab", "path", r"merge_request", "gitlab"),
+    ("gitlab", "path", r"forks", "gitlab"),
+    ("gitlab", "path", r"^(?!.*all).*branches", "gitlab"),
+    ("gitlab", "url", r"[?&]view=parallel", "gitlab"),
+    ("gitlab", "url", r"commit", "gitlab"),
+    ("gitlab", "url", r"/tree/", "gitlab"),
+
+    # DokuWiki modes
+    # [?&]: canonical urls have their query parameters sorted
+    ("dokuwiki_action", "url", r"[?&]do=(?:edit|login|backlink|revisions|diff)", None),
+    ("percent_encoded", "url", r"%3", None),
+    ("dokuwiki", "url", r"[?&](?:do|idx|id)=", "doku.php"),
+    ("wiki_dated", "url", r"/wiki/public/wiki/.+-\d{4}", None),
+
+    # Old personal project pages (~username)
+    ("personal_page", "url", r"/~[a-zA-Z0-9_-]", None),
+]
+
+# Substrings that may appear at most this many times in a url.
+REPEAT_LIMITS = {"robots.txt": 1, "&": 1, "%3A": 1, "?do=edit": 1}
+
+EXTENSIONS = (
+    "css js bmp gif jpg jpeg ico png tif tiff mid mp2 mp3 mp4"
+    " wav avi mov mpeg ram m4v mkv ogg ogv pdf"
+    " ps eps tex ppt pptx doc docx xls xlsx names"
+    " data dat exe bz2 tar msi bin 7z psd dmg iso"
+    " epub dll cnf tgz sha1"
+    " thmx mso arff rtf jar csv"
+    " rm smil wmv swf wma zip rar gz").split()
+
+url_filter = UrlFilter(ALLOWED_DOMAINS, DEAD_HOSTS, TRAP_RULES, EXTENSIONS, REPEAT_LIMITS)
+
+
 def is_valid(url):
     try:
-        parsed = urlparse(url)
-
-        if parsed.scheme not in {"http", "https"}:
-            return False
-
-        domain = parsed.netloc.lower()
-        allowed_domains = {
-            "ics.uci.edu",
-            "cs.uci.edu",
-            "informatics.uci.edu",
-            "stat.uci.edu"
-        }
-
-        if not any(domain == allowed or domain.endswith(f".{allowed}") for allowed in allowed_domains):
-            return False
-
-        path_lower = parsed.path.lower()
-        query_lower = parsed.query.lower()
-
-        if "/events/tag/talks/" in path_lower:
-            return False
-
-        if re.search(r"/event/[-\w]+-\d+$", url):
-            return False
-
-        if "ical=" in url or "outlook-ical=" in url:
-            return False
-
-        if "tribe-bar-date=" in query_lower or "eventdisplay=past" in query_lower:
-            return False
-
-        if re.search(r"\d{4}-\d{2}(-\d{2})?", url):
-            return False
-
-        # Gitlab repositories
-        if "gitlab" in url:
-            if "merge_request" in path_lower:
-                return False
-            if "?view=parallel" in url:
-                return False
-            if "commit" in url:
-                return False
-            if "/tree/" in url:
-                return False
-            if "forks" in path_lower:
-                return False
-            if "branches" in path_lower and "all" not in path_lower:
-                return False
-
-        # DokuWiki modes
-        if "?do=edit" in url or "?do=login" in url:
-            return False
-        if "?do=backlink" in url or "?do=revisions" in url or "?do=diff" in url:
-            return False
-        if "%3" in url:
-            return False
-
-        if "doku.php" in url:
-            if any(param in url for param in ["?do=", "&do=", "?idx=", "&idx=", "?id=", "&id="]):
-                logger.debug(f"[TRAP] DokuWiki internal action blocked: {url}")
-                return False
-
-        if re.search(r"/wiki/public/wiki/.+-\d{4}", url):
-            return False
-
-        # Dead or restricted hosts
-        dead_hosts = {
-            "jujube.ics.uci.edu",
-            "flamingo.ics.uci.edu",
-            "asterixdb.ics.uci.edu",
-            "dblp.ics.uci.edu",
-        }
-
-        if any(dead in parsed.netloc.lower() for dead in dead_hosts):
-            logger.debug(f"[TRAP] Dead or restricted host blocked: {url}")
-            return False
-
-        # Old personal project pages (~username)
-        if re.search(r"/~[a-zA-Z0-9_-]+", url):
-            logger.debug(f"[TRAP] Old personal site blocked: {url}")
-            return False
-
-        ignore_in_url = ["robots.txt", "&", "%3A", "?do=edit"]
-        for item in ignore_in_url:
-            if url.count(item) > 1:
-                return False
-
-        return not re.match(
-            r".*\.(css|js|bmp|gif|jpe?g|ico"
-            + r"|png|tiff?|mid|mp2|mp3|mp4"
-            + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
-            + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
-            + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
-            + r"|epub|dll|cnf|tgz|sha1"
-            + r"|thmx|mso|arff|rtf|jar|csv"
-            + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$",
-            parsed.path.lower()
-        )
-
+        reason = url_filter.reject_reason(url)
     except TypeError:
-        print("TypeError for ", parsed)
-        raise
\ No newline at end of file
+        print("TypeError for ", url)
+        raise
+
+    if reason is not None:
+        logger.debug("[FILTERED] %s: %s", reason, url)
+        return False
+    return True
@@ -0,0 +1,63 @@
+''' Crawls a small site served by the stub cache server with AsyncWorkers.
+
+Run from the repository root:
+    python -m unittest tests.test_async_worker
+'''
+import os
+import tempfile
+import unittest
+
+from benchmarks.common import make_config
+from benchmarks.stub_cache_server import StubCacheServer, make_site
+from crawler.async_worker import AsyncWorker
+from crawler.host_frontier import HostFrontier
+
+
+class AsyncWorkerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.pages, seeds = make_site(hosts=4, pages_per_host=6, words_per_page=50)
+        # Slow enough that the other downloads are in flight when one fails.
+        self.server = StubCacheServer(self.pages, latency=0.02)
+        cache_server = self.server.start()
+        self.addCleanup(self.server.stop)
+        self.config = make_config(
+            os.path.join(self.tmp.name, "frontier.shelve"), seeds, cache_server,
+            FRONTIER="host", FETCHER="async", THREADCOUNT=2, ASYNC_CONCURRENCY=4,
+            POLITENESS=0.01, ROBOTS=False, CHECKPOINT_INTERVAL=0)
+        # The crawler logs to Logs/ under the working directory.
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.addCleanup(os.chdir, cwd)
+
+    def crawl(self, frontier):
+        workers = [AsyncWorker(i, self.config, frontier) for i in range(2)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(30)
+        frontier.close()
+        self.assertFalse(any(worker.is_alive() for worker in workers), "crawl hung")
+        self.assertEqual(frontier.busy, set())
+
+    def test_failing_url_does_not_stop_the_crawl(self):
+        frontier = HostFrontier(self.config, True)
+        failing = "https://host1.ics.uci.edu/page/0"
+        skip_reason = frontier.skip_reason
+
+        def failing_skip_reason(url):
+            if url == failing:
+                raise ConnectionError("robots.txt fetch failed")
+            return skip_reason(url)
+
+        frontier.skip_reason = failing_skip_reason
+        self.crawl(frontier)
+        fetched = {url for _, url in self.server.requests}
+        self.assertNotIn(failing, fetched)
+        # Every other page is linked from somewhere, so all are fetched.
+        self.assertEqual(fetched, set(self.pages) - {failing})
+
+
+if __name__ == "__main__":
+    unittest.main()
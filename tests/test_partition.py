@@ -0,0 +1,116 @@
+''' Checks how urls are routed between the nodes of a partitioned crawl
+and how run_partitioned decides that the crawl is over, with stand-in
+nodes that only update the shared counters.
+
+Run from the repository root:
+    python -m unittest tests.test_partition
+'''
+import os
+import time
+import queue
+import tempfile
+import unittest
+import multiprocessing
+
+from unittest import mock
+
+from crawler import partition
+from crawler.partition import IDLE, SENT, RECEIVED
+
+
+def counters(*nodes):
+    ''' Flat counter list from (idle, sent, received) per node. '''
+    return [value for node in nodes for value in node]
+
+
+class AllDoneTest(unittest.TestCase):
+    def test_idle_and_balanced(self):
+        values = counters((1, 2, 1), (1, 0, 1))
+        self.assertEqual(partition._all_done(values, 2), (True, values))
+
+    def test_busy_node(self):
+        self.assertFalse(partition._all_done(counters((1, 1, 0), (0, 0, 1)), 2)[0])
+
+    def test_batch_in_transit(self):
+        self.assertFalse(partition._all_done(counters((1, 2, 0), (1, 0, 1)), 2)[0])
+
+
+class RouterTest(unittest.TestCase):
+    def test_owner_is_per_host(self):
+        urls = [f"https://host{i}.ics.uci.edu/page/{p}" for i in range(20) for p in range(3)]
+        for url in urls:
+            self.assertIn(partition.owner(url, 4), range(4))
+            self.assertEqual(partition.owner(url, 4),
+                             partition.owner(url.replace("/page/", "/other/"), 4))
+        self.assertEqual({partition.owner(url, 4) for url in urls}, set(range(4)))
+
+    def test_forwards_each_url_once_in_batches(self):
+        inboxes = [queue.Queue() for _ in range(3)]
+        values = [0] * 9
+        router = partition.Router(0, 3, inboxes, values, batch_size=4, flush_interval=60)
+        self.addCleanup(router.close)
+        urls = [f"https://host{i}.ics.uci.edu/" for i in range(30)]
+        forwarded = [url for url in urls if not router.owns(url)]
+        for url in forwarded + forwarded:
+            router.forward(url)
+        router.flush()
+        received, batches = dict(), 0
+        for target, inbox in enumerate(inboxes):
+            while not inbox.empty():
+                batch = inbox.get()
+                batches += 1
+                self.assertLessEqual(len(batch), 4)
+                for url in batch:
+                    self.assertNotIn(url, received)
+                    received[url] = target
+        self.assertEqual(received, {url: partition.owner(url, 3) for url in forwarded})
+        self.assertEqual(values[SENT], batches)
+
+
+class RunPartitionedTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # The crawler logs to Logs/ under the working directory.
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.addCleanup(os.chdir, cwd)
+        self.early = multiprocessing.get_context("fork").Value("i", 0)
+
+    def run_nodes(self, node):
+        with mock.patch.object(partition, "_run_node", node), \
+                mock.patch.object(partition, "merged_stats", return_value="stats"):
+            return partition.run_partitioned(None, True, 2, check_interval=0.05)
+
+    def test_waits_for_batches_in_transit(self):
+        early = self.early
+
+        def node(node_id, nodes, config, restart, inboxes, counters, done):
+            # Both nodes look idle while node 0's batch is still on its way.
+            counters[3 * node_id + IDLE] = 1
+            if node_id == 0:
+                counters[3 * node_id + SENT] += 1
+            else:
+                if done.wait(0.5):
+                    early.value = 1
+                counters[3 * node_id + RECEIVED] += 1
+            done.wait()
+
+        start = time.monotonic()
+        self.assertEqual(self.run_nodes(node), "stats")
+        self.assertGreaterEqual(time.monotonic() - start, 0.5)
+        self.assertEqual(early.value, 0)
+
+    def test_dead_node_stops_the_crawl(self):
+        def node(node_id, nodes, config, restart, inboxes, counters, done):
+            if node_id == 1:
+                os._exit(3)
+            # Never idle: only the failure can end the crawl.
+            done.wait()
+
+        with self.assertRaisesRegex(RuntimeError, r"node 1 \(exit code 3\)"):
+            self.run_nodes(node)
+
+
+if __name__ == "__main__":
+    unittest.main()
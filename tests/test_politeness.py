@@ -0,0 +1,156 @@
+''' Crawls a HostFrontier with ADAPTIVE_POLITENESS against a stub cache
+server whose hosts fail on cue, and checks every host's delays and
+circuit.
+
+Run from the repository root:
+    python -m unittest tests.test_politeness
+'''
+import os
+import time
+import tempfile
+import unittest
+
+from collections import defaultdict
+from urllib.parse import urlparse
+
+from benchmarks.common import make_config
+from benchmarks.stub_cache_server import StubCacheServer, encode_response, make_site
+from crawler.host_frontier import HostFrontier
+from utils.download import download
+
+FLOOR = 0.05
+FAILURES = 3
+OPEN = 0.3
+TRIPS = 2
+PAGES = 8
+
+
+class FailingServer(StubCacheServer):
+    ''' Answers the first failures[host] requests for host with a 503, or
+    all of them if that is None. '''
+
+    def __init__(self, pages, failures):
+        self.failures = failures
+        self.asked = defaultdict(int)
+        super().__init__(pages)
+
+    def respond(self, url):
+        host = urlparse(url).netloc.split(".")[0]
+        with self.lock:
+            self.asked[host] += 1
+            asked = self.asked[host]
+        limit = self.failures.get(host, 0)
+        if limit is None or asked <= limit:
+            return encode_response(url, 503, "text/html", b"Service Unavailable")
+        return super().respond(url)
+
+
+class AdaptivePolitenessTest(unittest.TestCase):
+    ''' host0 is healthy, host1 is down, host2 is down until its circuit
+    has opened once and host3 fails once. '''
+
+    @classmethod
+    def setUpClass(cls):
+        pages, seeds = make_site(hosts=4, pages_per_host=PAGES, words_per_page=20)
+        server = FailingServer(pages, {"host1": None, "host2": FAILURES, "host3": 1})
+        cache_server = server.start()
+        tmp = tempfile.TemporaryDirectory()
+        config = make_config(
+            os.path.join(tmp.name, "frontier.shelve"), seeds, cache_server,
+            FRONTIER="host", ADAPTIVE_POLITENESS=True, POLITENESS=FLOOR, ROBOTS=False,
+            CIRCUIT_FAILURES=FAILURES, CIRCUIT_OPEN=OPEN, CIRCUIT_TRIPS=TRIPS)
+        # The crawler logs to Logs/ under the working directory.
+        cwd = os.getcwd()
+        os.chdir(tmp.name)
+        try:
+            frontier = HostFrontier(config, True)
+            for url in pages:
+                frontier.add_url(url)
+            cls.history = cls.crawl(frontier, config)
+            cls.queued = set(frontier.host_queues)
+            frontier.close()
+        finally:
+            os.chdir(cwd)
+            server.stop()
+            tmp.cleanup()
+
+    @staticmethod
+    def crawl(frontier, config):
+        ''' Fetches urls one at a time as the frontier hands them out.
+        Returns {host: [(time, status, host state after completing)]}. '''
+        history = defaultdict(list)
+        while True:
+            url, wait = frontier.poll_tbd_url()
+            if url is None:
+                if wait == 0:
+                    return history
+                time.sleep(min(wait or 0.01, 0.01))
+                continue
+            host = urlparse(url).netloc.split(".")[0]
+            start = time.monotonic()
+            resp = download(url, config, frontier.logger)
+            frontier.record_fetch(url, resp.status, time.monotonic() - start)
+            frontier.mark_url_complete(url)
+            state = frontier.politeness.snapshot()[urlparse(url).netloc]
+            history[host].append((start, resp.status, state))
+
+    def gaps(self, host):
+        times = [at for at, _, _ in self.history[host]]
+        return [later - earlier for earlier, later in zip(times, times[1:])]
+
+    def test_healthy_host_stays_at_the_floor(self):
+        fetches = self.history["host0"]
+        self.assertEqual([status for _, status, _ in fetches], [200] * PAGES)
+        for _, _, state in fetches:
+            self.assertEqual(state["state"], "closed")
+            self.assertEqual(state["delay"], FLOOR)
+        self.assertGreaterEqual(min(self.gaps("host0")), FLOOR)
+
+    def test_failures_back_off(self):
+        states = [state for _, _, state in self.history["host1"]][:FAILURES - 1]
+        for failures, state in enumerate(states, 1):
+            self.assertEqual(state["failures"], failures)
+            self.assertGreaterEqual(state["delay"], FLOOR * 2 ** failures)
+        self.assertLess(states[0]["delay"], states[1]["delay"])
+        for gap, state in zip(self.gaps("host1"), states):
+            self.assertGreaterEqual(gap, state["delay"])
+
+    def test_down_host_is_given_up(self):
+        fetches = self.history["host1"]
+        # The circuit opens after FAILURES failures and again after every
+        # failed probe.
+        self.assertEqual(len(fetches), FAILURES + TRIPS - 1)
+        self.assertEqual(fetches[FAILURES - 1][2]["state"], "half-open")
+        self.assertGreaterEqual(self.gaps("host1")[FAILURES - 1], OPEN)
+        self.assertEqual(fetches[-1][2]["state"], "given up")
+        self.assertNotIn("host1.ics.uci.edu", self.queued)
+
+    def test_successful_probe_closes_the_circuit(self):
+        fetches = self.history["host2"]
+        self.assertEqual(len(fetches), PAGES)
+        self.assertEqual(fetches[FAILURES - 1][2]["state"], "half-open")
+        self.assertGreaterEqual(self.gaps("host2")[FAILURES - 1], OPEN)
+        probe = fetches[FAILURES]
+        self.assertEqual(probe[1], 200)
+        self.assertEqual(probe[2]["state"], "closed")
+        self.assertEqual(probe[2]["trips"], 0)
+        self.assertEqual(fetches[-1][2]["state"], "closed")
+
+    def test_error_rate_raises_the_floor(self):
+        fetches = self.history["host3"]
+        self.assertEqual([status for _, status, _ in fetches], [503] + [200] * (PAGES - 1))
+        delays = [state["delay"] for _, _, state in fetches[1:]]
+        error_rates = [state["error_rate"] for _, _, state in fetches[1:]]
+        # Past the failure, the delay decays towards the floor with the
+        # error rate, but stays above it.
+        self.assertGreater(delays[0], FLOOR)
+        self.assertEqual(delays, sorted(delays, reverse=True))
+        for delay, error_rate in zip(delays, error_rates):
+            self.assertGreater(error_rate, 0)
+            self.assertGreaterEqual(delay, FLOOR * (1 + 4 * error_rate) - 1e-9)
+        for gap, delay in zip(self.gaps("host3")[1:], delays):
+            self.assertGreaterEqual(gap, delay)
+
+
+if __name__ == "__main__":
+    unittest.main()
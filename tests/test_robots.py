@@ -0,0 +1,175 @@
+''' Checks robots.txt handling against the files in fixtures/robots.
+
+Run from the repository root:
+    python -m unittest tests.test_robots
+'''
+import os
+import json
+import tempfile
+import unittest
+
+from types import SimpleNamespace
+from unittest import mock
+
+import cbor
+
+from benchmarks.stub_cache_server import encode_response
+from crawler import robots
+from crawler.robots import RobotsCache, RobotsRules
+from utils.response import Response
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "robots")
+USER_AGENT = "IR UF25 88195254, 56683632"
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return f.read()
+
+
+class RobotsRulesTest(unittest.TestCase):
+    def test_group_of_the_product_token(self):
+        rules = RobotsRules(fixture("agents.txt"), USER_AGENT)
+        self.assertFalse(rules.allowed("/private/page"))
+        # Only the named group applies, not the * one.
+        self.assertTrue(rules.allowed("/everyone-else/"))
+        self.assertEqual(rules.crawl_delay, 2.5)
+
+    def test_shared_group_and_version(self):
+        rules = RobotsRules(fixture("agents.txt"), "Googlebot/2.1 (+http://www.google.com/bot.html)")
+        self.assertFalse(rules.allowed("/private/page"))
+        self.assertEqual(rules.crawl_delay, 2.5)
+
+    def test_star_group_when_not_named(self):
+        # "a" names a group and is in this user agent, but is not its
+        # product token.
+        rules = RobotsRules(fixture("agents.txt"), "OtherBot/1.0 abc")
+        self.assertTrue(rules.allowed("/"))
+        self.assertTrue(rules.allowed("/private/page"))
+        self.assertFalse(rules.allowed("/everyone-else/page"))
+        self.assertEqual(rules.crawl_delay, 10)
+
+    def test_longest_match_wins(self):
+        rules = RobotsRules(fixture("precedence.txt"), USER_AGENT)
+        self.assertTrue(rules.allowed("/"))
+        self.assertFalse(rules.allowed("/docs/"))
+        self.assertFalse(rules.allowed("/docs/internal"))
+        self.assertTrue(rules.allowed("/docs/public/index.html"))
+        self.assertFalse(rules.allowed("/docs/public/drafts/one"))
+
+    def test_allow_wins_ties(self):
+        rules = RobotsRules(fixture("precedence.txt"), USER_AGENT)
+        self.assertTrue(rules.allowed("/same"))
+        self.assertTrue(rules.allowed("/same/page"))
+
+    def test_query_is_matched(self):
+        rules = RobotsRules(fixture("precedence.txt"), USER_AGENT)
+        self.assertFalse(rules.allowed("/search?q=crawler"))
+        self.assertTrue(rules.allowed("/search"))
+        self.assertEqual(robots._robots_path("https://x.ics.uci.edu/search?q=a"), "/search?q=a")
+        self.assertEqual(robots._robots_path("https://x.ics.uci.edu"), "/")
+
+    def test_wildcards(self):
+        rules = RobotsRules(fixture("wildcards.txt"), USER_AGENT)
+        self.assertFalse(rules.allowed("/papers/a.pdf"))
+        self.assertTrue(rules.allowed("/papers/a.pdf?download=1"))
+        self.assertTrue(rules.allowed("/papers/a.pdfx"))
+        self.assertFalse(rules.allowed("/calendar/2023/day"))
+        self.assertFalse(rules.allowed("/calendar/2023/03/day/view"))
+        # The longer Allow beats the wildcard Disallow.
+        self.assertTrue(rules.allowed("/calendar/2024/day"))
+        self.assertTrue(rules.allowed("/calendar/2023/week"))
+        self.assertFalse(rules.allowed("/exact"))
+        self.assertTrue(rules.allowed("/exactly"))
+
+    def test_sitemaps_and_bad_crawl_delay(self):
+        rules = RobotsRules(fixture("sitemaps.txt"), USER_AGENT)
+        self.assertEqual(rules.sitemaps, [
+            "https://www.ics.uci.edu/sitemap.xml",
+            "https://www.ics.uci.edu/news/sitemap.xml"])
+        self.assertIsNone(rules.crawl_delay)
+        self.assertFalse(rules.allowed("/tmp/file"))
+
+    def test_empty_allows_everything(self):
+        rules = RobotsRules("", USER_AGENT)
+        self.assertTrue(rules.allowed("/anything"))
+        self.assertEqual(rules.sitemaps, [])
+
+
+class RobotsCacheTest(unittest.TestCase):
+    ''' RobotsCache with download() answered from a dict of robots.txt
+    texts instead of the cache server. '''
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.config = SimpleNamespace(
+            save_file=os.path.join(self.tmp.name, "frontier.shelve"),
+            user_agent=USER_AGENT, time_delay=0)
+        self.texts = {"https://www.ics.uci.edu/robots.txt": fixture("precedence.txt")}
+        self.downloads = list()
+        patcher = mock.patch.object(robots, "download", self.download)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def download(self, url, config, logger=None):
+        self.downloads.append(url)
+        if url not in self.texts:
+            return Response({"url": url, "status": 404})
+        return Response(cbor.loads(encode_response(
+            url, 200, "text/plain", self.texts[url].encode("utf-8"))))
+
+    def age(self, seconds):
+        path = f"{self.config.save_file}.robots.json"
+        with open(path) as f:
+            texts = json.load(f)
+        for entry in texts.values():
+            entry[0] -= seconds
+        with open(path, "w") as f:
+            json.dump(texts, f)
+
+    def test_fetched_once_per_host(self):
+        cache = RobotsCache(self.config, True)
+        rules, first = cache.rules_for("https://www.ics.uci.edu/docs/a")
+        self.assertTrue(first)
+        _, first = cache.rules_for("https://www.ics.uci.edu/other")
+        self.assertFalse(first)
+        self.assertFalse(cache.allowed("https://www.ics.uci.edu/docs/a"))
+        self.assertTrue(cache.allowed("https://www.ics.uci.edu/docs/public/a"))
+        self.assertEqual(self.downloads, ["https://www.ics.uci.edu/robots.txt"])
+
+    def test_missing_robots_allows_everything(self):
+        cache = RobotsCache(self.config, True)
+        self.assertTrue(cache.allowed("https://vision.ics.uci.edu/docs/a"))
+        self.assertEqual(self.downloads, ["https://vision.ics.uci.edu/robots.txt"])
+
+    def test_saved_rules_are_reused_within_ttl(self):
+        RobotsCache(self.config, True).rules_for("https://www.ics.uci.edu/")
+        self.texts["https://www.ics.uci.edu/robots.txt"] = ""
+        cache = RobotsCache(self.config, False, ttl=3600)
+        self.assertFalse(cache.allowed("https://www.ics.uci.edu/docs/a"))
+        self.assertEqual(len(self.downloads), 1)
+
+    def test_expired_rules_are_fetched_again(self):
+        RobotsCache(self.config, True).rules_for("https://www.ics.uci.edu/")
+        self.texts["https://www.ics.uci.edu/robots.txt"] = ""
+        self.age(7200)
+        cache = RobotsCache(self.config, False, ttl=3600)
+        self.assertTrue(cache.allowed("https://www.ics.uci.edu/docs/a"))
+        self.assertEqual(len(self.downloads), 2)
+
+    def test_restart_forgets_saved_rules(self):
+        RobotsCache(self.config, True).rules_for("https://www.ics.uci.edu/")
+        self.texts["https://www.ics.uci.edu/robots.txt"] = ""
+        cache = RobotsCache(self.config, True, ttl=3600)
+        self.assertTrue(cache.allowed("https://www.ics.uci.edu/docs/a"))
+        self.assertEqual(len(self.downloads), 2)
+
+    def test_fetch_size_limit(self):
+        cache = RobotsCache(self.config, True)
+        self.assertIsNone(cache.fetch("https://www.ics.uci.edu/robots.txt", max_size=10))
+        self.assertIsNotNone(cache.fetch("https://www.ics.uci.edu/robots.txt"))
+
+
+if __name__ == "__main__":
+    unittest.main()
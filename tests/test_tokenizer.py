@@ -0,0 +1,64 @@
+''' Checks tokenizer.tokenizeFast and tokenizer.iterTokens against
+tokenizer.tokenize.
+
+Run from the repository root:
+    python -m unittest tests.test_tokenizer
+'''
+import random
+import unittest
+
+import tokenizer
+
+from benchmarks.bench_tokenizer import make_page
+
+
+class TokenizerEquivalenceTest(unittest.TestCase):
+    def assertSameTokens(self, text):
+        expected = tokenizer.tokenize(text)
+        self.assertEqual(tokenizer.tokenizeFast(text), expected, repr(text[:80]))
+        self.assertEqual(list(tokenizer.iterTokens(text)), expected, repr(text[:80]))
+
+    def test_empty_and_blank(self):
+        for text in ("", " ", "\n\n", "\t \r\n"):
+            self.assertSameTokens(text)
+        self.assertEqual(tokenizer.tokenizeFast(""), [])
+
+    def test_digits(self):
+        for text in ("123 456", "3.14159", "A1", "1a", "mixed123abc456", "x86_64"):
+            self.assertSameTokens(text)
+        self.assertEqual(tokenizer.tokenizeFast("2024 x86_64"), ["x86"])
+
+    def test_apostrophes_and_punctuation(self):
+        for text in ("don't", "students' work", "O'Neil's", "e-mail", "C++", "(see below)",
+                     "foo.bar.baz", "---", "_a_", "http://www.ics.uci.edu/~user/"):
+            self.assertSameTokens(text)
+        self.assertEqual(tokenizer.tokenizeFast("don't"), ["don", "t"])
+
+    def test_unicode(self):
+        # \u212a (Kelvin sign) and \u0130 lowercase to ascii letters, but
+        # are not tokens themselves.
+        for text in ("naïve", "café", "Ångström", "über résumé", "é1é", "ＡＢＣ",
+                     "\u0130stanbul", "\u212a", "\u212aelvin", "日本語 text",
+                     "emoji🙂word", "a\u00a0b", "a\u2028b"):
+            self.assertSameTokens(text)
+        self.assertEqual(tokenizer.tokenizeFast("\u212aelvin"), ["elvin"])
+        self.assertEqual(tokenizer.tokenizeFast("naïve café"), ["na", "ve", "caf"])
+
+    def test_line_endings(self):
+        for text in ("a\r\nb", "a\rb", "a\n\n\nb", "tab\tseparated"):
+            self.assertSameTokens(text)
+
+    def test_huge_tokens(self):
+        for text in ("a" * 100000, "ab1" * 50000, "x" * 50000 + "!" + "y" * 50000,
+                     "9" * 100000):
+            self.assertSameTokens(text)
+        self.assertEqual(tokenizer.tokenizeFast("a" * 100000), ["a" * 100000])
+
+    def test_random_pages(self):
+        rand = random.Random(0)
+        for _ in range(20):
+            self.assertSameTokens(make_page(rand))
+
+
+if __name__ == "__main__":
+    unittest.main()
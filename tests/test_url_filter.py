@@ -0,0 +1,61 @@
+''' Checks utils.url_filter against urlparse and the regex chain it
+replaced.
+
+Run from the repository root:
+    python -m unittest tests.test_url_filter
+'''
+import unittest
+
+from threading import Thread
+from urllib.parse import urlparse
+
+import scraper
+
+from benchmarks.bench_url_filter import legacy_is_valid, make_corpus
+from utils.url_filter import UrlFilter, split_url
+
+
+class SplitUrlTest(unittest.TestCase):
+    def assertSplitLikeUrlparse(self, url):
+        parsed = urlparse(url)
+        self.assertEqual(split_url(url), (parsed.scheme, parsed.netloc, parsed.path, parsed.query), url)
+
+    def test_plain_urls(self):
+        for url in ("https://www.ics.uci.edu/", "HTTPS://WWW.ICS.UCI.EDU/About",
+                    "http://u:p@a.ics.uci.edu:8080/x/y.html?a=1&b=2#top",
+                    "http://a.ics.uci.edu?x#y", "http://a.ics.uci.edu/a#b?c",
+                    "http://a.ics.uci.edu#x#y", "http://a.ics.uci.edu//b", "http:foo",
+                    "mailto:user@uci.edu", "http://a.ics.uci.edu/p?q=1;2"):
+            self.assertSplitLikeUrlparse(url)
+
+    def test_urls_left_to_urlparse(self):
+        for url in ("", "//a.ics.uci.edu/x", "1http://x", "http://[::1]/a", "http:///x",
+                    "http:////x", " http://a.ics.uci.edu/ b", "http://a.ics.uci.edu/\tx",
+                    "http://ä.uci.edu/", "http://a.ics.uci.edu/x.pdf;jsessionid=1",
+                    "http://a.ics.uci.edu/x;y/z;p?q#f", "http://a.ics.uci.edu;x/y"):
+            self.assertSplitLikeUrlparse(url)
+
+
+class UrlFilterTest(unittest.TestCase):
+    def test_same_verdicts_as_legacy(self):
+        for url in set(make_corpus(20000)):
+            self.assertEqual(scraper.url_filter._verdict(url) is None, legacy_is_valid(url), url)
+
+    def test_rejections_counted_across_threads(self):
+        url_filter = UrlFilter(["ics.uci.edu"], [], [], ["pdf"])
+        urls = [f"https://www.ics.uci.edu/file{i}.pdf" for i in range(2000)]
+
+        def check():
+            for url in urls:
+                url_filter.is_valid(url)
+
+        threads = [Thread(target=check) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(url_filter.rejections, {"extension": 8 * len(urls)})
+
+
+if __name__ == "__main__":
+    unittest.main()
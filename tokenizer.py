@@ -1,5 +1,6 @@
 # Decoding
 import os
+import re
 import sys
 
 # General use modules
@@ -139,6 +140,22 @@ def tokenize(input_data: str):
 
     return tokens
 
+# runs of ascii alphanumeric characters, the same pieces getSlicedWords keeps
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9]+")
+
+# streaming tokenizer for text that is already in memory
+# yields the same tokens as tokenize(), without the per character loop:
+# ascii alphanumeric runs, lowercased, pure digit tokens dropped
+def iterTokens(text:str):
+    for token in TOKEN_PATTERN.findall(text):
+        if not token.isdigit():
+            yield token.lower()
+
+# list version of iterTokens
+# note: unlike tokenize(), text is never treated as a file path
+def tokenizeFast(text:str):
+    return [token.lower() for token in TOKEN_PATTERN.findall(text) if not token.isdigit()]
+
 # gets word frequency
 def computeWordFrequencies(tokenList):
     myDict = dict()
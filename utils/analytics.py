@@ -0,0 +1,170 @@
+import threading
+
+from collections import Counter
+from urllib.parse import urlparse
+
+from utils.seen_set import SeenSet
+from utils.frequency_store import FrequencyStore
+from utils.canonical import canonicalize
+
+
+class _Partial(object):
+    ''' Counters of one thread since its last merge. Only the owning thread
+    writes to it, so its lock is uncontended except while merging. '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.word_counts = Counter()
+        self.urls = set()
+        self.longest = {"url": None, "words": 0}
+        self.pages = 0
+
+
+class CrawlStats(object):
+    ''' Word frequencies, unique urls and longest page of the crawl, safe to
+    update from any number of Worker threads.
+
+    Every thread accumulates into its own partial counters and merges them
+    into the shared totals in one batch every merge_every pages, so the
+    shared lock is taken once per batch rather than once per token. The
+    readers (word_frequencies, unique_urls, longest_page) merge whatever
+    the threads still hold first, so after the workers are joined they
+    return exact totals. '''
+
+    def __init__(self, merge_every=50):
+        self.merge_every = merge_every
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.partials = list()
+        # Exact and unbounded until configure_words() sets a limit.
+        self.word_store = (0, "spill", None)
+        self.word_counts = FrequencyStore()
+        # Unique urls in discovery order; membership is tested on the
+        # compact digests in self.seen instead of a set of strings.
+        self.urls = list()
+        self.seen = SeenSet()
+        # Unique urls per *.uci.edu subdomain, counted as urls are added.
+        self.subdomain_counts = Counter()
+        self.longest = {"url": None, "words": 0}
+        self.reported = 0
+        # Changes merged since the last take_delta(), for checkpoints.
+        self.delta_counts = Counter()
+        self.delta_urls = set()
+        self.delta_longest = None
+
+    def configure_words(self, max_words, mode, directory):
+        ''' Bounds the memory of the word frequencies; see
+        utils/frequency_store.py. Called before anything is counted. '''
+        with self.lock:
+            self.word_store = (max_words, mode, directory)
+            self.word_counts = FrequencyStore(max_words, mode, directory)
+
+    def new_word_store(self):
+        ''' An empty FrequencyStore with the same limit as word_counts, for
+        loading and compacting checkpoints in bounded memory. '''
+        return FrequencyStore(*self.word_store)
+
+    def _partial(self):
+        partial = getattr(self.local, "partial", None)
+        if partial is None:
+            partial = self.local.partial = _Partial()
+            with self.lock:
+                self.partials.append(partial)
+        return partial
+
+    def record_page(self, url, word_counts):
+        ''' Adds the (stopword free) token counts of one page. '''
+        partial = self._partial()
+        words = sum(word_counts.values())
+        with partial.lock:
+            partial.word_counts.update(word_counts)
+            if words > partial.longest["words"]:
+                partial.longest = {"url": url, "words": words}
+            partial.pages += 1
+            full = partial.pages >= self.merge_every
+        if full:
+            self._merge(partial)
+
+    def record_urls(self, urls):
+        partial = self._partial()
+        with partial.lock:
+            partial.urls.update(urls)
+
+    def _merge(self, partial):
+        with partial.lock:
+            word_counts, urls, longest = partial.word_counts, partial.urls, partial.longest
+            partial.reset()
+        with self.lock:
+            self.word_counts.update(word_counts)
+            self.delta_counts.update(word_counts)
+            new_urls = [url for url in urls if self.seen.add(url)]
+            self.urls.extend(new_urls)
+            self.delta_urls.update(new_urls)
+            self._count_subdomains(new_urls)
+            if longest["words"] > self.longest["words"]:
+                self.longest = self.delta_longest = longest
+
+    def _count_subdomains(self, new_urls):
+        for url in new_urls:
+            netloc = urlparse(url).netloc.lower()
+            if netloc.endswith(".uci.edu") or netloc == "uci.edu":
+                self.subdomain_counts[netloc] += 1
+
+    def merge(self):
+        ''' Folds every thread's partial counters into the totals. '''
+        with self.lock:
+            partials = list(self.partials)
+        for partial in partials:
+            self._merge(partial)
+
+    def take_delta(self):
+        ''' Returns (word_counts, new_urls, longest or None) merged since the
+        previous call and starts a new delta. '''
+        with self.lock:
+            delta = (self.delta_counts, self.delta_urls, self.delta_longest)
+            self.delta_counts = Counter()
+            self.delta_urls = set()
+            self.delta_longest = None
+        return delta
+
+    def restore(self, word_counts, urls, longest):
+        ''' Loads totals saved by an earlier run; word_counts is a Counter
+        or a FrequencyStore. Urls are canonicalized, so aliases saved
+        before canonicalization count once. '''
+        with self.lock:
+            self.word_counts.update_items(word_counts.items())
+            new_urls = [url for url in map(canonicalize, urls) if self.seen.add(url)]
+            self.urls.extend(new_urls)
+            self._count_subdomains(new_urls)
+            if longest["words"] > self.longest["words"]:
+                self.longest = longest
+            self.reported = len(self.urls)
+
+    def progress(self, step=100):
+        ''' Returns the number of unique urls merged so far if it passed a
+        multiple of step since the last call, else None. '''
+        with self.lock:
+            count = len(self.urls)
+            if count // step > self.reported // step:
+                self.reported = count
+                return count
+        return None
+
+    def word_frequencies(self):
+        self.merge()
+        return self.word_counts
+
+    def unique_urls(self):
+        self.merge()
+        return self.urls
+
+    def subdomains(self):
+        self.merge()
+        return self.subdomain_counts
+
+    def longest_page(self):
+        self.merge()
+        return self.longest
@@ -0,0 +1,46 @@
+import asyncio
+
+import aiohttp
+import cbor
+
+from utils.response import Response
+from utils.response_cache import response_cache
+
+
+def make_session(config):
+    ''' aiohttp session whose connection pool keeps up to
+    config.async_concurrency keep-alive connections to the cache server. '''
+    connector = aiohttp.TCPConnector(
+        limit=config.async_concurrency, keepalive_timeout=60)
+    return aiohttp.ClientSession(connector=connector)
+
+
+async def download(url, config, session, logger=None):
+    ''' asyncio version of utils.download.download over a shared session. '''
+    host, port = config.cache_server
+    try:
+        async with session.get(
+                f"http://{host}:{port}/",
+                params=[("q", f"{url}"), ("u", f"{config.user_agent}")]) as resp:
+            status = resp.status
+            content = await resp.read()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        # The threaded download lets this kill the worker; here it would
+        # leave the host busy forever, so report it like a cache error.
+        logger.error(f"Spacetime connection error {e!r} with url {url}.")
+        return Response({
+            "error": f"Spacetime connection error {e!r} with url {url}.",
+            "status": 600,
+            "url": url})
+    try:
+        if status < 400 and content:
+            response = Response(cbor.loads(content))
+            response_cache.put(url, content, response.status)
+            return response
+    except (EOFError, ValueError) as e:
+        pass
+    logger.error(f"Spacetime Response error <{status}> with url {url}.")
+    return Response({
+        "error": f"Spacetime Response error <{status}> with url {url}.",
+        "status": status,
+        "url": url})
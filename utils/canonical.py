@@ -0,0 +1,198 @@
+''' Canonical form of urls, so aliases of one page are stored, counted
+and fetched once.
+
+    HTTPS://WWW.ICS.UCI.EDU:443/a/%7euser/index.html?b=2&utm_source=x&a=1#top
+becomes
+    https://www.ics.uci.edu/a/~user?a=1&b=2
+
+Measure how many aliases a save file (or a url list such as
+unique_urls.txt) holds, and rewrite a save file in canonical form:
+    python -m utils.canonical measure frontier.shelve [--backend log]
+    python -m utils.canonical measure unique_urls.txt
+    python -m utils.canonical migrate frontier.shelve [--backend log]
+'''
+import os
+import re
+import string
+
+from argparse import ArgumentParser
+from collections import Counter
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit, quote, unquote
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Query parameters that identify a visit rather than a page. Names
+# starting with utm_ are always dropped.
+STRIP_PARAMS = (
+    "fbclid", "gclid", "msclkid", "mc_cid", "mc_eid", "_ga", "ref", "share",
+    "sessionid", "session_id", "sid", "phpsessid", "jsessionid", "cfid", "cftoken")
+
+# Last path segments that name a directory's default page.
+INDEX_PAGES = frozenset({"index.html", "index.htm"})
+
+_UNRESERVED = frozenset(string.ascii_letters + string.digits + "-._~")
+_ESCAPE = re.compile(r"%([0-9A-Fa-f]{2})")
+
+
+def _fix_escape(match):
+    char = chr(int(match.group(1), 16))
+    return char if char in _UNRESERVED else "%" + match.group(1).upper()
+
+
+def _normalize_escapes(text, safe):
+    ''' Decodes escaped unreserved characters, uppercases the other
+    escapes and escapes characters that may not appear unescaped. '''
+    return quote(_ESCAPE.sub(_fix_escape, text), safe=safe + "%")
+
+
+class Canonicalizer(object):
+    ''' Rewrites urls to one canonical form: lowercase scheme and host, no
+    default port, user info or fragment, percent-encoding normalized,
+    index.html and trailing slashes dropped, query parameters sorted and
+    tracking/session parameters (strip_params) removed.
+
+    Results are memoized per url in a bounded LRU cache. '''
+
+    def __init__(self, strip_params=STRIP_PARAMS, cache_size=1 << 16):
+        self.cache_size = cache_size
+        self.configure(strip_params)
+
+    def configure(self, strip_params):
+        self.strip_params = frozenset(name.lower() for name in strip_params)
+        self.canonicalize = lru_cache(self.cache_size)(self._canonicalize)
+
+    def _stripped(self, name):
+        name = unquote(name).lower()
+        return name in self.strip_params or name.startswith("utm_")
+
+    def _canonicalize(self, url):
+        try:
+            parsed = urlsplit(url.strip())
+            port = parsed.port
+        except ValueError:
+            return url
+        scheme = parsed.scheme.lower()
+        host = (parsed.hostname or "").rstrip(".")
+        if ":" in host:
+            host = f"[{host}]"
+        if port is not None and port != DEFAULT_PORTS.get(scheme):
+            host = f"{host}:{port}"
+
+        path = _normalize_escapes(parsed.path, "/:@!$&'()*+,;=")
+        head, _, last = path.rpartition("/")
+        if last.lower() in INDEX_PAGES:
+            path = head
+        path = path.rstrip("/")
+
+        params = [
+            _normalize_escapes(param, "/:@!$'()*+,;=?")
+            for param in parsed.query.split("&") if param]
+        params = sorted(
+            param for param in params if not self._stripped(param.split("=", 1)[0]))
+        return urlunsplit((scheme, host, path, "&".join(params), ""))
+
+
+# Shared by the scraper, the frontier and the statistics.
+canonicalizer = Canonicalizer()
+
+
+def canonicalize(url):
+    return canonicalizer.canonicalize(url)
+
+
+# ---------------- SAVE FILES ---------------- #
+def _open_save(path, backend):
+    if backend == "log":
+        from crawler.frontier_log import FrontierLog
+        return FrontierLog(path)
+    import dbm.dumb
+    import shelve
+    return shelve.Shelf(dbm.dumb.open(path, "c"))
+
+
+def _save_files(path, backend):
+    if backend == "log":
+        return [path]
+    return [path + suffix for suffix in (".dat", ".dir", ".bak")]
+
+
+def measure(urls):
+    ''' Counts urls, distinct canonical urls, and which parts of the urls
+    canonicalization changed. '''
+    counts = Counter()
+    canonical = set()
+    for url in urls:
+        counts["urls"] += 1
+        result = canonicalize(url)
+        canonical.add(result)
+        if result != url:
+            counts["changed"] += 1
+            before, after = urlsplit(url), urlsplit(result)
+            for part in ("scheme", "netloc", "path", "query", "fragment"):
+                if getattr(before, part) != getattr(after, part):
+                    counts[part] += 1
+    counts["canonical"] = len(canonical)
+    return counts
+
+
+def migrate(path, backend):
+    ''' Rewrites a save file with canonical urls and keys. Aliases merge
+    into one entry, which is complete if any alias was downloaded.
+    Returns (entries before, entries after, pending before, pending after). '''
+    from utils import get_urlhash
+
+    save = _open_save(path, backend)
+    merged = dict()
+    pending_before = 0
+    for url, completed in save.values():
+        pending_before += not completed
+        url = canonicalize(url)
+        merged[url] = merged.get(url, False) or completed
+    before = len(save)
+    save.close()
+
+    tmp_path = f"{path}.canonical"
+    for name in _save_files(tmp_path, backend):
+        if os.path.exists(name):
+            os.remove(name)
+    new_save = _open_save(tmp_path, backend)
+    for url, completed in merged.items():
+        new_save[get_urlhash(url)] = (url, completed)
+    new_save.close()
+    for tmp_name, name in zip(_save_files(tmp_path, backend), _save_files(path, backend)):
+        if os.path.exists(tmp_name):
+            os.replace(tmp_name, name)
+    pending_after = sum(1 for completed in merged.values() if not completed)
+    return before, len(merged), pending_before, pending_after
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("mode", choices=["measure", "migrate"])
+    parser.add_argument("path", type=str)
+    parser.add_argument("--backend", choices=["shelve", "log"], default="shelve")
+    parser.add_argument("--strip", type=str, default=None,
+                        help="comma separated STRIP_PARAMS, as in config.ini")
+    args = parser.parse_args()
+    if args.strip is not None:
+        canonicalizer.configure(name.strip() for name in args.strip.split(",") if name.strip())
+
+    if args.mode == "measure":
+        if args.path.endswith(".txt"):
+            with open(args.path, encoding="utf-8") as f:
+                urls = [line.strip() for line in f if line.strip()]
+        else:
+            save = _open_save(args.path, args.backend)
+            urls = [url for url, _ in save.values()]
+            save.close()
+        counts = measure(urls)
+        saved = counts["urls"] - counts["canonical"]
+        print(f"{counts['urls']} urls, {counts['canonical']} canonical: "
+              f"{saved} aliases ({saved / max(counts['urls'], 1):.1%} fewer fetches)")
+        print(f"{counts['changed']} urls rewritten; changed parts: " + ", ".join(
+            f"{part} {counts[part]}" for part in ("scheme", "netloc", "path", "query", "fragment")))
+    else:
+        before, after, pending_before, pending_after = migrate(args.path, args.backend)
+        print(f"Rewrote {args.path}: {before} entries -> {after}, "
+              f"{pending_before} pending -> {pending_after}")
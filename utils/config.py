@@ -1,5 +1,7 @@
 import re
 
+from utils.canonical import STRIP_PARAMS
+
 
 class Config(object):
     def __init__(self, config):
@@ -8,12 +10,54 @@ class Config(object):
         assert self.user_agent != "DEFAULT AGENT", "Set useragent in config.ini"
         assert re.match(r"^[a-zA-Z0-9_ ,]+$", self.user_agent), "User agent should not have any special characters outside '_', ',' and 'space'"
         self.threads_count = int(config["LOCAL PROPERTIES"]["THREADCOUNT"])
+        self.parse_processes = config["LOCAL PROPERTIES"].getint("PARSE_PROCESSES", fallback=0)
+        self.nodes = config["LOCAL PROPERTIES"].getint("NODES", fallback=1)
+        assert self.nodes >= 1, "NODES should be at least 1"
+        self.fetcher = config["LOCAL PROPERTIES"].get("FETCHER", "threads").strip()
+        assert self.fetcher in {"threads", "async"}, "FETCHER should be 'threads' or 'async'"
+        self.async_concurrency = config["LOCAL PROPERTIES"].getint("ASYNC_CONCURRENCY", fallback=16)
         self.save_file = config["LOCAL PROPERTIES"]["SAVE"]
+        self.checkpoint_interval = config["LOCAL PROPERTIES"].getfloat("CHECKPOINT_INTERVAL", fallback=60)
+        self.metrics_port = config["LOCAL PROPERTIES"].getint("METRICS_PORT", fallback=0)
+        self.metrics_interval = config["LOCAL PROPERTIES"].getfloat("METRICS_INTERVAL", fallback=0)
+        self.save_backend = config["LOCAL PROPERTIES"].get("SAVE_BACKEND", "shelve").strip()
+        assert self.save_backend in {"shelve", "log"}, "SAVE_BACKEND should be 'shelve' or 'log'"
+        self.response_cache = config["LOCAL PROPERTIES"].get("RESPONSE_CACHE", "off").strip()
+        assert self.response_cache in {"off", "record", "replay"}, \
+            "RESPONSE_CACHE should be 'off', 'record' or 'replay'"
+        self.response_cache_dir = config["LOCAL PROPERTIES"].get("RESPONSE_CACHE_DIR", "response_cache").strip()
+        self.response_cache_mb = config["LOCAL PROPERTIES"].getfloat("RESPONSE_CACHE_MB", fallback=1024)
+        self.response_cache_max_age = config["LOCAL PROPERTIES"].getfloat("RESPONSE_CACHE_MAX_AGE", fallback=0)
 
         self.host = config["CONNECTION"]["HOST"]
         self.port = int(config["CONNECTION"]["PORT"])
 
+        self.obey_robots = config["CRAWLER"].getboolean("ROBOTS", fallback=False)
+        self.report_top_words = config["CRAWLER"].getint("REPORT_TOP_WORDS", fallback=0)
+        self.max_words = config["CRAWLER"].getint("MAX_WORDS", fallback=0)
+        self.word_store = config["CRAWLER"].get("WORD_STORE", "spill").strip()
+        assert self.word_store in {"spill", "sketch"}, "WORD_STORE should be 'spill' or 'sketch'"
         self.seed_urls = config["CRAWLER"]["SEEDURL"].split(",")
+        self.strip_params = [
+            name.strip() for name in
+            config["CRAWLER"].get("STRIP_PARAMS", ",".join(STRIP_PARAMS)).split(",")
+            if name.strip()]
         self.time_delay = float(config["CRAWLER"]["POLITENESS"])
+        self.adaptive_politeness = config["CRAWLER"].getboolean("ADAPTIVE_POLITENESS", fallback=False)
+        self.max_delay = config["CRAWLER"].getfloat("MAX_DELAY", fallback=60)
+        self.circuit_failures = config["CRAWLER"].getint("CIRCUIT_FAILURES", fallback=5)
+        self.circuit_open = config["CRAWLER"].getfloat("CIRCUIT_OPEN", fallback=120)
+        self.circuit_trips = config["CRAWLER"].getint("CIRCUIT_TRIPS", fallback=3)
+        self.frontier = config["CRAWLER"].get("FRONTIER", "default").strip()
+        assert self.frontier in {"default", "host", "priority"}, "FRONTIER should be 'default', 'host' or 'priority'"
+        self.priority_scorers = [
+            name.strip() for name in
+            config["CRAWLER"].get("PRIORITY_SCORERS", "depth,host,inlinks,sitemap").split(",")
+            if name.strip()]
+        assert set(self.priority_scorers) <= {"depth", "host", "inlinks", "sitemap"}, \
+            "PRIORITY_SCORERS should be a list of depth, host, inlinks and sitemap"
+        assert self.fetcher != "async" or self.frontier == "host", "FETCHER = async needs FRONTIER = host"
+        assert not self.adaptive_politeness or self.frontier == "host", \
+            "ADAPTIVE_POLITENESS needs FRONTIER = host"
 
         self.cache_server = None
\ No newline at end of file
@@ -1,17 +1,31 @@
 import requests
 import cbor
 import time
+import threading
 
 from utils.response import Response
+from utils.response_cache import response_cache
+
+# One keep-alive session per worker thread; requests.Session is not
+# documented as thread safe.
+_local = threading.local()
+
+def _session():
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
 
 def download(url, config, logger=None):
     host, port = config.cache_server
-    resp = requests.get(
+    resp = _session().get(
         f"http://{host}:{port}/",
         params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
     try:
         if resp and resp.content:
-            return Response(cbor.loads(resp.content))
+            response = Response(cbor.loads(resp.content))
+            response_cache.put(url, resp.content, response.status)
+            return response
     except (EOFError, ValueError) as e:
         pass
     logger.error(f"Spacetime Response error {resp} with url {url}.")
@@ -0,0 +1,90 @@
+import threading
+
+from collections import Counter
+from hashlib import blake2b
+
+from utils.seen_set import SeenSet
+
+# Cheapest first.
+TIERS = ("raw", "text", "simhash")
+
+
+def content_digest(data):
+    ''' 8 byte digest of raw page bytes (or normalized text), as a non-zero
+    int for a SeenSet. '''
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return int.from_bytes(blake2b(data, digest_size=8).digest(), "little") or 1
+
+
+def text_digest(text):
+    ''' Digest of visible text with case and whitespace normalized. '''
+    return content_digest(" ".join(text.lower().split()))
+
+
+class DuplicateDetector(object):
+    ''' Duplicate pages caught by the cheapest test that can tell:
+
+        raw      the same bytes as an earlier page, checked before parsing
+        text     the same visible text (ignoring case and whitespace),
+                 checked before tokenizing and shingling
+        simhash  a near-duplicate in the SimhashIndex
+
+    Only a page that passes all three is new. Its digests are kept for the
+    first two tiers, and its fingerprint is added to the index. The
+    digest sets are not saved. After a resume, the (saved) Simhash index
+    still catches exact copies of earlier pages, just later in the
+    pipeline.
+
+    Safe to share between threads. is_raw_duplicate and
+    is_text_duplicate check the SeenSets without self.lock, which SeenSet
+    allows even while classify() grows them on another thread. '''
+
+    def __init__(self, simhash_index):
+        self.simhash_index = simhash_index
+        self.lock = threading.Lock()
+        self.raw = SeenSet()
+        self.text = SeenSet()
+        self.hits = Counter()
+        self.checked = 0
+
+    def is_raw_duplicate(self, raw_digest):
+        ''' True (and counted) if a page with these bytes was seen. '''
+        if not self.raw.contains_digest(raw_digest):
+            return False
+        with self.lock:
+            self.checked += 1
+            self.hits["raw"] += 1
+        return True
+
+    def is_text_duplicate(self, digest):
+        ''' True if a page with this text was seen. Not counted: the page
+        still goes through classify(). '''
+        return self.text.contains_digest(digest)
+
+    def classify(self, url, raw_digest, text_digest, fingerprint):
+        ''' Returns (tier, similar url or None) if the page is a duplicate,
+        else (None, None) after remembering it. fingerprint may be None
+        when the page was found to be a text duplicate already. '''
+        with self.lock:
+            self.checked += 1
+            tier, similar = None, None
+            if raw_digest is not None and not self.raw.add_digest(raw_digest):
+                tier = "raw"
+            elif not self.text.add_digest(text_digest):
+                tier = "text"
+            elif fingerprint is not None:
+                similar = self.simhash_index.find_or_add(fingerprint, url)
+                if similar is not None:
+                    tier = "simhash"
+            if tier is not None:
+                self.hits[tier] += 1
+            return tier, similar
+
+    def summary(self):
+        with self.lock:
+            checked, hits = self.checked, dict(self.hits)
+        rates = ", ".join(
+            f"{tier} {hits.get(tier, 0)} ({hits.get(tier, 0) / max(checked, 1):.1%})"
+            for tier in TIERS)
+        return f"Duplicates of {checked} pages: {rates}"
@@ -0,0 +1,238 @@
+''' Word frequencies in bounded memory.
+
+A FrequencyStore counts words exactly in a Counter until it holds more
+than max_words distinct words (0 = no limit). Past that it either
+
+    spill   writes the counts to disk as a run sorted by word and starts
+            over; runs are merged when the counts are read. Counts stay
+            exact, memory stays below max_words words, disk grows. The
+            runs go to a directory of their own, made inside `directory`
+            (or the system temporary directory) on the first spill and
+            removed by close() or once the store is garbage collected.
+    sketch  folds the counts into a Count-Min sketch and from then on
+            only keeps the heaviest words (at most max_words of them)
+            with their sketch estimates. Memory is fixed, counts become
+            estimates.
+
+Error bounds of the sketch, with N the number of words counted, width w
+and depth d: every reported count c' of a word with true count c has
+c <= c' <= c + (e / w) * N with probability at least 1 - e^-d. With the
+defaults (w = 2^18, d = 4) that is within N / 96000 with probability
+98%. Conservative update makes the overestimates smaller in practice.
+A word left out of the most common k has a true count no higher than
+the k-th reported count, as long as k is at most max_words // 2.
+'''
+import os
+import heapq
+import shutil
+import weakref
+import tempfile
+import itertools
+
+from array import array
+from collections import Counter
+from math import e, exp
+from operator import itemgetter
+
+MODES = ("spill", "sketch")
+
+
+def read_counts(path):
+    ''' (word, count) pairs of a file written by write_counts. '''
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            word, _, count = line.rstrip("\n").rpartition("\t")
+            yield word, int(count)
+
+
+def write_counts(path, items):
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(f"{word}\t{count}\n" for word, count in items)
+
+
+def _sum_sorted(items):
+    ''' Sums the counts of equal words in a stream sorted by word. '''
+    for word, group in itertools.groupby(items, key=itemgetter(0)):
+        yield word, sum(count for _, count in group)
+
+
+class CountMinSketch(object):
+    ''' depth rows of width counters; a word's estimate is the smallest
+    of its counters, one per row. Updates are conservative: counters only
+    grow as far as the new estimate. '''
+
+    def __init__(self, width=1 << 18, depth=4):
+        assert width & (width - 1) == 0, "width should be a power of 2"
+        self.width = width
+        self.depth = depth
+        self.table = array("Q", bytes(8 * width * depth))
+        self.rows = [(row, row * width) for row in range(depth)]
+
+    def _slots(self, word):
+        # str hashes are cached and randomized per process, which is fine
+        # for a sketch that is never saved.
+        digest = hash(word)
+        h1, h2 = digest & 0xFFFFFFFF, (digest >> 32) & 0xFFFFFFFF | 1
+        mask = self.width - 1
+        return [offset + ((h1 + row * h2) & mask) for row, offset in self.rows]
+
+    def add(self, word, count):
+        ''' Adds count to word and returns its new estimate. '''
+        table = self.table
+        slots = self._slots(word)
+        estimate = min(map(table.__getitem__, slots)) + count
+        for slot in slots:
+            if table[slot] < estimate:
+                table[slot] = estimate
+        return estimate
+
+    def estimate(self, word):
+        return min(self.table[slot] for slot in self._slots(word))
+
+    def error_bound(self, total):
+        ''' (overestimate, probability it is exceeded) for total counts. '''
+        return e / self.width * total, exp(-self.depth)
+
+
+class FrequencyStore(object):
+    ''' Word counts with a bound on memory; see the module docstring.
+    Reads go through items() and most_common(), the same as a Counter.
+    Not thread safe: CrawlStats updates it under its lock. '''
+
+    def __init__(self, max_words=0, mode="spill", directory=None, width=1 << 18, depth=4):
+        assert mode in MODES, f"mode should be one of {MODES}"
+        self.max_words = max_words
+        self.mode = mode
+        self.directory = directory
+        self.width = width
+        self.depth = depth
+        self.counts = Counter()
+        self.total = 0
+        self.runs = list()
+        self.run_directory = None
+        self.sketch = None
+        # Counts of kept heavy hitters not added to the sketch yet.
+        self.pending = Counter()
+
+    def _run_path(self, name):
+        if self.run_directory is None:
+            if self.directory is not None:
+                os.makedirs(self.directory, exist_ok=True)
+            self.run_directory = tempfile.mkdtemp(prefix="words-", dir=self.directory)
+            self._remove_runs = weakref.finalize(
+                self, shutil.rmtree, self.run_directory, ignore_errors=True)
+        return os.path.join(self.run_directory, name)
+
+    def update_items(self, items, batch_size=65536):
+        ''' Adds a stream of (word, count) pairs, such as another store's
+        items(), a batch at a time so it is never held in memory whole. '''
+        items = iter(items)
+        while True:
+            batch = Counter()
+            for word, count in itertools.islice(items, batch_size):
+                batch[word] += count
+            if not batch:
+                return
+            self.update(batch)
+
+    def update(self, word_counts):
+        self.total += sum(word_counts.values())
+        if self.sketch is not None:
+            self._add_to_sketch(word_counts.items())
+            return
+        self.counts.update(word_counts)
+        if self.max_words and len(self.counts) > self.max_words:
+            if self.mode == "spill":
+                self._spill()
+            else:
+                self.sketch = CountMinSketch(self.width, self.depth)
+                counts, self.counts = self.counts, Counter()
+                self._add_to_sketch(counts.items())
+
+    def _add_to_sketch(self, items):
+        ''' New words get their sketch estimate; words already kept are
+        counted exactly and only go into the sketch when they are
+        dropped, which spares hashing the most frequent words. '''
+        counts, pending = self.counts, self.pending
+        for word, count in items:
+            if word in counts:
+                counts[word] += count
+                pending[word] += count
+            else:
+                counts[word] = self.sketch.add(word, count)
+        if len(counts) > self.max_words:
+            kept = dict(heapq.nlargest(
+                max(self.max_words // 2, 1), counts.items(), key=itemgetter(1)))
+            for word, count in pending.items():
+                if word not in kept:
+                    self.sketch.add(word, count)
+            self.pending = Counter({word: pending[word] for word in kept if word in pending})
+            self.counts = Counter(kept)
+
+    def _spill(self, max_runs=32):
+        path = self._run_path(f"run-{len(self.runs):06d}.tsv")
+        write_counts(path, sorted(self.counts.items()))
+        self.runs.append(path)
+        self.counts = Counter()
+        if len(self.runs) >= max_runs:
+            # Keep the merge at read time to a few open files.
+            path = self._run_path("merged.tsv.tmp")
+            write_counts(path, self._merged_runs())
+            for run in self.runs:
+                os.remove(run)
+            self.runs = [self._run_path("run-000000.tsv")]
+            os.replace(path, self.runs[0])
+
+    def _merged_runs(self):
+        return _sum_sorted(heapq.merge(*[read_counts(run) for run in self.runs]))
+
+    def items(self):
+        ''' (word, count) pairs; in word order once counts were spilled. '''
+        if not self.runs:
+            return self.counts.items()
+        return _sum_sorted(heapq.merge(
+            *[read_counts(run) for run in self.runs], sorted(self.counts.items())))
+
+    def most_common(self, k=None):
+        ''' The k (or all) most frequent words with their counts, highest
+        first. Spilled counts are sorted by count with an external merge
+        sort, in runs of max_words. '''
+        if not self.runs:
+            return self.counts.most_common(k)
+        if k:
+            return heapq.nlargest(k, self.items(), key=itemgetter(1))
+        return self._sorted_by_count()
+
+    def _sorted_by_count(self):
+        paths = list()
+        items = self.items()
+        while True:
+            chunk = sorted(itertools.islice(items, self.max_words),
+                           key=lambda item: (-item[1], item[0]))
+            if not chunk:
+                break
+            paths.append(self._run_path(f"by-count-{len(paths):06d}.tsv"))
+            write_counts(paths[-1], chunk)
+        try:
+            yield from heapq.merge(
+                *[read_counts(path) for path in paths], key=lambda item: (-item[1], item[0]))
+        finally:
+            for path in paths:
+                os.remove(path)
+
+    def summary(self):
+        if self.sketch is not None:
+            error, probability = self.sketch.error_bound(self.total)
+            return (f"{self.total} words in a {self.depth}x{self.width} Count-Min sketch, "
+                    f"{len(self.counts)} heavy hitters kept; counts overestimate by at most "
+                    f"{error:.0f} with probability {1 - probability:.1%}")
+        if self.runs:
+            return f"{self.total} words, exact, spilled to {len(self.runs)} runs in {self.run_directory}"
+        return f"{self.total} words, {len(self.counts)} distinct, exact, in memory"
+
+    def close(self):
+        ''' Removes the spilled runs; the counts they held are lost. '''
+        if self.run_directory is not None:
+            self._remove_runs()
+            self.runs = list()
+            self.run_directory = None
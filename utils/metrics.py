@@ -0,0 +1,247 @@
+''' Timing spans, counters and gauges for the crawl, served as Prometheus
+text on http://127.0.0.1:<METRICS_PORT>/metrics and summarized in the log
+every METRICS_INTERVAL seconds. State registered with metrics.view(name,
+read) is served as JSON on http://127.0.0.1:<METRICS_PORT>/<name>.
+
+Instrumented code uses the module-wide `metrics`:
+
+    with metrics.span("download"):
+        resp = download(...)
+
+Until metrics.enable() is called, span() returns one shared object whose
+__enter__ and __exit__ do nothing, so instrumentation costs about one
+method call per span.
+'''
+import json
+import time
+import bisect
+import threading
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils import get_logger
+
+# Upper bounds, in seconds, of the histogram buckets of every stage.
+BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+
+class _NoSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span(object):
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Histogram(object):
+    ''' Counts of observations per BUCKETS bucket, their sum and count. '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(BUCKETS, seconds)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.sum, self.count
+
+    def quantile(self, q):
+        ''' Upper bound of the bucket holding the q-th quantile. '''
+        counts, _, count = self.snapshot()
+        if not count:
+            return 0.0
+        target = q * count
+        seen = 0
+        for bound, bucket_count in zip(BUCKETS, counts):
+            seen += bucket_count
+            if seen >= target:
+                return bound
+        return BUCKETS[-1]
+
+
+class Metrics(object):
+    ''' Per stage latency histograms, pages, per host and per status
+    counts, and gauges read from callbacks when they are reported. '''
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.histograms = dict()
+        self.pages = 0
+        self.host_pages = Counter()
+        self.statuses = Counter()
+        self.gauges = dict()
+        self.views = dict()
+        self.started = time.monotonic()
+
+    def enable(self):
+        self.enabled = True
+        self.started = time.monotonic()
+
+    def span(self, stage):
+        ''' Context manager timing one run of stage. '''
+        if not self.enabled:
+            return _NO_SPAN
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(stage, Histogram())
+        return _Span(histogram)
+
+    def count_page(self, host, status):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.pages += 1
+            self.host_pages[host] += 1
+            self.statuses[status] += 1
+
+    def gauge(self, name, read):
+        ''' Registers read() as the current value of gauge name. '''
+        with self.lock:
+            self.gauges[name] = read
+
+    def view(self, name, read):
+        ''' Registers read() as the JSON served on /name. '''
+        with self.lock:
+            self.views[name] = read
+
+    def pages_per_second(self):
+        elapsed = time.monotonic() - self.started
+        return self.pages / elapsed if elapsed > 0 else 0.0
+
+    def prometheus(self):
+        ''' All metrics in the Prometheus text exposition format. '''
+        # Copied under the lock: span() adds stages from worker threads.
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            gauges = sorted(self.gauges.items())
+        lines = ["# TYPE crawler_stage_seconds histogram"]
+        for stage, histogram in histograms:
+            counts, total, count = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'crawler_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'crawler_stage_seconds_sum{{stage="{stage}"}} {total}')
+            lines.append(f'crawler_stage_seconds_count{{stage="{stage}"}} {count}')
+        with self.lock:
+            host_pages = list(self.host_pages.items())
+            statuses = list(self.statuses.items())
+            pages = self.pages
+        lines.append("# TYPE crawler_pages_total counter")
+        lines.append(f"crawler_pages_total {pages}")
+        lines.append("# TYPE crawler_host_pages_total counter")
+        for host, count in sorted(host_pages):
+            lines.append(f'crawler_host_pages_total{{host="{host}"}} {count}')
+        lines.append("# TYPE crawler_status_total counter")
+        for status, count in sorted(statuses):
+            lines.append(f'crawler_status_total{{status="{status}"}} {count}')
+        lines.append("# TYPE crawler_pages_per_second gauge")
+        lines.append(f"crawler_pages_per_second {self.pages_per_second():.3f}")
+        for name, read in gauges:
+            lines.append(f"# TYPE crawler_{name} gauge")
+            lines.append(f"crawler_{name} {read()}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        ''' One line: pages, rate, gauges and the median and 95th
+        percentile bucket of every stage. '''
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            gauges = sorted(self.gauges.items())
+        parts = [f"{self.pages} pages", f"{self.pages_per_second():.1f} pages/s"]
+        parts.extend(f"{name} {read()}" for name, read in gauges)
+        for stage, histogram in histograms:
+            parts.append(
+                f"{stage} p50<={histogram.quantile(0.5) * 1000:g}ms "
+                f"p95<={histogram.quantile(0.95) * 1000:g}ms")
+        return ", ".join(parts)
+
+
+# Shared by every module that records metrics.
+metrics = Metrics()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = metrics.prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4"
+        elif self.path[1:] in metrics.views:
+            body = json.dumps(metrics.views[self.path[1:]]()).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsReporter(threading.Thread):
+    ''' Enables metrics, serves them on 127.0.0.1:port (if port) and logs
+    metrics.summary() every interval seconds (if interval). '''
+
+    def __init__(self, port=0, interval=0):
+        self.logger = get_logger("METRICS")
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.httpd = None
+        if port:
+            self.httpd = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+        metrics.enable()
+        super().__init__(daemon=True)
+
+    def run(self):
+        if self.httpd is not None:
+            threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+            self.logger.info(
+                f"Serving metrics on http://127.0.0.1:{self.httpd.server_address[1]}/metrics")
+        # Without an interval only wait for close().
+        while not self.stopped.wait(self.interval or None):
+            self.logger.info(metrics.summary())
+
+    def close(self):
+        self.stopped.set()
+        if self.is_alive():
+            self.join()
+            if self.httpd is not None:
+                self.httpd.shutdown()
+        if self.httpd is not None:
+            self.httpd.server_close()
+        if self.interval:
+            self.logger.info(metrics.summary())
@@ -0,0 +1,124 @@
+''' Writes the crawl report files from a CrawlStats without building
+sorted copies of everything in memory:
+
+    word_frequencies_final.json  words by frequency (optionally top k only)
+    unique_urls.txt              unique urls, sorted
+    subdomains.txt               "<subdomain>, <count>" for *.uci.edu
+    longest_page.txt             url and word count of the longest page
+
+Can also be run offline against a statistics checkpoint:
+    python -m utils.report --checkpoint frontier.shelve.stats [--top N]
+'''
+import os
+import json
+import heapq
+import tempfile
+import itertools
+
+from argparse import ArgumentParser
+
+
+def write_word_frequencies(path, word_counts, top_k=None):
+    ''' Writes word_counts (a Counter or a FrequencyStore) highest first,
+    in the same layout as json.dump(..., indent=2), one entry at a time.
+    With top_k only the top_k most frequent words are kept, selected with
+    a heap. '''
+    with open(path, "w") as f:
+        f.write("{")
+        separator = "\n"
+        for word, count in word_counts.most_common(top_k):
+            f.write(f"{separator}  {json.dumps(word)}: {count}")
+            separator = ",\n"
+        f.write("}" if separator == "\n" else "\n}")
+
+
+def write_unique_urls(path, urls, chunk_size=200000):
+    ''' Writes urls sorted, one per line, with an external merge sort:
+    urls are sorted chunk_size at a time, and if there is more than one
+    chunk the sorted runs are spilled to temporary files and merged.
+    Returns the number of urls written. '''
+    directory = os.path.dirname(os.path.abspath(path))
+    iterator = iter(urls)
+    chunk = sorted(itertools.islice(iterator, chunk_size))
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        run_paths = []
+        while True:
+            next_chunk = sorted(itertools.islice(iterator, chunk_size))
+            if not next_chunk and not run_paths:
+                # Everything fit in one chunk, no need to merge.
+                break
+            run_path = os.path.join(tmp, f"run-{len(run_paths)}")
+            with open(run_path, "w", encoding="utf-8") as f:
+                f.writelines(f"{url}\n" for url in chunk)
+            run_paths.append(run_path)
+            chunk = next_chunk
+            if not chunk:
+                break
+        files = [open(run_path, encoding="utf-8") for run_path in run_paths]
+        try:
+            if files:
+                merged = heapq.merge(*[(line[:-1] for line in f) for f in files])
+            else:
+                merged = iter(chunk)
+            count = 0
+            with open(path, "w", encoding="utf-8") as out:
+                for url in merged:
+                    out.write(f"\n{url}" if count else url)
+                    count += 1
+        finally:
+            for f in files:
+                f.close()
+    return count
+
+
+def write_subdomains(path, subdomain_counts):
+    # Save to file sorted alphabetically
+    with open(path, "w") as f:
+        for subdomain in sorted(subdomain_counts):
+            f.write(f"{subdomain}, {subdomain_counts[subdomain]}\n")
+
+
+def write_longest_page(path, longest_page):
+    with open(path, "w") as f:
+        f.write(f"Longest page: {longest_page['url']}\n")
+        f.write(f"Word count: {longest_page['words']}\n")
+
+
+def write_report(stats, top_words=None, directory="."):
+    ''' Writes all report files for a CrawlStats into directory. '''
+    word_counts = stats.word_frequencies()
+    write_word_frequencies(
+        os.path.join(directory, "word_frequencies_final.json"), word_counts, top_words)
+    print("[SAVED] Final word frequencies saved.")
+    print(f"[SUMMARY] Word frequencies: {word_counts.summary()}")
+
+    # Save all unique URLs (ignoring fragments)
+    count = write_unique_urls(
+        os.path.join(directory, "unique_urls.txt"), stats.unique_urls())
+    print(f"[SUMMARY] Total unique pages found (by URL): {count}")
+
+    write_subdomains(os.path.join(directory, "subdomains.txt"), stats.subdomains())
+
+    longest_page = stats.longest_page()
+    write_longest_page(os.path.join(directory, "longest_page.txt"), longest_page)
+    print(f"[SUMMARY] Longest page: {longest_page['url']} with {longest_page['words']} words")
+
+
+if __name__ == "__main__":
+    from utils.analytics import CrawlStats
+    from utils.stats_checkpoint import load_checkpoint
+
+    parser = ArgumentParser()
+    parser.add_argument("--checkpoint", type=str, default="frontier.shelve.stats")
+    parser.add_argument("--top", type=int, default=0)
+    parser.add_argument("--output", type=str, default=".")
+    parser.add_argument("--max-words", type=int, default=0)
+    parser.add_argument("--word-store", choices=["spill", "sketch"], default="spill")
+    args = parser.parse_args()
+    stats = CrawlStats()
+    # Spilled runs go to a temporary directory of their own in output.
+    stats.configure_words(args.max_words, args.word_store, args.output)
+    word_counts, urls, longest, _ = load_checkpoint(args.checkpoint, stats.new_word_store())
+    stats.restore(word_counts, urls, longest)
+    word_counts.close()
+    write_report(stats, args.top or None, args.output)
@@ -1,14 +1,27 @@
 import pickle
 
 class Response(object):
+    ''' A cache server response. The embedded requests.Response stays
+    pickled until raw_response is first read, so responses that are
+    turned away on their status or raw_size are never unpickled. Its
+    headers are inside the pickle too, after the body. '''
+
     def __init__(self, resp_dict):
         self.url = resp_dict["url"]
         self.status = resp_dict["status"]
         self.error = resp_dict["error"] if "error" in resp_dict else None
-        try:
-            self.raw_response = (
-                pickle.loads(resp_dict["response"])
-                if "response" in resp_dict else
-                None)
-        except TypeError:
-            self.raw_response = None
+        self._pickled = resp_dict["response"] if "response" in resp_dict else None
+        # Length of the pickled response: the body plus a few hundred bytes.
+        self.raw_size = len(self._pickled) if isinstance(self._pickled, bytes) else 0
+        self._raw_response = None
+
+    @property
+    def raw_response(self):
+        if self._pickled is not None:
+            # Drop the pickle once decoded, so the body is not held twice.
+            pickled, self._pickled = self._pickled, None
+            try:
+                self._raw_response = pickle.loads(pickled)
+            except TypeError:
+                self._raw_response = None
+        return self._raw_response
@@ -0,0 +1,230 @@
+''' On-disk cache of cache server responses, so a repeated or resumed
+crawl does not have to download unchanged pages again.
+
+The cbor payloads utils.download receives are appended to segment files
+in a directory, each behind a fixed size header:
+
+    <16 byte blake2b of the url><stored at, double><length><crc32 of payload>
+
+An in-memory index maps the url digest to its latest record, in least
+recently used order. When the payloads held pass max_bytes the least
+recently used are evicted; a full segment whose live payloads fall
+under half its size is compacted by copying them to the current
+segment. Segments are only appended to, and full segments are read
+through mmap. Records are not fsynced: a torn record at the end of a
+segment is dropped when the cache is opened, and a corrupt one is caught
+by its crc when read. Evicted records that are still in a segment when
+the cache is reopened come back, and are evicted again if over size.
+
+Only responses with a status below 500 are kept; server errors are
+worth asking for again. With max_age, older responses count as misses
+and are replaced by the next download.
+
+    python -m utils.response_cache <directory>
+prints what a cache directory holds.
+'''
+import os
+import sys
+import mmap
+import time
+import zlib
+import struct
+import threading
+
+from collections import OrderedDict
+from hashlib import blake2b
+
+import cbor
+
+from utils.response import Response
+
+HEADER = struct.Struct("<16sdII")
+
+
+def url_key(url):
+    return blake2b(url.encode("utf-8"), digest_size=16).digest()
+
+
+class ResponseCache(object):
+    ''' Segment file cache of response payloads; see the module docstring.
+    Does nothing until attach() is called. Safe to share between Worker
+    threads. '''
+
+    def __init__(self, segment_bytes=64 << 20):
+        self.segment_bytes = segment_bytes
+        self.lock = threading.RLock()
+        self.directory = None
+        self.replay = False
+        self.hits = self.misses = 0
+
+    def attach(self, directory, max_bytes, max_age=0, replay=False):
+        ''' Opens (or creates) the cache in directory. With replay, get()
+        answers from the cache; otherwise the cache is only filled. '''
+        with self.lock:
+            self.directory = directory
+            self.max_bytes = max_bytes
+            self.max_age = max_age
+            self.replay = replay
+            # url digest -> (segment, payload offset, length, stored at, crc)
+            self.index = OrderedDict()
+            self.live = dict()
+            self.size = 0
+            self.maps = dict()
+            os.makedirs(directory, exist_ok=True)
+            segments = sorted(
+                int(name[len("segment-"):-len(".bin")]) for name in os.listdir(directory)
+                if name.startswith("segment-") and name.endswith(".bin"))
+            for segment in segments:
+                self._load(segment)
+            self.active = segments[-1] if segments else 1
+            self._open_active()
+            if self.file.tell() >= self.segment_bytes:
+                self._next_segment()
+            self._evict(self.live)
+
+    def _path(self, segment):
+        return os.path.join(self.directory, f"segment-{segment:06d}.bin")
+
+    def _load(self, segment):
+        path = self._path(segment)
+        end = os.path.getsize(path)
+        offset = 0
+        self.live.setdefault(segment, 0)
+        with open(path, "rb") as f:
+            while offset + HEADER.size <= end:
+                key, stored_at, length, crc = HEADER.unpack(f.read(HEADER.size))
+                if offset + HEADER.size + length > end:
+                    break
+                self._index(key, (segment, offset + HEADER.size, length, stored_at, crc))
+                offset += HEADER.size + length
+                f.seek(offset)
+        if offset < end:
+            # Torn record from a crash while appending.
+            os.truncate(path, offset)
+
+    def _index(self, key, entry):
+        self._forget(key)
+        self.index[key] = entry
+        segment, _, length, _, _ = entry
+        self.live[segment] = self.live.get(segment, 0) + HEADER.size + length
+        self.size += length
+
+    def _forget(self, key):
+        entry = self.index.pop(key, None)
+        if entry is not None:
+            segment, _, length, _, _ = entry
+            self.live[segment] -= HEADER.size + length
+            self.size -= length
+        return entry
+
+    def _open_active(self):
+        self.live.setdefault(self.active, 0)
+        self.file = open(self._path(self.active), "ab")
+        self.reader = open(self._path(self.active), "rb")
+
+    def _next_segment(self):
+        self.file.close()
+        self.reader.close()
+        self.active += 1
+        self._open_active()
+
+    def _append(self, key, payload, stored_at):
+        offset = self.file.tell()
+        crc = zlib.crc32(payload)
+        self.file.write(HEADER.pack(key, stored_at, len(payload), crc))
+        self.file.write(payload)
+        self._index(key, (self.active, offset + HEADER.size, len(payload), stored_at, crc))
+        if self.file.tell() >= self.segment_bytes:
+            self._next_segment()
+
+    def _read(self, segment, offset, length):
+        if segment == self.active:
+            self.file.flush()
+            return os.pread(self.reader.fileno(), length, offset)
+        data = self.maps.get(segment)
+        if data is None:
+            with open(self._path(segment), "rb") as f:
+                data = self.maps[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return data[offset:offset + length]
+
+    def _evict(self, touched=()):
+        ''' Evicts down to max_bytes, then compacts the full segments
+        (evicted from, or in touched) that are less than half live. '''
+        touched = set(touched)
+        while self.size > self.max_bytes and self.index:
+            touched.add(self._forget(next(iter(self.index)))[0])
+        for segment in touched:
+            if segment != self.active and segment in self.live and \
+                    self.live[segment] * 2 < os.path.getsize(self._path(segment)):
+                self._compact(segment)
+
+    def _compact(self, segment):
+        ''' Moves the live records of a segment to the active one, keeping
+        their place in the LRU order, and deletes the segment. '''
+        order = list(self.index)
+        for key in order:
+            entry_segment, offset, length, stored_at, _ = self.index[key]
+            if entry_segment == segment:
+                self._append(key, self._read(segment, offset, length), stored_at)
+        self.index = OrderedDict((key, self.index[key]) for key in order)
+        data = self.maps.pop(segment, None)
+        if data is not None:
+            data.close()
+        del self.live[segment]
+        os.remove(self._path(segment))
+
+    def get(self, url):
+        ''' Response for url from the cache in replay mode, else None. '''
+        if not self.replay:
+            return None
+        key = url_key(url)
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None or (self.max_age and time.time() - entry[3] > self.max_age):
+                self.misses += 1
+                return None
+            segment, offset, length, _, crc = entry
+            payload = self._read(segment, offset, length)
+            if zlib.crc32(payload) != crc:
+                self._forget(key)
+                self.misses += 1
+                return None
+            self.index.move_to_end(key)
+            self.hits += 1
+        return Response(cbor.loads(payload))
+
+    def put(self, url, payload, status):
+        ''' Keeps the payload of a downloaded response, if worth it. '''
+        if self.directory is None or not 0 < status < 500 or len(payload) > self.max_bytes:
+            return
+        with self.lock:
+            self._append(url_key(url), payload, time.time())
+            self._evict()
+
+    def summary(self):
+        with self.lock:
+            return (f"Response cache {self.directory}: {len(self.index)} responses, "
+                    f"{self.size / 1e6:.1f} MB in {len(self.live)} segments, "
+                    f"{self.hits} hits, {self.misses} misses")
+
+    def close(self):
+        with self.lock:
+            if self.directory is None:
+                return
+            self.file.close()
+            self.reader.close()
+            for data in self.maps.values():
+                data.close()
+            self.maps.clear()
+            self.directory = None
+
+
+# Shared by the downloads and the workers, attached by the Crawler.
+response_cache = ResponseCache()
+
+
+if __name__ == "__main__":
+    cache = ResponseCache()
+    cache.attach(sys.argv[1], max_bytes=float("inf"))
+    print(cache.summary())
+    cache.close()
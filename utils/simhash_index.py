@@ -0,0 +1,123 @@
+import os
+import struct
+
+from array import array
+from threading import RLock
+
+# fingerprint, length of the utf-8 url that follows it.
+RECORD = struct.Struct("<QH")
+
+
+class SimhashIndex(object):
+    ''' Set of 64-bit simhash fingerprints that answers "is there a stored
+    fingerprint within max_distance bits of this one" without scanning
+    every page seen so far.
+
+    The 64 bits are cut into max_distance + 1 blocks. Two fingerprints that
+    differ in at most max_distance bits must agree exactly on at least one
+    block, so every fingerprint is filed under each of its block values and
+    a lookup only compares against the few fingerprints that share a block.
+
+    Fingerprints are kept as raw ints in an array('Q') and buckets hold
+    array('I') positions into it, instead of one Simhash object per page.
+    Once attach() is called every added fingerprint is also appended to a
+    file so a resumed crawl keeps its duplicate state. '''
+
+    def __init__(self, max_distance=2, bits=64, flush_every=256):
+        self.max_distance = max_distance
+        self.bits = bits
+        self.flush_every = flush_every
+        self.lock = RLock()
+        self.fingerprints = array("Q")
+        self.urls = list()
+        # (shift, mask) of every block, and one bucket table per block.
+        self.blocks = list()
+        block_count = max_distance + 1
+        shift = 0
+        for i in range(block_count):
+            width = bits // block_count + (1 if i < bits % block_count else 0)
+            self.blocks.append((shift, (1 << width) - 1))
+            shift += width
+        self.tables = [dict() for _ in self.blocks]
+        self.file = None
+        self.unflushed = 0
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def _insert(self, fingerprint, url):
+        position = len(self.fingerprints)
+        self.fingerprints.append(fingerprint)
+        self.urls.append(url)
+        for (shift, mask), table in zip(self.blocks, self.tables):
+            key = (fingerprint >> shift) & mask
+            bucket = table.get(key)
+            if bucket is None:
+                bucket = table[key] = array("I")
+            bucket.append(position)
+
+    def find(self, fingerprint):
+        ''' Returns the url of a stored page within max_distance bits of
+        fingerprint, or None. '''
+        fingerprints = self.fingerprints
+        for (shift, mask), table in zip(self.blocks, self.tables):
+            bucket = table.get((fingerprint >> shift) & mask)
+            if bucket is None:
+                continue
+            for position in bucket:
+                if bin(fingerprint ^ fingerprints[position]).count("1") <= self.max_distance:
+                    return self.urls[position]
+        return None
+
+    def find_or_add(self, fingerprint, url):
+        ''' Returns the url of a near-duplicate if there is one, otherwise
+        stores fingerprint for url and returns None. '''
+        with self.lock:
+            similar = self.find(fingerprint)
+            if similar is not None:
+                return similar
+            self._insert(fingerprint, url)
+            if self.file is not None:
+                encoded = url.encode("utf-8")[:0xFFFF]
+                self.file.write(RECORD.pack(fingerprint, len(encoded)) + encoded)
+                self.unflushed += 1
+                if self.unflushed >= self.flush_every:
+                    self.flush()
+            return None
+
+    def attach(self, path, restart):
+        ''' Loads fingerprints saved at path (unless restarting) and appends
+        every new fingerprint to it from now on. '''
+        with self.lock:
+            if restart and os.path.exists(path):
+                os.remove(path)
+            good_bytes = 0
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    data = f.read()
+                while good_bytes + RECORD.size <= len(data):
+                    fingerprint, length = RECORD.unpack_from(data, good_bytes)
+                    end = good_bytes + RECORD.size + length
+                    if end > len(data):
+                        break
+                    self._insert(
+                        fingerprint,
+                        data[good_bytes + RECORD.size:end].decode("utf-8", "replace"))
+                    good_bytes = end
+                if good_bytes != len(data):
+                    # Drop a record torn by a crash.
+                    with open(path, "r+b") as f:
+                        f.truncate(good_bytes)
+            self.file = open(path, "ab")
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+            self.unflushed = 0
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
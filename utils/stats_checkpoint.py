@@ -0,0 +1,145 @@
+import os
+import json
+import shutil
+import threading
+
+from utils import get_logger
+from utils.frequency_store import FrequencyStore, read_counts
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _write_words(path, items):
+    # Same format as the runs of utils.frequency_store, so read_counts
+    # reads it back.
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(f"{word}\t{count}\n" for word, count in items)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _delta_seq(name):
+    return int(name[len("delta-"):-len(".json")])
+
+
+def _apply(totals, data):
+    word_counts, urls, longest = totals
+    word_counts.update(data["words"])
+    urls.update(data["urls"])
+    if data["longest"] and data["longest"]["words"] > longest["words"]:
+        longest = data["longest"]
+    return word_counts, urls, longest
+
+
+def load_checkpoint(directory, word_counts=None):
+    ''' Returns (word_counts, urls, longest, last_seq) saved in directory:
+    the compacted base plus every delta written after it. The words are
+    streamed into word_counts, a FrequencyStore (exact and in memory if
+    not given), so a MAX_WORDS limit holds while loading too. '''
+    if word_counts is None:
+        word_counts = FrequencyStore()
+    totals = (word_counts, set(), {"url": None, "words": 0})
+    base_seq = last_seq = 0
+    base_path = os.path.join(directory, "base.json")
+    if os.path.exists(base_path):
+        with open(base_path) as f:
+            base = json.load(f)
+        if "words_file" in base:
+            word_counts.update_items(read_counts(os.path.join(directory, base["words_file"])))
+            base["words"] = {}
+        totals = _apply(totals, base)
+        base_seq = last_seq = base["seq"]
+    deltas = sorted(
+        (_delta_seq(name), name) for name in os.listdir(directory)
+        if name.startswith("delta-") and name.endswith(".json"))
+    for seq, name in deltas:
+        # Deltas up to base_seq were folded into the base; they are only
+        # left over if a crash hit between writing the base and deleting.
+        if seq <= base_seq:
+            continue
+        with open(os.path.join(directory, name)) as f:
+            totals = _apply(totals, json.load(f))
+        last_seq = seq
+    return totals + (last_seq,)
+
+
+class StatsCheckpointer(threading.Thread):
+    ''' Saves the changes to a CrawlStats every interval seconds, from its
+    own thread, so a crashed or killed crawl can resume its statistics.
+
+    Each checkpoint writes only what was merged since the previous one to
+    a new delta-<seq>.json in directory. Every compact_every deltas the
+    base and the deltas are folded into a new base.json (which records
+    the last delta it contains, with the words in a base-words-<seq>.tsv
+    next to it) and the deltas are deleted. Folding goes through a
+    FrequencyStore with the crawl's MAX_WORDS and WORD_STORE, so with
+    `sketch` the base only carries the most frequent words. Files are
+    written to a temporary name and renamed, so a crash never leaves a
+    half written checkpoint. Workers are only held up for the moment it
+    takes to swap out the delta. '''
+
+    def __init__(self, stats, directory, restart, interval=60, compact_every=20):
+        self.logger = get_logger("CHECKPOINT")
+        self.stats = stats
+        self.directory = directory
+        self.interval = interval
+        self.compact_every = compact_every
+        self.stopped = threading.Event()
+        self.write_lock = threading.Lock()
+        if restart and os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory, exist_ok=True)
+        word_counts, urls, longest, self.seq = load_checkpoint(
+            directory, stats.new_word_store())
+        if urls or word_counts.total:
+            stats.restore(word_counts, urls, longest)
+            self.logger.info(
+                f"Restored {len(urls)} unique urls and {word_counts.summary()} "
+                f"from {directory}.")
+        word_counts.close()
+        super().__init__(daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.checkpoint()
+
+    def checkpoint(self):
+        with self.write_lock:
+            self.stats.merge()
+            word_counts, urls, longest = self.stats.take_delta()
+            if not word_counts and not urls and longest is None:
+                return
+            self.seq += 1
+            _write_json(
+                os.path.join(self.directory, f"delta-{self.seq:08d}.json"),
+                {"words": word_counts, "urls": list(urls), "longest": longest})
+            if self.seq % self.compact_every == 0:
+                self.compact()
+
+    def compact(self):
+        word_counts, urls, longest, seq = load_checkpoint(
+            self.directory, self.stats.new_word_store())
+        words_file = f"base-words-{seq:08d}.tsv"
+        _write_words(os.path.join(self.directory, words_file), word_counts.items())
+        word_counts.close()
+        _write_json(
+            os.path.join(self.directory, "base.json"),
+            {"words_file": words_file, "urls": list(urls), "longest": longest, "seq": seq})
+        for name in os.listdir(self.directory):
+            if ((name.startswith("delta-") and name.endswith(".json") and _delta_seq(name) <= seq)
+                    or (name.startswith("base-words-") and name != words_file)):
+                os.remove(os.path.join(self.directory, name))
+
+    def close(self):
+        ''' Stops the thread and writes a last checkpoint. '''
+        self.stopped.set()
+        if self.is_alive():
+            self.join()
+        self.checkpoint()
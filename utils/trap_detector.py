@@ -0,0 +1,201 @@
+''' Per-host url pattern statistics used to stop crawler traps that no
+TRAP_RULES regex names yet.
+
+Urls are reduced to a template: host, path segments with numbers and long
+ids collapsed to "#", and the sorted query parameter names. Calendars,
+paged listings and wiki action modes each collapse to a few templates, so
+budgets on templates catch them whatever their urls look like.
+
+Inspect a saved state with:
+    python -m utils.trap_detector frontier.shelve.traps.json [--top N]
+'''
+import os
+import re
+import json
+import time
+
+from argparse import ArgumentParser
+from collections import OrderedDict
+from threading import Lock
+from urllib.parse import urlparse, parse_qsl
+
+# Runs of digits, and long hex ids (hashes, session ids) within a segment.
+_IDS = re.compile(r"\b[0-9a-f]{12,}\b|\d+")
+
+# Fields of a template's statistics.
+ADMITTED, OFFERED, FETCHED, DUPLICATES = range(4)
+
+
+def url_template(url):
+    ''' The pattern a url is counted under, e.g.
+    https://wics.ics.uci.edu/events/2023-05-01/?page=3&x=1 becomes
+    wics.ics.uci.edu/events/#-#-#?page&x '''
+    parsed = urlparse(url)
+    segments = [_IDS.sub("#", segment) for segment in parsed.path.split("/") if segment]
+    template = parsed.netloc.lower() + "/" + "/".join(segments)
+    if parsed.query:
+        names = sorted({name for name, _ in parse_qsl(parsed.query, keep_blank_values=True)})
+        template += "?" + "&".join(names)
+    return template
+
+
+class TrapDetector(object):
+    ''' Decides which discovered urls are worth adding to the frontier.
+
+    A url is refused when its path is deeper than max_depth segments, when
+    one segment repeats more than max_repeats times (/a/b/a/b/a/b), or when
+    its template is cut off. Every template may add pattern_budget urls;
+    past that only one url in throttle_every is added, and a template that
+    reaches twice its budget is cut off. A template whose fetched pages are
+    mostly near-duplicates (more than max_duplicate_ratio of at least
+    min_fetched pages) is cut off as well.
+
+    Memory is bounded: statistics are kept for the max_patterns most
+    recently used templates and at most max_blocked cut off templates, the
+    oldest being forgotten first. attach() saves the state next to the
+    frontier's save file every save_interval seconds and on close(). '''
+
+    def __init__(self, pattern_budget=500, throttle_every=10, max_depth=12,
+                 max_repeats=2, min_fetched=20, max_duplicate_ratio=0.5,
+                 max_patterns=100000, max_blocked=20000, save_interval=60):
+        self.pattern_budget = pattern_budget
+        self.throttle_every = throttle_every
+        self.max_depth = max_depth
+        self.max_repeats = max_repeats
+        self.min_fetched = min_fetched
+        self.max_duplicate_ratio = max_duplicate_ratio
+        self.max_patterns = max_patterns
+        self.max_blocked = max_blocked
+        self.save_interval = save_interval
+        self.lock = Lock()
+        # template -> [admitted, offered, fetched, duplicates], in LRU order.
+        self.patterns = OrderedDict()
+        # template -> reason it was cut off, oldest first.
+        self.blocked = OrderedDict()
+        self.path = None
+        self.saved_at = time.monotonic()
+
+    def _stats(self, template):
+        stats = self.patterns.get(template)
+        if stats is None:
+            stats = self.patterns[template] = [0, 0, 0, 0]
+            if len(self.patterns) > self.max_patterns:
+                self.patterns.popitem(last=False)
+        else:
+            self.patterns.move_to_end(template)
+        return stats
+
+    def _block(self, template, reason):
+        self.blocked[template] = reason
+        if len(self.blocked) > self.max_blocked:
+            self.blocked.popitem(last=False)
+        self.patterns.pop(template, None)
+
+    def _shape_reason(self, url):
+        segments = [segment for segment in urlparse(url).path.split("/") if segment]
+        if len(segments) > self.max_depth:
+            return "path depth"
+        seen = dict()
+        for segment in segments:
+            seen[segment] = seen.get(segment, 0) + 1
+            if seen[segment] > self.max_repeats:
+                return "repeated segment"
+        return None
+
+    def admit(self, url):
+        ''' Counts a newly discovered url against its template. Returns
+        None if it should be crawled, else the reason it should not. '''
+        reason = self._shape_reason(url)
+        if reason is not None:
+            return reason
+        template = url_template(url)
+        with self.lock:
+            reason = self.blocked.get(template)
+            if reason is not None:
+                return reason
+            stats = self._stats(template)
+            stats[OFFERED] += 1
+            if stats[ADMITTED] >= self.pattern_budget:
+                if stats[ADMITTED] >= 2 * self.pattern_budget:
+                    self._block(template, "pattern budget")
+                    return "pattern budget"
+                if stats[OFFERED] % self.throttle_every:
+                    return "pattern throttled"
+            stats[ADMITTED] += 1
+            self._maybe_save()
+        return None
+
+    def blocked_reason(self, url):
+        ''' The reason url's template was cut off, or None. Lets urls that
+        were queued before their template was cut off be skipped. '''
+        template = url_template(url)
+        with self.lock:
+            return self.blocked.get(template)
+
+    def record_fetch(self, url, duplicate):
+        ''' Counts a fetched page of url's template, and whether it was a
+        near-duplicate of a page already seen. '''
+        template = url_template(url)
+        with self.lock:
+            if template in self.blocked:
+                return
+            stats = self._stats(template)
+            stats[FETCHED] += 1
+            if duplicate:
+                stats[DUPLICATES] += 1
+            if (stats[FETCHED] >= self.min_fetched
+                    and stats[DUPLICATES] > self.max_duplicate_ratio * stats[FETCHED]):
+                self._block(template, "near duplicates")
+            self._maybe_save()
+
+    def attach(self, path, restart):
+        ''' Loads the state saved at path (unless restarting) and saves
+        to it from now on. '''
+        with self.lock:
+            if restart and os.path.exists(path):
+                os.remove(path)
+            if os.path.exists(path):
+                with open(path) as f:
+                    state = json.load(f)
+                self.patterns = OrderedDict(
+                    (template, stats) for template, stats in state["patterns"])
+                self.blocked = OrderedDict(
+                    (template, reason) for template, reason in state["blocked"])
+            self.path = path
+            self.saved_at = time.monotonic()
+
+    def _maybe_save(self):
+        if self.path is not None and time.monotonic() - self.saved_at >= self.save_interval:
+            self._save()
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "patterns": list(self.patterns.items()),
+                "blocked": list(self.blocked.items())}, f)
+        os.replace(tmp_path, self.path)
+        self.saved_at = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            if self.path is not None:
+                self._save()
+                self.path = None
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("state", type=str)
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+    detector = TrapDetector()
+    detector.attach(args.state, False)
+    print(f"{len(detector.blocked)} templates cut off:")
+    for template, reason in detector.blocked.items():
+        print(f"  {reason}: {template}")
+    print(f"Top {args.top} of {len(detector.patterns)} templates by urls admitted:")
+    ranked = sorted(detector.patterns.items(), key=lambda item: item[1][ADMITTED], reverse=True)
+    for template, stats in ranked[:args.top]:
+        print(f"  {stats[ADMITTED]:>6} admitted, {stats[FETCHED]:>6} fetched, "
+              f"{stats[DUPLICATES]:>6} duplicates: {template}")